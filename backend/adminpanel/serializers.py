@@ -6,6 +6,10 @@ class AdminCaptainVerifySerializer(serializers.Serializer):
     reason = serializers.CharField(required=False, allow_blank=True)
 
 
+class AdminUserActiveSerializer(serializers.Serializer):
+    is_active = serializers.BooleanField()
+
+
 class AdminRecommendRestaurantSerializer(serializers.Serializer):
     restaurant_id = serializers.CharField()
     is_recommended = serializers.BooleanField(required=False, default=True)
@@ -1,23 +1,11 @@
-from pymongo import ASCENDING
+from typing import Optional
 
 from core.utils import to_object_id, utcnow
-from core.db import get_db
-
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.users.create_index([("created_at", ASCENDING)], name="users_created_at")
-    db.captains.create_index([("created_at", ASCENDING)], name="captains_created_at")
-    _index_ready = True
+from core.db import ANALYTICS, get_db
+from core.pagination import paginate
 
 
 def _sum(collection, match: dict, field: str):
-    db = get_db()
     pipeline = [
         {"$match": match},
         {"$group": {"_id": None, "amount": {"$sum": f"${field}"}}},
@@ -27,8 +15,7 @@ def _sum(collection, match: dict, field: str):
 
 
 def overview():
-    ensure_indexes()
-    db = get_db()
+    db = get_db(ANALYTICS)
     total_users = db.users.count_documents({})
     active_captains = db.captains.count_documents({"is_online": True})
 
@@ -48,22 +35,19 @@ def overview():
     }
 
 
-def list_users(limit: int = 50, skip: int = 0):
+def list_users(limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
-    cursor = db.users.find({}).skip(skip).limit(limit)
-    return list(cursor)
+    return paginate(db.users, {}, limit, cursor)
 
 
-def list_captains(limit: int = 50, skip: int = 0):
+def list_captains(limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
-    cursor = db.captains.find({}).skip(skip).limit(limit)
-    return list(cursor)
+    return paginate(db.captains, {}, limit, cursor)
 
 
-def list_go_home_captains(limit: int = 100):
+def list_go_home_captains(limit: int = 100, cursor: Optional[str] = None):
     db = get_db()
-    cursor = db.captains.find({"go_home_mode": True}).limit(limit)
-    return list(cursor)
+    return paginate(db.captains, {"go_home_mode": True}, limit, cursor)
 
 
 def verify_captain(captain_id: str, is_verified: bool, reason: str = None):
@@ -4,6 +4,7 @@ from adminpanel import views
 urlpatterns = [
     path("admin/overview/", views.AdminOverviewView.as_view(), name="admin-overview"),
     path("admin/users/", views.AdminUsersView.as_view(), name="admin-users"),
+    path("admin/user/<str:user_id>/active/", views.AdminUserActiveView.as_view(), name="admin-user-active"),
     path("admin/captains/", views.AdminCaptainsView.as_view(), name="admin-captains"),
     path("admin/go-home-captains/", views.AdminGoHomeCaptainsView.as_view(), name="admin-go-home-captains"),
     path("admin/captain/<str:captain_id>/verify/", views.AdminCaptainVerifyView.as_view(), name="admin-captain-verify"),
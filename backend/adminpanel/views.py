@@ -4,14 +4,17 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
 from core.permissions import RolePermission
+from core.renderers import streamed_list
 from core.utils import serialize_doc
 from adminpanel import services
 from adminpanel.serializers import (
     AdminCaptainVerifySerializer,
     AdminRecommendRestaurantSerializer,
     AdminRecommendMenuSerializer,
+    AdminUserActiveSerializer,
 )
 from restaurants import services as restaurant_services
+from users import services as user_services
 
 
 class AdminOverviewView(APIView):
@@ -29,9 +32,26 @@ class AdminUsersView(APIView):
 
     def get(self, request):
         limit = int(request.query_params.get("limit", 50))
-        skip = int(request.query_params.get("skip", 0))
-        users = services.list_users(limit=limit, skip=skip)
-        return Response({"users": serialize_doc(users)})
+        try:
+            users = services.list_users(limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return streamed_list(request, "users", users, trailer=users.trailer)
+
+
+class AdminUserActiveView(APIView):
+    allowed_roles = ["ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Sample payload:
+    # {"is_active": false}
+    def post(self, request, user_id: str):
+        serializer = AdminUserActiveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = user_services.set_user_active(user_id, serializer.validated_data["is_active"])
+        if not updated:
+            return Response({"detail": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"user": serialize_doc(updated)})
 
 
 class AdminCaptainsView(APIView):
@@ -40,9 +60,11 @@ class AdminCaptainsView(APIView):
 
     def get(self, request):
         limit = int(request.query_params.get("limit", 50))
-        skip = int(request.query_params.get("skip", 0))
-        captains = services.list_captains(limit=limit, skip=skip)
-        return Response({"captains": serialize_doc(captains)})
+        try:
+            captains = services.list_captains(limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return streamed_list(request, "captains", captains, trailer=captains.trailer)
 
 
 class AdminGoHomeCaptainsView(APIView):
@@ -51,8 +73,11 @@ class AdminGoHomeCaptainsView(APIView):
 
     def get(self, request):
         limit = int(request.query_params.get("limit", 100))
-        captains = services.list_go_home_captains(limit=limit)
-        return Response({"captains": serialize_doc(captains)})
+        try:
+            captains = services.list_go_home_captains(limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return streamed_list(request, "captains", captains, trailer=captains.trailer)
 
 
 class AdminCaptainVerifyView(APIView):
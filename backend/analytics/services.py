@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Dict
 
-from core.db import get_db
+from core.db import ANALYTICS, get_db
 from core.utils import to_object_id
 
 
@@ -21,7 +21,7 @@ def _init_bucket():
 
 
 def wallet_analytics(user_id: str):
-    db = get_db()
+    db = get_db(ANALYTICS)
     oid = to_object_id(user_id)
     if not oid:
         return None
@@ -0,0 +1,14 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register
+
+register("cancellations", [
+    IndexModel([("created_at", DESCENDING)], name="cancellations_created_at"),
+    IndexModel([("job_type", ASCENDING), ("job_id", ASCENDING)], name="cancellations_job"),
+])
+register("penalties", [
+    IndexModel([("created_at", DESCENDING)], name="penalties_created_at"),
+])
+register("refunds", [
+    IndexModel([("created_at", DESCENDING)], name="refunds_created_at"),
+])
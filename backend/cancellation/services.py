@@ -16,20 +16,6 @@ DEFAULT_POLICY = {
     "no_show_fee_pct": 0.1,
 }
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.cancellations.create_index([("created_at", -1)], name="cancellations_created_at")
-    db.cancellations.create_index([("job_type", 1), ("job_id", 1)], name="cancellations_job")
-    db.penalties.create_index([("created_at", -1)], name="penalties_created_at")
-    db.refunds.create_index([("created_at", -1)], name="refunds_created_at")
-    _index_ready = True
-
 
 def get_policy():
     return DEFAULT_POLICY.copy()
@@ -106,7 +92,6 @@ def cancel_order(
     no_show: bool = False,
     metadata: Optional[Dict] = None,
 ):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(order_id)
     if not oid:
@@ -220,7 +205,6 @@ def cancel_ride(
     no_show: bool = False,
     metadata: Optional[Dict] = None,
 ):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(ride_id)
     if not oid:
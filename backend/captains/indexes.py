@@ -0,0 +1,18 @@
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+
+from core.indexes import register, retire
+
+# Every $near/$geoWithin captain lookup (matching, batching, surge supply, maps) pins
+# is_online and is_verified, so only those captains are indexed. is_busy is filtered with
+# `$ne: True`, which a partial filter cannot express, so it is an index key instead.
+register("captains", [
+    IndexModel([("user_id", ASCENDING)], unique=True, name="captains_user_id"),
+    IndexModel(
+        [("location", GEOSPHERE), ("vehicle_type", ASCENDING), ("is_busy", ASCENDING)],
+        partialFilterExpression={"is_online": True, "is_verified": True},
+        name="captains_available_location_vehicle",
+    ),
+    IndexModel([("home_location", GEOSPHERE)], name="captain_home_location_2dsphere"),
+    IndexModel([("created_at", ASCENDING)], name="captains_created_at"),
+])
+retire("captains", ["captain_location_2dsphere"])
@@ -1,7 +1,10 @@
 import logging
 from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
-from core.db import get_db
+from core.db import get_async_db, get_db
+from core.log_writer import log_writer
+from core.read_models import CAPTAIN_BATCH, CAPTAIN_GPS, JOB_DISPATCH
 from core.utils import utcnow, to_object_id
 from core.geo_utils import to_point, haversine_km
 from core.vehicles import is_ev_vehicle
@@ -94,7 +97,11 @@ def ensure_captain_profile(user_id: str):
         "last_seen": utcnow(),
         "created_at": utcnow(),
     }
-    result = db.captains.insert_one(doc)
+    try:
+        result = db.captains.insert_one(doc)
+    except DuplicateKeyError:
+        # A concurrent request created the profile between the lookup and the insert.
+        return db.captains.find_one({"user_id": oid})
     doc["_id"] = result.inserted_id
     return doc
 
@@ -122,74 +129,132 @@ def set_online_status(user_id: str, is_online: bool):
     return db.captains.find_one({"user_id": oid})
 
 
+def _gps_jump(existing, lat: float, lng: float):
+    """Returns a trust-log document when the ping implies an impossible speed since the last one."""
+    if not existing or not existing.get("location") or not existing.get("last_seen"):
+        return None
+    coords = existing.get("location", {}).get("coordinates")
+    if not coords or coords[0] is None or coords[1] is None:
+        return None
+    dist_km = haversine_km(coords[1], coords[0], lat, lng)
+    delta_s = max((utcnow() - existing.get("last_seen")).total_seconds(), 1)
+    speed_kmph = (dist_km / (delta_s / 3600.0)) if delta_s > 0 else 0
+    if speed_kmph <= settings.GO_HOME_MAX_SPEED_KMPH:
+        return None
+    return {
+        "user_id": existing.get("user_id"),
+        "findings": [{"type": "GPS_JUMP", "detail": f"speed={speed_kmph:.2f}km/h"}],
+        "created_at": utcnow(),
+    }
+
+
+def _location_update(lat: float, lng: float):
+    return {"$set": {"location": to_point(lat, lng), "last_seen": utcnow()}}
+
+
+def _home_destination(captain: dict):
+    if not captain.get("go_home_mode") or not captain.get("home_location"):
+        return None
+    home_coords = captain.get("home_location", {}).get("coordinates")
+    if not home_coords:
+        return None
+    return {"lat": home_coords[1], "lng": home_coords[0]}
+
+
+def _go_home_update(eta: dict):
+    return {"$set": {
+        "go_home_eta_s": int(eta.get("duration_in_traffic_s") or eta.get("duration_s") or 0),
+        "go_home_distance_m": int(eta.get("distance_m") or 0),
+        "go_home_updated_at": utcnow(),
+    }}
+
+
+def _tracked_jobs(captain: dict):
+    """(job_type, job_id) pairs whose customers follow this captain's location."""
+    job_type = captain.get("current_job_type")
+    if not job_type:
+        return []
+    if job_type == "ORDER":
+        batched = captain.get("batched_order_ids") or []
+        if not batched and captain.get("current_job_id"):
+            batched = [captain.get("current_job_id")]
+        return [("ORDER", str(order_id)) for order_id in batched]
+    if captain.get("current_job_id"):
+        return [(job_type, str(captain.get("current_job_id")))]
+    return []
+
+
 def update_location(user_id: str, lat: float, lng: float):
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
         return None
-    existing = db.captains.find_one({"user_id": oid})
-    if existing and existing.get("location") and existing.get("last_seen"):
-        coords = existing.get("location", {}).get("coordinates")
-        if coords and coords[0] is not None and coords[1] is not None:
-            last_lat = coords[1]
-            last_lng = coords[0]
-            dist_km = haversine_km(last_lat, last_lng, lat, lng)
-            delta_s = max((utcnow() - existing.get("last_seen")).total_seconds(), 1)
-            speed_kmph = (dist_km / (delta_s / 3600.0)) if delta_s > 0 else 0
-            if speed_kmph > settings.GO_HOME_MAX_SPEED_KMPH:
-                db.trust_logs.insert_one({
-                    "user_id": oid,
-                    "findings": [{"type": "GPS_JUMP", "detail": f"speed={speed_kmph:.2f}km/h"}],
-                    "created_at": utcnow(),
-                })
-                return existing
-    db.captains.update_one(
+    existing = db.captains.find_one({"user_id": oid}, CAPTAIN_GPS)
+    jump = _gps_jump({**existing, "user_id": oid} if existing else None, lat, lng)
+    if jump:
+        log_writer.write("trust_logs", jump)
+        return db.captains.find_one({"user_id": oid})
+    updated = db.captains.find_one_and_update(
         {"user_id": oid},
-        {"$set": {"location": to_point(lat, lng), "last_seen": utcnow()}},
+        _location_update(lat, lng),
+        return_document=ReturnDocument.AFTER,
     )
-    updated = db.captains.find_one({"user_id": oid})
-    if updated and updated.get("go_home_mode") and updated.get("home_location"):
+    if not updated:
+        return updated
+    home = _home_destination(updated)
+    if home:
         try:
             from maps import services as maps_services
-            home_coords = updated.get("home_location", {}).get("coordinates")
-            if home_coords:
-                eta = maps_services.get_eta(
-                    {"lat": lat, "lng": lng},
-                    {"lat": home_coords[1], "lng": home_coords[0]},
-                )
-                db.captains.update_one(
-                    {"user_id": oid},
-                    {"$set": {
-                        "go_home_eta_s": int(eta.get("duration_in_traffic_s") or eta.get("duration_s") or 0),
-                        "go_home_distance_m": int(eta.get("distance_m") or 0),
-                        "go_home_updated_at": utcnow(),
-                    }},
-                )
+            eta = maps_services.get_eta(
+                {"lat": lat, "lng": lng},
+                home,
+                caller=maps_services.metering.CALLER_GO_HOME,
+            )
+            db.captains.update_one({"user_id": oid}, _go_home_update(eta))
         except Exception:
             pass
-    if updated and updated.get("current_job_type"):
+    jobs = _tracked_jobs(updated)
+    if jobs:
         from core import matching_service
-        if updated.get("current_job_type") == "ORDER":
-            batched = updated.get("batched_order_ids") or []
-            if not batched and updated.get("current_job_id"):
-                batched = [updated.get("current_job_id")]
-            for order_id in batched:
-                matching_service.broadcast_location(
-                    "ORDER",
-                    str(order_id),
-                    str(updated.get("user_id")),
-                    lat,
-                    lng,
-                )
-        else:
-            if updated.get("current_job_id"):
-                matching_service.broadcast_location(
-                    updated.get("current_job_type"),
-                    str(updated.get("current_job_id")),
-                    str(updated.get("user_id")),
-                    lat,
-                    lng,
-                )
+        for job_type, job_id in jobs:
+            matching_service.broadcast_location(job_type, job_id, str(updated.get("user_id")), lat, lng)
+    return updated
+
+
+async def aupdate_location(user_id: str, lat: float, lng: float):
+    db = get_async_db()
+    oid = to_object_id(user_id)
+    if not oid:
+        return None
+    existing = await db.captains.find_one({"user_id": oid}, CAPTAIN_GPS)
+    jump = _gps_jump({**existing, "user_id": oid} if existing else None, lat, lng)
+    if jump:
+        await log_writer.awrite("trust_logs", jump)
+        return await db.captains.find_one({"user_id": oid})
+    updated = await db.captains.find_one_and_update(
+        {"user_id": oid},
+        _location_update(lat, lng),
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        return updated
+    home = _home_destination(updated)
+    if home:
+        try:
+            from maps import services as maps_services
+            eta = await maps_services.aget_eta(
+                {"lat": lat, "lng": lng},
+                home,
+                caller=maps_services.metering.CALLER_GO_HOME,
+            )
+            await db.captains.update_one({"user_id": oid}, _go_home_update(eta))
+        except Exception:
+            pass
+    jobs = _tracked_jobs(updated)
+    if jobs:
+        from core import matching_service
+        for job_type, job_id in jobs:
+            await matching_service.abroadcast_location(job_type, job_id, str(updated.get("user_id")), lat, lng)
     return updated
 
 
@@ -353,7 +418,7 @@ def accept_job(user_id: str, job_type: str, job_id: str):
     )
     if job_type == "ORDER":
         order_oid = to_object_id(job_id)
-        order_doc = db.orders.find_one({"_id": order_oid}) if order_oid else None
+        order_doc = db.orders.find_one({"_id": order_oid}, JOB_DISPATCH) if order_oid else None
         db.orders.update_one(
             {"_id": order_oid},
             {"$set": {"status": "ASSIGNED", "captain_id": oid}},
@@ -367,7 +432,7 @@ def accept_job(user_id: str, job_type: str, job_id: str):
             )
     if job_type == "RIDE":
         ride_oid = to_object_id(job_id)
-        ride_doc = db.rides.find_one({"_id": ride_oid}) if ride_oid else None
+        ride_doc = db.rides.find_one({"_id": ride_oid}, JOB_DISPATCH) if ride_oid else None
         db.rides.update_one(
             {"_id": ride_oid},
             {"$set": {"status": "ASSIGNED", "captain_id": oid}},
@@ -398,7 +463,7 @@ def complete_job(user_id: str, job_type: str, job_id: str):
     )
     if job_type == "ORDER":
         order_oid = to_object_id(job_id)
-        order_doc = db.orders.find_one({"_id": order_oid}) if order_oid else None
+        order_doc = db.orders.find_one({"_id": order_oid}, JOB_DISPATCH) if order_oid else None
         try:
             from orders import state_machine as order_state
             order_state.set_order_status(job_id, "DELIVERED", reason="COMPLETED")
@@ -416,7 +481,7 @@ def complete_job(user_id: str, job_type: str, job_id: str):
             {"user_id": oid},
             {"$pull": {"batched_order_ids": order_oid}},
         )
-        captain_doc = db.captains.find_one({"user_id": oid})
+        captain_doc = db.captains.find_one({"user_id": oid}, CAPTAIN_BATCH)
         remaining = captain_doc.get("batched_order_ids") if captain_doc else []
         if remaining:
             db.captains.update_one(
@@ -434,7 +499,7 @@ def complete_job(user_id: str, job_type: str, job_id: str):
             )
     if job_type == "RIDE":
         ride_oid = to_object_id(job_id)
-        ride_doc = db.rides.find_one({"_id": ride_oid}) if ride_oid else None
+        ride_doc = db.rides.find_one({"_id": ride_oid}, JOB_DISPATCH) if ride_oid else None
         try:
             from rides import state_machine as ride_state
             ride_state.set_ride_status(job_id, "COMPLETED", reason="COMPLETED")
@@ -1,3 +1,20 @@
-from django.test import TestCase
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from bson import ObjectId
+from django.test import SimpleTestCase
+from pymongo.errors import DuplicateKeyError
+
+from captains import services as captain_services
+
+
+class CaptainProfileTests(SimpleTestCase):
+    def test_concurrent_profile_creation_returns_the_existing_profile(self):
+        user_id = ObjectId()
+        winner = {"_id": ObjectId(), "user_id": user_id}
+        db = MagicMock()
+        db.captains.find_one.side_effect = [None, winner]
+        db.captains.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error")
+        with patch("captains.services.get_db", return_value=db):
+            profile = captain_services.ensure_captain_profile(str(user_id))
+        self.assertEqual(profile, winner)
+        db.captains.find_one.assert_called_with({"user_id": user_id})
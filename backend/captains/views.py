@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
+from core.async_views import AsyncAPIView
 from core.permissions import RolePermission
 from core.utils import serialize_doc
 from captains.serializers import (
@@ -52,6 +53,21 @@ class CaptainLocationView(APIView):
         return Response({"captain": serialize_doc(updated)})
 
 
+class AsyncCaptainLocationView(AsyncAPIView):
+    allowed_roles = ["CAPTAIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def post(self, request):
+        serializer = LocationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = await services.aupdate_location(
+            request.user.id,
+            serializer.validated_data["lat"],
+            serializer.validated_data["lng"],
+        )
+        return Response({"captain": serialize_doc(updated)})
+
+
 class CaptainAcceptJobView(APIView):
     allowed_roles = ["CAPTAIN"]
     permission_classes = [IsAuthenticated, RolePermission]
@@ -72,6 +88,24 @@ class CaptainAcceptJobView(APIView):
         return Response({"job": serialize_doc(job)})
 
 
+class AsyncCaptainAcceptJobView(AsyncAPIView):
+    allowed_roles = ["CAPTAIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def post(self, request):
+        serializer = JobSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job = await matching_service.aaccept_job(
+                serializer.validated_data["job_type"],
+                serializer.validated_data["job_id"],
+                request.user.id,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"job": serialize_doc(job)})
+
+
 class CaptainCompleteJobView(APIView):
     allowed_roles = ["CAPTAIN"]
     permission_classes = [IsAuthenticated, RolePermission]
@@ -131,6 +165,24 @@ class JobAcceptView(APIView):
         return Response({"job": serialize_doc(job)})
 
 
+class AsyncJobAcceptView(AsyncAPIView):
+    allowed_roles = ["CAPTAIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def post(self, request):
+        serializer = JobDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job = await matching_service.aaccept_job(
+                serializer.validated_data["job_type"],
+                serializer.validated_data["job_id"],
+                request.user.id,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"job": serialize_doc(job)})
+
+
 class JobRejectView(APIView):
     allowed_roles = ["CAPTAIN"]
     permission_classes = [IsAuthenticated, RolePermission]
@@ -151,6 +203,24 @@ class JobRejectView(APIView):
         return Response({"rejected": True})
 
 
+class AsyncJobRejectView(AsyncAPIView):
+    allowed_roles = ["CAPTAIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def post(self, request):
+        serializer = JobDecisionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            await matching_service.areject_job(
+                serializer.validated_data["job_type"],
+                serializer.validated_data["job_id"],
+                request.user.id,
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"rejected": True})
+
+
 class JobCompleteView(APIView):
     allowed_roles = ["CAPTAIN"]
     permission_classes = [IsAuthenticated, RolePermission]
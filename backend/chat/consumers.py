@@ -1,16 +1,16 @@
-from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
 from chat import services
+from core.tracing import TracedConsumerMixin, inject
 
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
+class ChatConsumer(TracedConsumerMixin, AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.room_id = self.scope["url_route"]["kwargs"]["room_id"]
         self.group_name = f"chat_{self.room_id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
-        await sync_to_async(services.ensure_chat_room)(self.room_id)
+        await services.aensure_chat_room(self.room_id)
 
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(self.group_name, self.channel_name)
@@ -24,7 +24,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             message_id = content.get("message_id")
             user_id = content.get("user_id")
             if message_id and user_id:
-                await sync_to_async(services.mark_delivered)(message_id, user_id)
+                await services.amark_delivered(message_id, user_id)
             return
         if msg_type != "message":
             return
@@ -40,7 +40,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.send_json({"type": "error", "detail": "Invalid message"})
             return
 
-        message_doc = await sync_to_async(services.store_message)(
+        message_doc = await services.astore_message(
             self.room_id,
             sender_id,
             sender_role,
@@ -65,7 +65,7 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
         }
         await self.channel_layer.group_send(
             self.group_name,
-            {"type": "chat_message", "payload": payload},
+            inject({"type": "chat_message", "payload": payload}),
         )
         await self.send_json({"type": "ack", "message_id": str(message_doc.get("_id"))})
 
@@ -0,0 +1,23 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register, retire
+
+register("chats", [
+    IndexModel([("room_id", ASCENDING)], unique=True, name="chats_room_id"),
+])
+register("messages", [
+    IndexModel(
+        [("room_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="messages_room_created_id",
+    ),
+])
+retire("messages", ["messages_room_created_at"])
+register("chat_read_receipts", [
+    IndexModel([("room_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="chat_read_receipts_room_user"),
+])
+register("chat_abuse_flags", [
+    IndexModel([("room_id", ASCENDING), ("created_at", DESCENDING)], name="chat_abuse_flags_room_created"),
+])
+register("chat_typing_events", [
+    IndexModel([("room_id", ASCENDING), ("created_at", DESCENDING)], name="chat_typing_events_room_created"),
+])
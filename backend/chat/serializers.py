@@ -11,6 +11,7 @@ class ChatSendSerializer(serializers.Serializer):
 
 class ChatHistorySerializer(serializers.Serializer):
     limit = serializers.IntegerField(required=False, min_value=1, max_value=200)
+    cursor = serializers.CharField(required=False)
 
 
 class ChatReceiptSerializer(serializers.Serializer):
@@ -2,24 +2,12 @@ import re
 from typing import Optional, List
 
 from django.conf import settings
-from core.db import get_db
+from pymongo import ReturnDocument
+from core.db import get_async_db, get_db
+from core.log_writer import log_writer
+from core.pagination import paginate
 from core.utils import utcnow, to_object_id
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.chats.create_index([("room_id", 1)], unique=True, name="chats_room_id")
-    db.messages.create_index([("room_id", 1), ("created_at", -1)], name="messages_room_created_at")
-    db.chat_read_receipts.create_index([("room_id", 1), ("user_id", 1)], unique=True, name="chat_read_receipts_room_user")
-    db.chat_abuse_flags.create_index([("room_id", 1), ("created_at", -1)], name="chat_abuse_flags_room_created")
-    db.chat_typing_events.create_index([("room_id", 1), ("created_at", -1)], name="chat_typing_events_room_created")
-    _index_ready = True
-
 
 def _abuse_words():
     words = getattr(settings, "CHAT_ABUSE_WORDS", None)
@@ -48,86 +36,145 @@ def _find_abuse_words(text: str):
     return matches
 
 
-def ensure_chat_room(room_id: str, participants: Optional[List[dict]] = None, job_type: Optional[str] = None):
-    ensure_indexes()
-    db = get_db()
-    doc = db.chats.find_one({"room_id": room_id})
-    if doc:
-        return doc
-    doc = {
+def _new_room(room_id: str, participants: Optional[List[dict]], job_type: Optional[str]):
+    return {
         "room_id": room_id,
         "participants": participants or [],
         "job_type": job_type,
         "created_at": utcnow(),
         "last_message_at": None,
     }
-    db.chats.insert_one(doc)
-    return doc
 
 
-def store_message(
+def _new_message(
     room_id: str,
     sender_id: str,
     sender_role: str,
     receiver_id: Optional[str],
     receiver_role: Optional[str],
     text: str,
-    client_message_id: Optional[str] = None,
+    client_message_id: Optional[str],
+    abuse_words: List[str],
 ):
-    ensure_indexes()
-    db = get_db()
-    clean_text = filter_message(text)
-    abuse_words = _find_abuse_words(text)
-    doc = {
+    return {
         "room_id": room_id,
         "sender_id": to_object_id(sender_id),
         "sender_role": sender_role,
         "receiver_id": to_object_id(receiver_id) if receiver_id else None,
         "receiver_role": receiver_role,
-        "text": clean_text,
+        "text": filter_message(text),
         "client_message_id": client_message_id,
         "created_at": utcnow(),
         "delivered_to": [],
         "abuse_flagged": bool(abuse_words),
     }
+
+
+def _abuse_flag(doc: dict, sender_id: str, abuse_words: List[str]):
+    return {
+        "room_id": doc["room_id"],
+        "message_id": doc["_id"],
+        "sender_id": to_object_id(sender_id),
+        "words": abuse_words,
+        "created_at": utcnow(),
+    }
+
+
+def _delivered_update(user_id: str):
+    return {"$addToSet": {"delivered_to": to_object_id(user_id)}, "$set": {"delivered_at": utcnow()}}
+
+
+def ensure_chat_room(room_id: str, participants: Optional[List[dict]] = None, job_type: Optional[str] = None):
+    db = get_db()
+    doc = db.chats.find_one({"room_id": room_id})
+    if doc:
+        return doc
+    doc = _new_room(room_id, participants, job_type)
+    db.chats.insert_one(doc)
+    return doc
+
+
+async def aensure_chat_room(room_id: str, participants: Optional[List[dict]] = None, job_type: Optional[str] = None):
+    db = get_async_db()
+    doc = await db.chats.find_one({"room_id": room_id})
+    if doc:
+        return doc
+    doc = _new_room(room_id, participants, job_type)
+    await db.chats.insert_one(doc)
+    return doc
+
+
+def store_message(
+    room_id: str,
+    sender_id: str,
+    sender_role: str,
+    receiver_id: Optional[str],
+    receiver_role: Optional[str],
+    text: str,
+    client_message_id: Optional[str] = None,
+):
+    db = get_db()
+    abuse_words = _find_abuse_words(text)
+    doc = _new_message(
+        room_id, sender_id, sender_role, receiver_id, receiver_role, text, client_message_id, abuse_words
+    )
     result = db.messages.insert_one(doc)
     doc["_id"] = result.inserted_id
     db.chats.update_one({"room_id": room_id}, {"$set": {"last_message_at": utcnow()}}, upsert=True)
     if abuse_words:
-        db.chat_abuse_flags.insert_one({
-            "room_id": room_id,
-            "message_id": doc["_id"],
-            "sender_id": to_object_id(sender_id),
-            "words": abuse_words,
-            "created_at": utcnow(),
-        })
+        db.chat_abuse_flags.insert_one(_abuse_flag(doc, sender_id, abuse_words))
+    return doc
+
+
+async def astore_message(
+    room_id: str,
+    sender_id: str,
+    sender_role: str,
+    receiver_id: Optional[str],
+    receiver_role: Optional[str],
+    text: str,
+    client_message_id: Optional[str] = None,
+):
+    db = get_async_db()
+    abuse_words = _find_abuse_words(text)
+    doc = _new_message(
+        room_id, sender_id, sender_role, receiver_id, receiver_role, text, client_message_id, abuse_words
+    )
+    result = await db.messages.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    await db.chats.update_one({"room_id": room_id}, {"$set": {"last_message_at": utcnow()}}, upsert=True)
+    if abuse_words:
+        await db.chat_abuse_flags.insert_one(_abuse_flag(doc, sender_id, abuse_words))
     return doc
 
 
-def list_messages(room_id: str, limit: int = 50):
-    ensure_indexes()
+def list_messages(room_id: str, limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
-    cursor = db.messages.find({"room_id": room_id}).sort("created_at", -1).limit(limit)
-    return list(cursor)
+    return paginate(db.messages, {"room_id": room_id}, limit, cursor, sort_field="created_at")
 
 
 def mark_delivered(message_id: str, user_id: str):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(message_id)
     if not oid:
         return None
-    result = db.messages.update_one(
-        {"_id": oid},
-        {"$addToSet": {"delivered_to": to_object_id(user_id)}, "$set": {"delivered_at": utcnow()}},
-    )
+    result = db.messages.update_one({"_id": oid}, _delivered_update(user_id))
     if result.matched_count == 0:
         return None
     return db.messages.find_one({"_id": oid})
 
 
+async def amark_delivered(message_id: str, user_id: str):
+    db = get_async_db()
+    oid = to_object_id(message_id)
+    if not oid:
+        return None
+    return await db.messages.find_one_and_update(
+        {"_id": oid}, _delivered_update(user_id), return_document=ReturnDocument.AFTER
+    )
+
+
 def mark_read(room_id: str, user_id: str, message_id: Optional[str] = None):
-    ensure_indexes()
     db = get_db()
     receipt = {
         "room_id": room_id,
@@ -144,15 +191,13 @@ def mark_read(room_id: str, user_id: str, message_id: Optional[str] = None):
 
 
 def record_typing(room_id: str, user_id: str, is_typing: bool):
-    ensure_indexes()
-    db = get_db()
     event = {
         "room_id": room_id,
         "user_id": to_object_id(user_id),
         "is_typing": bool(is_typing),
         "created_at": utcnow(),
     }
-    db.chat_typing_events.insert_one(event)
+    log_writer.write("chat_typing_events", event)
     return event
 
 
@@ -0,0 +1,41 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+from django.test import SimpleTestCase
+
+from chat import consumers
+from chat import services as chat_services
+from core.utils import utcnow
+
+
+class AsyncChatTests(SimpleTestCase):
+    def test_store_message_awaits_writes_and_flags_abuse(self):
+        db = MagicMock()
+        db.messages.insert_one = AsyncMock(return_value=MagicMock(inserted_id=ObjectId()))
+        db.chats.update_one = AsyncMock()
+        db.chat_abuse_flags.insert_one = AsyncMock()
+        sender = str(ObjectId())
+        with patch("chat.services.get_async_db", return_value=db):
+            doc = asyncio.run(chat_services.astore_message("room1", sender, "USER", None, None, "no spam please"))
+        self.assertEqual(doc["text"], "no *** please")
+        self.assertTrue(doc["abuse_flagged"])
+        db.chats.update_one.assert_awaited_once()
+        flag = db.chat_abuse_flags.insert_one.await_args.args[0]
+        self.assertEqual(flag["message_id"], doc["_id"])
+
+    def test_chat_consumer_does_not_hop_threads(self):
+        doc = {"_id": ObjectId(), "text": "hi", "created_at": utcnow()}
+        consumer = consumers.ChatConsumer()
+        consumer.room_id = "room1"
+        consumer.group_name = "chat_room1"
+        consumer.channel_layer = MagicMock(group_send=AsyncMock())
+        consumer.send_json = AsyncMock()
+        with patch("chat.services.astore_message", AsyncMock(return_value=doc)) as store, \
+                patch("chat.services.store_message") as sync_store:
+            asyncio.run(consumer.receive_json({
+                "type": "message", "sender_id": "u1", "sender_role": "USER", "message": "hi",
+            }))
+        store.assert_awaited_once()
+        sync_store.assert_not_called()
+        consumer.send_json.assert_awaited_once_with({"type": "ack", "message_id": str(doc["_id"])})
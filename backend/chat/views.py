@@ -12,15 +12,18 @@ class ChatHistoryView(APIView):
     allowed_roles = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
     permission_classes = [IsAuthenticated, RolePermission]
 
-    # Sample: GET /api/v1/chat/history/<room_id>?limit=50
+    # Sample: GET /api/v1/chat/history/<room_id>?limit=50&cursor=<next_cursor>
     def get(self, request, room_id: str):
         serializer = ChatHistorySerializer(data=request.query_params)
         serializer.is_valid(raise_exception=True)
         if not services.is_participant(room_id, request.user.id, getattr(request.user, "role", None)):
             return Response({"detail": "Not allowed"}, status=403)
         limit = serializer.validated_data.get("limit", 50)
-        messages = services.list_messages(room_id, limit=limit)
-        return Response({"messages": serialize_doc(messages)})
+        try:
+            page = services.list_messages(room_id, limit=limit, cursor=serializer.validated_data.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=400)
+        return Response({"messages": serialize_doc(list(page)), "next_cursor": page.next_cursor})
 
 
 class ChatMaskedCallView(APIView):
@@ -9,15 +9,27 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 
 from core.channels import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('ASYNC_HOT_VIEWS', '1')
 
-django_asgi_app = get_asgi_application()
+django.setup(set_prefix=False)
+
+from observability.profiler import ProfilingASGIHandler  # noqa: E402
+
+# get_asgi_application(), with sync views wrapped so the profiler samples the thread they run on.
+django_asgi_app = ProfilingASGIHandler()
+
+from core.indexes import verify_on_startup  # noqa: E402
+from core.warmup import warm_up  # noqa: E402
+
+verify_on_startup()
+warm_up()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -0,0 +1,69 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """APIView with coroutine handlers for latency-critical endpoints served under ASGI.
+
+    Authenticators are awaited through `aauthenticate` when they provide one, and the response is
+    rendered before it leaves the view; Django would otherwise render it in the thread executor.
+    """
+
+    async def options(self, request, *args, **kwargs):
+        return super().options(request, *args, **kwargs)
+
+    async def perform_async_authentication(self, request):
+        for authenticator in request.authenticators:
+            try:
+                authenticate = getattr(authenticator, "aauthenticate", None)
+                if authenticate:
+                    user_auth_tuple = await authenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.perform_async_authentication(request)
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return _rendered(self.response)
+
+
+def _rendered(response) -> HttpResponse:
+    response.render()
+    plain = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        plain[header] = value
+    plain.cookies = response.cookies
+    return plain
+
+
+def hot_path_view(sync_view, async_view):
+    """Routes a hot endpoint to its async view when ASYNC_HOT_VIEWS is on (the ASGI default), else the sync one."""
+    view = async_view if getattr(settings, "ASYNC_HOT_VIEWS", False) else sync_view
+    return view.as_view()
@@ -1,13 +1,30 @@
 from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
+import json
+import logging
+import time
 import uuid
 import jwt
+from asgiref.sync import sync_to_async
 from bson import ObjectId
 from django.conf import settings
 from rest_framework.authentication import BaseAuthentication, get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
 
-from core.db import get_db
+from core.db import get_async_db, get_db
+from core.redis_queue import get_async_client, get_client
+
+PRINCIPAL_PROJECTION = {"phone": 1, "role": 1, "is_active": 1, "fcm_token": 1}
+REVOKED_JTIS_KEY = "auth:revoked_jtis"
+REVOKED_SYNC_KEY = "auth:revoked_jtis:synced"
+REVOKED_VERSION_KEY = "auth:revoked_jtis:version"
+_MEMO_ATTR = "_auth_principal"
+
+logger = logging.getLogger(__name__)
+
+_revocations = {
+    "jtis": set(), "version": None, "checked_at": 0.0, "loaded": False, "reconciled": {}, "reconciled_at": None,
+}
 
 
 class MongoUser(SimpleNamespace):
@@ -67,20 +84,213 @@ def decode_token(token: str, verify_type: str = None) -> dict:
     return payload
 
 
+def _principal_key(user_id: str) -> str:
+    return f"auth:principal:{user_id}"
+
+
+def _dump_principal(user_doc: dict) -> str:
+    doc = {field: user_doc.get(field) for field in PRINCIPAL_PROJECTION}
+    doc["_id"] = str(user_doc["_id"])
+    return json.dumps(doc)
+
+
+def _load_principal(raw: str) -> dict:
+    doc = json.loads(raw)
+    doc["_id"] = ObjectId(doc["_id"])
+    return doc
+
+
+def _now_ts() -> int:
+    return int(datetime.now(timezone.utc).timestamp())
+
+
+def _revocation_score(exp, token_type: str = "refresh") -> int:
+    if exp:
+        return int(exp)
+    if token_type == "access":
+        return _now_ts() + int(getattr(settings, "JWT_EXP_MINUTES", 720)) * 60
+    return _now_ts() + int(getattr(settings, "JWT_REFRESH_EXP_MINUTES", 43200)) * 60
+
+
+def backfill_revocation_expiry() -> int:
+    db = get_db()
+    result = db.token_blacklist.update_many(
+        {"expires_at": {"$exists": False}, "exp": {"$type": "number"}},
+        [{"$set": {"expires_at": {"$toDate": {"$multiply": ["$exp", 1000]}}}}],
+    )
+    return result.modified_count
+
+
+def _sync_revocations(client):
+    # Backfills the Redis mirror from Mongo the first time a fresh Redis is used.
+    db = get_db()
+    mapping = {}
+    query = {"token_type": "access", "exp": {"$gt": _now_ts()}}
+    for doc in db.token_blacklist.find(query, {"jti": 1, "exp": 1}):
+        mapping[doc["jti"]] = _revocation_score(doc.get("exp"), "access")
+    if mapping:
+        client.zadd(REVOKED_JTIS_KEY, mapping)
+    client.set(REVOKED_SYNC_KEY, 1)
+
+
+def _reconcile_sec() -> float:
+    return float(getattr(settings, "AUTH_REVOCATION_RECONCILE_SEC", 60))
+
+
+def _reconcile_due() -> bool:
+    reconciled_at = _revocations["reconciled_at"]
+    return reconciled_at is None or (datetime.now(timezone.utc) - reconciled_at).total_seconds() >= _reconcile_sec()
+
+
+def _reconcile_query() -> dict:
+    # A revocation whose Redis mirror write failed is still in Mongo. The first pass loads every live
+    # access revocation; later passes only read what was created since the previous one, overlapping
+    # by one interval to absorb clock skew between workers.
+    query = {"token_type": "access", "exp": {"$gt": _now_ts()}}
+    reconciled_at = _revocations["reconciled_at"]
+    if reconciled_at is not None:
+        query["created_at"] = {"$gte": reconciled_at - timedelta(seconds=_reconcile_sec())}
+    return query
+
+
+def _merge_reconciled(docs, started_at):
+    now = _now_ts()
+    reconciled = {jti: exp for jti, exp in _revocations["reconciled"].items() if exp > now}
+    for doc in docs:
+        reconciled[doc["jti"]] = _revocation_score(doc.get("exp"), "access")
+    _revocations["reconciled"] = reconciled
+    _revocations["reconciled_at"] = started_at
+    _revocations["jtis"] = _revocations["jtis"] | set(reconciled)
+
+
+def _load_snapshot(jtis, version):
+    # Revocations only known from Mongo survive a reload from a Redis mirror that never got them.
+    _revocations["jtis"] = set(jtis) | set(_revocations["reconciled"])
+    _revocations["version"] = version
+    _revocations["loaded"] = True
+
+
+def _reconcile_revocations():
+    started_at = datetime.now(timezone.utc)
+    try:
+        docs = list(get_db().token_blacklist.find(_reconcile_query(), {"jti": 1, "exp": 1}))
+    except Exception as exc:
+        logger.warning("revocation_reconcile_failed error=%s", exc)
+        return
+    _merge_reconciled(docs, started_at)
+
+
+async def _areconcile_revocations():
+    started_at = datetime.now(timezone.utc)
+    try:
+        cursor = get_async_db().token_blacklist.find(_reconcile_query(), {"jti": 1, "exp": 1})
+        docs = await cursor.to_list(length=None)
+    except Exception as exc:
+        logger.warning("revocation_reconcile_failed error=%s", exc)
+        return
+    _merge_reconciled(docs, started_at)
+
+
+def _refresh_revocations():
+    client = get_client()
+    pipe = client.pipeline(transaction=False)
+    pipe.exists(REVOKED_SYNC_KEY)
+    pipe.get(REVOKED_VERSION_KEY)
+    synced, version = pipe.execute()
+    if not synced:
+        _sync_revocations(client)
+        version = str(client.incr(REVOKED_VERSION_KEY))
+    if version != _revocations["version"] or not _revocations["loaded"]:
+        now = _now_ts()
+        pipe = client.pipeline(transaction=False)
+        pipe.zremrangebyscore(REVOKED_JTIS_KEY, "-inf", now)
+        pipe.zrangebyscore(REVOKED_JTIS_KEY, now, "+inf")
+        _, jtis = pipe.execute()
+        _load_snapshot(jtis, version)
+    if _reconcile_due():
+        _reconcile_revocations()
+    _revocations["checked_at"] = time.monotonic()
+
+
+def _local_revocations():
+    # Each worker keeps a snapshot of unexpired revoked access-token JTIs and only asks Redis whether
+    # it changed once per AUTH_REVOCATION_REFRESH_SEC, which bounds how late a revocation lands.
+    # If the Redis mirror write was lost, the Mongo reconcile every AUTH_REVOCATION_RECONCILE_SEC
+    # still picks the revocation up.
+    # Refresh tokens live for weeks and are only presented on rotation, so they stay out of the
+    # snapshot and are checked against Mongo by `is_token_blacklisted`.
+    refresh_sec = float(getattr(settings, "AUTH_REVOCATION_REFRESH_SEC", 5))
+    if _revocations["loaded"] and time.monotonic() - _revocations["checked_at"] < refresh_sec:
+        return _revocations["jtis"]
+    try:
+        _refresh_revocations()
+    except Exception:
+        return None
+    return _revocations["jtis"]
+
+
+async def _alocal_revocations():
+    refresh_sec = float(getattr(settings, "AUTH_REVOCATION_REFRESH_SEC", 5))
+    if _revocations["loaded"] and time.monotonic() - _revocations["checked_at"] < refresh_sec:
+        return _revocations["jtis"]
+    try:
+        client = get_async_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.exists(REVOKED_SYNC_KEY)
+        pipe.get(REVOKED_VERSION_KEY)
+        synced, version = await pipe.execute()
+        if not synced:
+            # A fresh Redis needs the Mongo backfill; rare enough to take the sync path.
+            await sync_to_async(_refresh_revocations)()
+        elif version != _revocations["version"] or not _revocations["loaded"]:
+            now = _now_ts()
+            pipe = client.pipeline(transaction=False)
+            pipe.zremrangebyscore(REVOKED_JTIS_KEY, "-inf", now)
+            pipe.zrangebyscore(REVOKED_JTIS_KEY, now, "+inf")
+            _, jtis = await pipe.execute()
+            _load_snapshot(jtis, version)
+        if _reconcile_due():
+            await _areconcile_revocations()
+        _revocations["checked_at"] = time.monotonic()
+    except Exception:
+        return None
+    return _revocations["jtis"]
+
+
+def _is_token_blacklisted_db(jti: str) -> bool:
+    db = get_db()
+    return db.token_blacklist.find_one({"jti": jti}) is not None
+
+
 def _is_token_blacklisted(jti: str) -> bool:
     if not jti:
         return False
-    db = get_db()
-    return db.token_blacklist.find_one({"jti": jti}) is not None
+    revoked = _local_revocations()
+    if revoked is None:
+        return _is_token_blacklisted_db(jti)
+    return jti in revoked
+
+
+async def _ais_token_blacklisted(jti: str) -> bool:
+    if not jti:
+        return False
+    revoked = await _alocal_revocations()
+    if revoked is None:
+        return await get_async_db().token_blacklist.find_one({"jti": jti}, {"_id": 1}) is not None
+    return jti in revoked
 
 
 def is_token_blacklisted(jti: str) -> bool:
-    return _is_token_blacklisted(jti)
+    # Refresh-token rotation must not race the snapshot, so it reads Mongo directly.
+    if not jti:
+        return False
+    return _is_token_blacklisted_db(jti)
 
 
 def blacklist_token(jti: str, token_type: str, user_id: str, exp: int):
     if not jti:
         return False
+    score = _revocation_score(exp)
     db = get_db()
     db.token_blacklist.update_one(
         {"jti": jti},
@@ -89,14 +299,77 @@ def blacklist_token(jti: str, token_type: str, user_id: str, exp: int):
             "token_type": token_type,
             "user_id": ObjectId(str(user_id)) if user_id else None,
             "exp": exp,
+            "expires_at": datetime.fromtimestamp(score, tz=timezone.utc),
             "created_at": datetime.now(timezone.utc),
         }},
         upsert=True,
     )
+    if token_type != "access":
+        return True
+    _revocations["jtis"].add(jti)
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        pipe.zadd(REVOKED_JTIS_KEY, {jti: _revocation_score(exp, "access")})
+        pipe.incr(REVOKED_VERSION_KEY)
+        pipe.execute()
+    except Exception as exc:
+        # Other workers pick the revocation up from Mongo on their next reconcile.
+        logger.warning("revocation_mirror_failed jti=%s error=%s", jti, exc)
     return True
 
 
-def get_user_doc_by_token(token: str) -> dict:
+def invalidate_principal(user_id) -> None:
+    if not user_id:
+        return
+    try:
+        get_client().delete(_principal_key(str(user_id)))
+    except Exception:
+        pass
+
+
+def _get_principal(user_id: str, oid: ObjectId):
+    key = _principal_key(user_id)
+    try:
+        raw = get_client().get(key)
+    except Exception:
+        raw = None
+    if raw:
+        return _load_principal(raw)
+
+    db = get_db()
+    user_doc = db.users.find_one({"_id": oid, "is_active": True}, PRINCIPAL_PROJECTION)
+    if user_doc:
+        ttl = int(getattr(settings, "AUTH_PRINCIPAL_CACHE_TTL_SEC", 60))
+        try:
+            if ttl > 0:
+                get_client().set(key, _dump_principal(user_doc), ex=ttl)
+        except Exception:
+            pass
+    return user_doc
+
+
+async def _aget_principal(user_id: str, oid: ObjectId):
+    key = _principal_key(user_id)
+    client = get_async_client()
+    try:
+        raw = await client.get(key)
+    except Exception:
+        raw = None
+    if raw:
+        return _load_principal(raw)
+
+    user_doc = await get_async_db().users.find_one({"_id": oid, "is_active": True}, PRINCIPAL_PROJECTION)
+    if user_doc:
+        ttl = int(getattr(settings, "AUTH_PRINCIPAL_CACHE_TTL_SEC", 60))
+        try:
+            if ttl > 0:
+                await client.set(key, _dump_principal(user_doc), ex=ttl)
+        except Exception:
+            pass
+    return user_doc
+
+
+def _token_claims(token: str):
     try:
         payload = decode_token(token, verify_type="access")
     except jwt.ExpiredSignatureError as exc:
@@ -108,20 +381,51 @@ def get_user_doc_by_token(token: str) -> dict:
     if not user_id:
         raise AuthenticationFailed("Invalid token payload")
 
-    db = get_db()
     try:
         oid = ObjectId(user_id)
     except Exception as exc:
         raise AuthenticationFailed("Invalid token payload") from exc
+    return user_id, oid, payload.get("jti")
+
 
-    jti = payload.get("jti")
+def _active_principal(user_doc) -> dict:
+    if not user_doc or not user_doc.get("is_active", True):
+        raise AuthenticationFailed("User not found or inactive")
+    return user_doc
+
+
+def get_user_doc_by_token(token: str) -> dict:
+    user_id, oid, jti = _token_claims(token)
     if jti and _is_token_blacklisted(jti):
         raise AuthenticationFailed("Token revoked")
+    return _active_principal(_get_principal(user_id, oid))
 
-    user_doc = db.users.find_one({"_id": oid, "is_active": True})
-    if not user_doc:
-        raise AuthenticationFailed("User not found or inactive")
 
+async def aget_user_doc_by_token(token: str) -> dict:
+    user_id, oid, jti = _token_claims(token)
+    if jti and await _ais_token_blacklisted(jti):
+        raise AuthenticationFailed("Token revoked")
+    return _active_principal(await _aget_principal(user_id, oid))
+
+
+def _get_user_doc_memoized(request, token: str) -> dict:
+    # The role middleware and DRF authentication both resolve the same request.
+    target = getattr(request, "_request", request)
+    memo = getattr(target, _MEMO_ATTR, None)
+    if memo and memo[0] == token:
+        return memo[1]
+    user_doc = get_user_doc_by_token(token)
+    setattr(target, _MEMO_ATTR, (token, user_doc))
+    return user_doc
+
+
+async def _aget_user_doc_memoized(request, token: str) -> dict:
+    target = getattr(request, "_request", request)
+    memo = getattr(target, _MEMO_ATTR, None)
+    if memo and memo[0] == token:
+        return memo[1]
+    user_doc = await aget_user_doc_by_token(token)
+    setattr(target, _MEMO_ATTR, (token, user_doc))
     return user_doc
 
 
@@ -130,19 +434,39 @@ def get_user_from_request(request):
     if not auth or not auth.startswith("Bearer "):
         raise AuthenticationFailed("Authentication credentials were not provided")
     token = auth.split(" ", 1)[1]
-    return get_user_doc_by_token(token)
+    return _get_user_doc_memoized(request, token)
+
+
+async def aget_user_from_request(request):
+    auth = get_authorization_header(request).decode("utf-8")
+    if not auth or not auth.startswith("Bearer "):
+        raise AuthenticationFailed("Authentication credentials were not provided")
+    token = auth.split(" ", 1)[1]
+    return await _aget_user_doc_memoized(request, token)
+
+
+def _bearer_token(request):
+    auth = get_authorization_header(request).decode("utf-8")
+    if not auth or not auth.startswith("Bearer "):
+        return None
+    return auth.split(" ", 1)[1]
 
 
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
-        auth = get_authorization_header(request).decode("utf-8")
-        if not auth:
+        token = _bearer_token(request)
+        if not token:
             return None
-        if not auth.startswith("Bearer "):
+        return self._principal(request, _get_user_doc_memoized(request, token))
+
+    async def aauthenticate(self, request):
+        token = _bearer_token(request)
+        if not token:
             return None
+        return self._principal(request, await _aget_user_doc_memoized(request, token))
 
-        token = auth.split(" ", 1)[1]
-        user_doc = get_user_doc_by_token(token)
+    @staticmethod
+    def _principal(request, user_doc: dict):
         user = MongoUser(
             id=str(user_doc["_id"]),
             phone=user_doc.get("phone"),
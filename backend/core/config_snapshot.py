@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from core.redis_queue import get_client
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CHANNEL = "config:invalidate"
+CONFIG_VERSION_KEY = "config:version:{name}"
+
+# Admin-tunable configuration is read on hot paths far more often than it is written, so each
+# worker keeps a snapshot of it. Writers bump a Redis version counter and publish "<name>:<version>"
+# on CONFIG_CHANNEL; a listener thread in every worker reloads the snapshot off the request path.
+# The listener also compares version counters every CONFIG_SNAPSHOT_MAX_AGE_SEC in case it missed
+# a message while disconnected.
+
+_snapshots: Dict[str, "ConfigSnapshot"] = {}
+
+
+def _version_key(name: str) -> str:
+    return CONFIG_VERSION_KEY.format(name=name)
+
+
+def _parse_version(raw) -> int:
+    return int(raw) if raw is not None else 0
+
+
+class ConfigSnapshot:
+    """Worker-local copy of one admin-tunable config.
+
+    Once loaded, `get()` returns the current value without I/O or locking. A reload builds the new
+    value and swaps a single reference, so readers see either the old value or the new one. The
+    value is shared by every reader and must not be mutated.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._state = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._state is not None
+
+    @property
+    def version(self) -> Optional[int]:
+        state = self._state
+        return state[0] if state else None
+
+    def get(self):
+        # Checked on every read: a worker forked after the snapshot was loaded (gunicorn --preload)
+        # inherits the value but not the listener thread.
+        _listener.start()
+        state = self._state
+        if state is None:
+            with self._lock:
+                if self._state is None:
+                    self.reload()
+            state = self._state
+        return state[1]
+
+    async def aget(self):
+        state = self._state
+        if state is None:
+            return await sync_to_async(self.get)()
+        _listener.start()
+        return state[1]
+
+    def reload(self, version: Optional[int] = None):
+        # The version is read before the value, so a write that lands mid-load leaves the
+        # snapshot one version behind and the next check reloads it again.
+        if version is None:
+            try:
+                version = _parse_version(get_client().get(_version_key(self.name)))
+            except Exception:
+                version = None
+        self._state = (version, self._loader())
+
+    def publish(self):
+        """Called after the config is written: reloads this worker and tells the others to."""
+        version = None
+        try:
+            client = get_client()
+            version = int(client.incr(_version_key(self.name)))
+            client.publish(CONFIG_CHANNEL, f"{self.name}:{version}")
+        except Exception as exc:
+            logger.warning("config_publish_failed name=%s error=%s", self.name, exc)
+        self.reload(version)
+
+
+def register(name: str, loader: Callable[[], Any]) -> ConfigSnapshot:
+    snapshot = _snapshots.get(name)
+    if snapshot is None:
+        snapshot = _snapshots[name] = ConfigSnapshot(name, loader)
+    return snapshot
+
+
+def _refresh(snapshot: ConfigSnapshot, version: Optional[int]):
+    current = snapshot.version
+    if version is not None and current is not None and version <= current:
+        return
+    try:
+        snapshot.reload(version)
+    except Exception as exc:
+        logger.warning("config_reload_failed name=%s error=%s", snapshot.name, exc)
+
+
+def _handle_message(data: str):
+    name, _, version = str(data).rpartition(":")
+    snapshot = _snapshots.get(name)
+    if snapshot is None or not snapshot.loaded:
+        return
+    _refresh(snapshot, int(version) if version.isdigit() else None)
+
+
+def _check_versions():
+    loaded = [snapshot for snapshot in list(_snapshots.values()) if snapshot.loaded]
+    if not loaded:
+        return
+    pipe = get_client().pipeline(transaction=False)
+    for snapshot in loaded:
+        pipe.get(_version_key(snapshot.name))
+    for snapshot, raw in zip(loaded, pipe.execute()):
+        version = _parse_version(raw)
+        if version != snapshot.version:
+            _refresh(snapshot, version)
+
+
+class _Listener:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _running(self) -> bool:
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def start(self):
+        if self._running() or not getattr(settings, "CONFIG_SNAPSHOT_SUBSCRIBE", True):
+            return
+        with self._lock:
+            # A forked worker inherits the object but not the thread.
+            if not self._running():
+                self._thread = threading.Thread(target=self._run, name="config-snapshot", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            max_age = float(getattr(settings, "CONFIG_SNAPSHOT_MAX_AGE_SEC", 30))
+            pubsub = None
+            try:
+                pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CONFIG_CHANNEL)
+                _check_versions()
+                checked_at = time.monotonic()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        _handle_message(message["data"])
+                    if time.monotonic() - checked_at >= max_age:
+                        _check_versions()
+                        checked_at = time.monotonic()
+            except Exception as exc:
+                logger.warning("config_listener_failed error=%s", exc)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            # Without Redis there is no version to compare, so fall back to reloading on a timer.
+            for snapshot in [s for s in list(_snapshots.values()) if s.loaded]:
+                _refresh(snapshot, None)
+            time.sleep(max_age)
+
+
+_listener = _Listener()
+
+
+def load_all():
+    for snapshot in list(_snapshots.values()):
+        snapshot.get()
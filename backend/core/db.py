@@ -1,10 +1,25 @@
+import asyncio
+import threading
+import weakref
 from typing import Optional
 from urllib.parse import urlparse
 from django.conf import settings
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient, MongoClient
 
-_client = None
-_db = None
+from core.metrics import MongoCommandTimer
+from core.tracing import MongoTracingListener
+from observability.query_stats import collector as query_stats_collector
+
+DISPATCH = "dispatch"
+ANALYTICS = "analytics"
+LOGGING = "logging"
+
+# One client, and so one connection pool, per workload so analytics scans and log writes cannot
+# starve the dispatch path.
+_dbs = {}
+_dbs_lock = threading.Lock()
+# AsyncMongoClient is bound to the event loop it first runs on, so each loop gets its own.
+_async_dbs = weakref.WeakKeyDictionary()
 
 
 def _parse_db_name(uri: Optional[str]):
@@ -16,14 +31,56 @@ def _parse_db_name(uri: Optional[str]):
     return None
 
 
-def get_db():
-    global _client, _db
-    if _db is None:
-        if not settings.MONGO_URI:
-            raise RuntimeError("MONGO_URI is not configured")
-        _client = MongoClient(settings.MONGO_URI, serverSelectionTimeoutMS=5000)
-        db_name = settings.MONGO_DB_NAME or _parse_db_name(settings.MONGO_URI)
-        if not db_name:
-            raise RuntimeError("MONGO_DB_NAME is not configured")
-        _db = _client[db_name]
-    return _db
+def _db_name() -> str:
+    db_name = settings.MONGO_DB_NAME or _parse_db_name(settings.MONGO_URI)
+    if not db_name:
+        raise RuntimeError("MONGO_DB_NAME is not configured")
+    return db_name
+
+
+def _client_options(workload: str):
+    if not settings.MONGO_URI:
+        raise RuntimeError("MONGO_URI is not configured")
+    config = getattr(settings, "MONGO_WORKLOADS", {}).get(workload)
+    if config is None:
+        raise ValueError(f"Unknown Mongo workload: {workload}")
+    options = {
+        "maxPoolSize": config.get("max_pool_size"),
+        "minPoolSize": config.get("min_pool_size"),
+        "serverSelectionTimeoutMS": config.get("server_selection_timeout_ms"),
+        "socketTimeoutMS": config.get("socket_timeout_ms"),
+        "waitQueueTimeoutMS": config.get("wait_queue_timeout_ms"),
+        "readPreference": config.get("read_preference"),
+    }
+    # Empty or zero values keep the PyMongo default.
+    options = {key: value for key, value in options.items() if value}
+    write_concern = str(config.get("write_concern") or "")
+    if write_concern:
+        options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+    options["appname"] = f"hybrid-{workload}"
+    options["event_listeners"] = [MongoCommandTimer(), MongoTracingListener(), query_stats_collector]
+    return options
+
+
+def get_db(workload: str = DISPATCH):
+    """Database handle for a workload in MONGO_WORKLOADS: dispatch (default), analytics or logging."""
+    db = _dbs.get(workload)
+    if db is None:
+        # Checked again under the lock so concurrent first calls build a single client and pool.
+        with _dbs_lock:
+            db = _dbs.get(workload)
+            if db is None:
+                client = MongoClient(settings.MONGO_URI, **_client_options(workload))
+                db = _dbs[workload] = client[_db_name()]
+    return db
+
+
+def get_async_db(workload: str = DISPATCH):
+    """Async counterpart of `get_db` for consumers and async views; call it from a running loop."""
+    loop = asyncio.get_running_loop()
+    dbs = _async_dbs.setdefault(loop, {})
+    db = dbs.get(workload)
+    if db is None:
+        client = AsyncMongoClient(settings.MONGO_URI, **_client_options(workload))
+        db = dbs[workload] = client[_db_name()]
+    return db
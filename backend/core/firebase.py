@@ -1,11 +1,13 @@
 import json
 import os
-import firebase_admin
-from firebase_admin import credentials
 from django.conf import settings
 
 
 def get_firebase_app():
+    # firebase_admin pulls in google-auth and its crypto stack; workers that never send a push skip it.
+    import firebase_admin
+    from firebase_admin import credentials
+
     # If already initialized, return it
     if firebase_admin._apps:
         return firebase_admin.get_app()
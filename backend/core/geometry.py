@@ -0,0 +1,122 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+POLYLINE_PRECISION = 1e5
+
+
+def points_to_array(points: Iterable[Dict]) -> np.ndarray:
+    coords = [[float(p["lat"]), float(p["lng"])] for p in points]
+    if not coords:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.asarray(coords, dtype=np.float64)
+
+
+def array_to_points(coords: np.ndarray) -> List[Dict]:
+    return [{"lat": float(lat), "lng": float(lng)} for lat, lng in np.asarray(coords).tolist()]
+
+
+def decode_polyline_array(polyline_str: str) -> np.ndarray:
+    """Decode a Google encoded polyline into an (n, 2) array of [lat, lng]."""
+    if not polyline_str:
+        return np.empty((0, 2), dtype=np.float64)
+    chunks = np.frombuffer(polyline_str.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    is_last = chunks < 0x20
+    if not is_last[-1]:
+        raise ValueError("Truncated polyline")
+    # Every value is a run of 5-bit chunks terminated by a chunk below 0x20.
+    value_idx = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    value_start = np.flatnonzero(np.concatenate(([True], is_last[:-1])))
+    shift = (np.arange(len(chunks)) - value_start[value_idx]) * 5
+    values = np.zeros(len(value_start), dtype=np.int64)
+    np.add.at(values, value_idx, (chunks & 0x1f) << shift)
+    if len(values) % 2:
+        raise ValueError("Truncated polyline")
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    coords = np.cumsum(deltas.reshape(-1, 2), axis=0)
+    return coords / POLYLINE_PRECISION
+
+
+def encode_polyline(coords) -> str:
+    arr = coords if isinstance(coords, np.ndarray) else points_to_array(coords)
+    if not len(arr):
+        return ""
+    scaled = np.round(np.asarray(arr, dtype=np.float64) * POLYLINE_PRECISION).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).tolist()
+    out = []
+    for value in values:
+        while value >= 0x20:
+            out.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        out.append(chr(value + 63))
+    return "".join(out)
+
+
+def haversine_km_array(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix_km(coords: np.ndarray) -> np.ndarray:
+    coords = np.asarray(coords, dtype=np.float64)
+    return haversine_km_array(coords[:, None, 0], coords[:, None, 1], coords[None, :, 0], coords[None, :, 1])
+
+
+def distance_points_to_polyline_km(points: np.ndarray, line: np.ndarray) -> np.ndarray:
+    """Distance from each of `points` to the nearest segment of `line`, both (n, 2) [lat, lng] arrays."""
+    points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+    line = np.atleast_2d(np.asarray(line, dtype=np.float64))
+    if not line.size:
+        return np.full(len(points), np.inf)
+    if len(line) == 1:
+        return haversine_km_array(points[:, 0], points[:, 1], line[0, 0], line[0, 1])
+
+    # Equirectangular projection around the route is accurate to well under a metre at city scale.
+    ref_lat = np.radians(line[:, 0].mean())
+    scale = np.array([EARTH_RADIUS_KM, EARTH_RADIUS_KM * np.cos(ref_lat)])
+    line_xy = np.radians(line) * scale
+    points_xy = np.radians(points) * scale
+
+    seg_start = line_xy[:-1]
+    seg_vec = line_xy[1:] - seg_start
+    seg_len_sq = np.einsum("ij,ij->i", seg_vec, seg_vec)
+    rel = points_xy[:, None, :] - seg_start[None, :, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.einsum("psj,sj->ps", rel, seg_vec) / seg_len_sq
+    t = np.clip(np.nan_to_num(t, nan=0.0), 0.0, 1.0)
+    nearest = seg_start[None, :, :] + t[..., None] * seg_vec[None, :, :]
+    dist = np.linalg.norm(points_xy[:, None, :] - nearest, axis=2)
+    return dist.min(axis=1)
+
+
+def distance_point_to_polyline_km(point: Dict, line: np.ndarray) -> float:
+    target = np.array([[float(point["lat"]), float(point["lng"])]])
+    return float(distance_points_to_polyline_km(target, line)[0])
+
+
+def polygon_contains(polygon: Dict, lng: float, lat: float) -> bool:
+    """Even-odd test of a point against a GeoJSON Polygon (outer ring minus holes), planar in lng/lat."""
+    inside = False
+    for ring in polygon.get("coordinates") or []:
+        ring = np.asarray(ring, dtype=np.float64)
+        if len(ring) < 3:
+            continue
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        crosses = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_at = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        if np.count_nonzero(crosses & (lng < x_at)) % 2:
+            inside = not inside
+    return inside
+
+
+def polygon_reach_m(polygon: Dict, lng: float, lat: float) -> float:
+    """Distance in meters from a point to the farthest vertex of a GeoJSON Polygon's outer ring."""
+    ring = np.asarray((polygon.get("coordinates") or [[]])[0], dtype=np.float64)
+    if not len(ring):
+        return 0.0
+    return float(haversine_km_array(lat, lng, ring[:, 1], ring[:, 0]).max() * 1000)
@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from bson import ObjectId
+from django.conf import settings
+
+# Documents loaded by _id during one request or unit of work. Service functions that read the same
+# restaurant or order several times in one flow go through `find_one`/`afind_one`, and only the
+# first read reaches Mongo. Code that writes a memoized collection calls `invalidate` so later
+# reads in the same unit fetch the new version. Outside a unit every call goes straight to Mongo.
+
+_current: ContextVar[Optional["IdentityMap"]] = ContextVar("identity_map", default=None)
+
+
+def _covers(cached: Optional[Dict], wanted: Optional[Dict]) -> bool:
+    if cached is None:
+        return True
+    if wanted is None:
+        return False
+    return all(cached.get(field) for field in wanted if wanted[field] and field != "_id")
+
+
+def _matches(doc: Dict, conditions: Dict) -> bool:
+    # Only plain equality on fields the cached document actually has can be checked locally.
+    for field, value in conditions.items():
+        if isinstance(value, dict) or "." in field or field not in doc or doc[field] != value:
+            return False
+    return True
+
+
+class IdentityMap:
+    def __init__(self):
+        self._docs: Dict[tuple, list] = {}
+
+    def get(self, collection: str, query: Dict, projection: Optional[Dict]) -> Optional[Dict]:
+        conditions = {field: value for field, value in query.items() if field != "_id"}
+        for cached_projection, doc in self._docs.get((collection, query["_id"]), ()):
+            if _covers(cached_projection, projection) and _matches(doc, conditions):
+                return dict(doc)
+        return None
+
+    def remember(self, collection: str, doc: Optional[Dict], projection: Optional[Dict] = None):
+        if doc and doc.get("_id") is not None:
+            self._docs.setdefault((collection, doc["_id"]), []).append((projection, dict(doc)))
+
+    def invalidate(self, collection: str, doc_id):
+        self._docs.pop((collection, doc_id), None)
+
+
+def current() -> Optional[IdentityMap]:
+    return _current.get()
+
+
+@contextmanager
+def unit_of_work():
+    """Memoizes _id lookups until the block exits. Nested units share the outermost map."""
+    if _current.get() is not None or not getattr(settings, "IDENTITY_MAP_ENABLED", True):
+        yield _current.get()
+        return
+    token = _current.set(IdentityMap())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def _lookup(collection, query: Dict, projection: Optional[Dict]):
+    identity_map = _current.get()
+    if identity_map is None or not isinstance(query.get("_id"), ObjectId):
+        return None, None
+    return identity_map, identity_map.get(collection.name, query, projection)
+
+
+def _find_args(query: Dict, projection: Optional[Dict]):
+    return (query,) if projection is None else (query, projection)
+
+
+def find_one(collection, query: Dict, projection: Optional[Dict] = None) -> Optional[Dict]:
+    identity_map, doc = _lookup(collection, query, projection)
+    if doc is not None:
+        return doc
+    doc = collection.find_one(*_find_args(query, projection))
+    if identity_map is not None:
+        identity_map.remember(collection.name, doc, projection)
+    return doc
+
+
+async def afind_one(collection, query: Dict, projection: Optional[Dict] = None) -> Optional[Dict]:
+    identity_map, doc = _lookup(collection, query, projection)
+    if doc is not None:
+        return doc
+    doc = await collection.find_one(*_find_args(query, projection))
+    if identity_map is not None:
+        identity_map.remember(collection.name, doc, projection)
+    return doc
+
+
+def remember(collection: str, doc: Optional[Dict], projection: Optional[Dict] = None):
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.remember(collection, doc, projection)
+
+
+def invalidate(collection: str, doc_id):
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.invalidate(collection, doc_id)
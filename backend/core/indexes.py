@@ -0,0 +1,112 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import autodiscover_modules
+from pymongo import ASCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+# Every app declares its Mongo indexes in `<app>/indexes.py`. They are created at deploy time by
+# `manage.py ensure_indexes`, never on the request path.
+_registry: Dict[str, Dict[str, IndexModel]] = {}
+_retired: Dict[str, set] = {}
+_discovered = False
+
+
+def index_name(model: IndexModel) -> str:
+    return model.document["name"]
+
+
+def register(collection: str, models: Iterable[IndexModel]):
+    indexes = _registry.setdefault(collection, {})
+    for model in models:
+        name = index_name(model)
+        existing = indexes.get(name)
+        if existing is not None and existing.document != model.document:
+            raise ValueError(f"Conflicting declarations for index {collection}.{name}")
+        indexes[name] = model
+
+
+def retire(collection: str, names: Iterable[str]):
+    """Indexes superseded by a newer declaration; `apply` drops them once the replacement is built."""
+    _retired.setdefault(collection, set()).update(names)
+
+
+def retired() -> Dict[str, List[str]]:
+    discover()
+    return {collection: sorted(names) for collection, names in sorted(_retired.items())}
+
+
+def discover():
+    global _discovered
+    if not _discovered:
+        autodiscover_modules("indexes")
+        _discovered = True
+
+
+def declared() -> Dict[str, List[IndexModel]]:
+    discover()
+    return {collection: list(indexes.values()) for collection, indexes in sorted(_registry.items())}
+
+
+def apply(db=None, collections: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+    from core.db import get_db
+
+    db = db if db is not None else get_db()
+    wanted = set(collections or [])
+    created = {}
+    for collection, models in declared().items():
+        if wanted and collection not in wanted:
+            continue
+        created[collection] = db[collection].create_indexes(models)
+    for collection, names in retired().items():
+        if wanted and collection not in wanted:
+            continue
+        existing = {index["name"] for index in db[collection].list_indexes()}
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+    return created
+
+
+def missing(db=None) -> List[str]:
+    from core.db import get_db
+
+    db = db if db is not None else get_db()
+    absent = []
+    for collection, models in declared().items():
+        existing = {index["name"] for index in db[collection].list_indexes()}
+        absent.extend(f"{collection}.{index_name(model)}" for model in models if index_name(model) not in existing)
+    return absent
+
+
+def verify_on_startup() -> List[str]:
+    """MONGO_INDEX_CHECK: `warn` logs missing indexes, `strict` refuses to start, `off` skips the check."""
+    mode = getattr(settings, "MONGO_INDEX_CHECK", "warn")
+    if mode == "off":
+        return []
+    try:
+        absent = missing()
+    except Exception as exc:
+        if mode == "strict":
+            raise ImproperlyConfigured(f"Could not verify Mongo indexes: {exc}") from exc
+        logger.warning("mongo_index_check_skipped error=%s", exc)
+        return []
+    if absent:
+        message = f"Missing Mongo indexes, run `manage.py ensure_indexes`: {', '.join(absent)}"
+        if mode == "strict":
+            raise ImproperlyConfigured(message)
+        logger.warning(message)
+    return absent
+
+
+register("token_blacklist", [
+    IndexModel([("jti", ASCENDING)], unique=True, name="token_blacklist_jti"),
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="token_blacklist_ttl"),
+    IndexModel([("token_type", ASCENDING), ("created_at", ASCENDING)], name="token_blacklist_type_created"),
+])
+register("matching_logs", [
+    IndexModel([("created_at", ASCENDING)], name="matching_logs_created_at"),
+])
@@ -0,0 +1,181 @@
+import atexit
+import logging
+import threading
+import time
+from typing import Dict, List
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo import WriteConcern
+from pymongo.errors import BulkWriteError
+
+from core.db import LOGGING, get_async_db, get_db
+
+logger = logging.getLogger(__name__)
+
+# The logging client writes with w=0. Only these collections may be written that way inline; the
+# rest (trust_logs feeds the risk score) and every bulk flush, which is off the request path and
+# whose write errors feed the failure metric, are acknowledged.
+UNACKNOWLEDGED_COLLECTIONS = {"matching_logs", "eta_logs", "chat_typing_events"}
+ACKNOWLEDGED = WriteConcern(w=1)
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    LOG_WRITER_BUFFERED = Gauge(
+        "log_writer_buffered_documents",
+        "Log documents waiting for the next bulk insert",
+        ["collection"],
+        multiprocess_mode="livesum",
+    )
+    LOG_WRITER_WRITTEN = Counter(
+        "log_writer_documents_written_total",
+        "Log documents written by bulk inserts",
+        ["collection"],
+    )
+    LOG_WRITER_FAILED = Counter(
+        "log_writer_documents_failed_total",
+        "Log documents lost to failed bulk inserts",
+        ["collection"],
+    )
+    LOG_WRITER_OVERFLOW = Counter(
+        "log_writer_overflow_total",
+        "Log documents the caller wrote inline because the buffer was full",
+        ["collection"],
+    )
+    LOG_WRITER_FLUSH_LATENCY = Histogram(
+        "log_writer_flush_duration_seconds",
+        "Duration of one bulk insert",
+        ["collection"],
+    )
+except Exception:
+    LOG_WRITER_BUFFERED = None
+    LOG_WRITER_WRITTEN = None
+    LOG_WRITER_FAILED = None
+    LOG_WRITER_OVERFLOW = None
+    LOG_WRITER_FLUSH_LATENCY = None
+
+
+def _collection(db, name: str, inline: bool = False):
+    if inline and name in UNACKNOWLEDGED_COLLECTIONS:
+        return db[name]
+    return db[name].with_options(write_concern=ACKNOWLEDGED)
+
+
+class LogWriter:
+    """Buffers inserts into append-only log collections and writes them from a background thread.
+
+    Each collection is flushed with one `insert_many(ordered=False)` once it holds
+    LOG_WRITER_BATCH_SIZE documents or every LOG_WRITER_FLUSH_INTERVAL_MS. When LOG_WRITER_MAX_BUFFERED
+    documents are waiting, callers insert their own document instead, so a slow database slows
+    the producers down rather than growing the buffer. Whatever is left is flushed at exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._buffers: Dict[str, List[dict]] = {}
+        self._buffered = 0
+        self._thread = None
+        self._closed = False
+        self._atexit_registered = False
+
+    def _enabled(self) -> bool:
+        return bool(getattr(settings, "LOG_WRITER_ENABLED", True))
+
+    def _buffer(self, collection: str, doc: dict) -> bool:
+        # The id is assigned here so callers that return the document see it before the flush.
+        doc.setdefault("_id", ObjectId())
+        if not self._enabled():
+            return False
+        batch_size = int(getattr(settings, "LOG_WRITER_BATCH_SIZE", 500))
+        max_buffered = int(getattr(settings, "LOG_WRITER_MAX_BUFFERED", 10000))
+        with self._lock:
+            if self._closed or self._buffered >= max_buffered:
+                if LOG_WRITER_OVERFLOW:
+                    LOG_WRITER_OVERFLOW.labels(collection).inc()
+                return False
+            buffer = self._buffers.setdefault(collection, [])
+            buffer.append(doc)
+            self._buffered += 1
+            self._start()
+            if len(buffer) >= batch_size:
+                self._wakeup.notify()
+        if LOG_WRITER_BUFFERED:
+            LOG_WRITER_BUFFERED.labels(collection).inc()
+        return True
+
+    def write(self, collection: str, doc: dict):
+        if not self._buffer(collection, doc):
+            _collection(get_db(LOGGING), collection, inline=True).insert_one(doc)
+
+    async def awrite(self, collection: str, doc: dict):
+        if not self._buffer(collection, doc):
+            await _collection(get_async_db(LOGGING), collection, inline=True).insert_one(doc)
+
+    def _start(self):
+        # Called with the lock held. A forked worker inherits the object but not the thread.
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _take(self) -> Dict[str, List[dict]]:
+        batches = self._buffers
+        self._buffers = {}
+        self._buffered = 0
+        return batches
+
+    def _batch_ready(self) -> bool:
+        batch_size = int(getattr(settings, "LOG_WRITER_BATCH_SIZE", 500))
+        return any(len(docs) >= batch_size for docs in self._buffers.values())
+
+    def _run(self):
+        while True:
+            interval = float(getattr(settings, "LOG_WRITER_FLUSH_INTERVAL_MS", 1000)) / 1000.0
+            with self._lock:
+                if not self._closed and not self._batch_ready():
+                    self._wakeup.wait(interval)
+                batches = self._take()
+                closed = self._closed
+            self._write_batches(batches)
+            if closed:
+                return
+
+    def _write_batches(self, batches: Dict[str, List[dict]]):
+        for collection, docs in batches.items():
+            if LOG_WRITER_BUFFERED:
+                LOG_WRITER_BUFFERED.labels(collection).dec(len(docs))
+            start = time.perf_counter()
+            failed = 0
+            try:
+                _collection(get_db(LOGGING), collection).insert_many(docs, ordered=False)
+            except BulkWriteError as exc:
+                failed = len(exc.details.get("writeErrors") or [])
+                logger.warning("log_writer_partial_flush collection=%s failed=%s", collection, failed)
+            except Exception as exc:
+                failed = len(docs)
+                logger.warning("log_writer_flush_failed collection=%s docs=%s error=%s", collection, failed, exc)
+            if LOG_WRITER_WRITTEN:
+                LOG_WRITER_FLUSH_LATENCY.labels(collection).observe(time.perf_counter() - start)
+                LOG_WRITER_WRITTEN.labels(collection).inc(len(docs) - failed)
+                if failed:
+                    LOG_WRITER_FAILED.labels(collection).inc(failed)
+
+    def flush(self):
+        with self._lock:
+            batches = self._take()
+        self._write_batches(batches)
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+
+log_writer = LogWriter()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import OperationFailure
+
+from core import indexes
+
+
+class Command(BaseCommand):
+    help = "Create the Mongo indexes declared in each app's indexes.py."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report missing indexes; exit 1 if any.")
+        parser.add_argument("--collection", action="append", dest="collections", help="Limit to this collection.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            absent = indexes.missing()
+            for name in absent:
+                self.stdout.write(f"missing {name}")
+            if absent:
+                raise CommandError(f"{len(absent)} declared indexes are missing")
+            self.stdout.write(self.style.SUCCESS("All declared indexes exist."))
+            return
+
+        try:
+            created = indexes.apply(collections=options["collections"])
+        except OperationFailure as exc:
+            raise CommandError(f"Index build failed: {exc}") from exc
+        for collection, names in created.items():
+            self.stdout.write(f"{collection}: {', '.join(names)}")
+        self.stdout.write(self.style.SUCCESS("Indexes ensured."))
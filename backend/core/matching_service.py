@@ -3,14 +3,19 @@ import threading
 from datetime import timedelta
 from typing import Optional
 
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
 from django.conf import settings
 from pymongo import ReturnDocument
 
-from core.db import get_db
-from core.geo_utils import ensure_captain_geo_index, to_point
+from core import identity_map, tracing
+from core.tracing import traced
+from core.db import get_async_db, get_db
+from core.geo_utils import to_point
+from core.log_writer import log_writer
+from core.read_models import CAPTAIN_BATCH, CAPTAIN_DISPATCH, JOB_DISPATCH, RESTAURANT_DISPATCH
 from core.redis_queue import (
+    aclear_offer,
     enqueue_job,
     set_candidates,
     pop_candidate,
@@ -22,7 +27,13 @@ from core.utils import utcnow, to_object_id
 from vehicles import services as vehicle_services
 from notifications import services as notification_services
 from pricing import services as pricing_services
-from core.route_utils import distance_point_to_polyline_km, decode_polyline
+from core.geometry import (
+    decode_polyline_array,
+    distance_point_to_polyline_km,
+    points_to_array,
+    polygon_contains,
+    polygon_reach_m,
+)
 
 
 def _job_collection(job_type: str):
@@ -34,13 +45,32 @@ def _job_collection(job_type: str):
     raise ValueError("Invalid job type")
 
 
+def _async_job_collection(job_type: str):
+    db = get_async_db()
+    if job_type == "ORDER":
+        return db.orders
+    if job_type == "RIDE":
+        return db.rides
+    raise ValueError("Invalid job type")
+
+
 def _send_ws(group: str, event_type: str, payload: dict):
     channel_layer = get_channel_layer()
     if not channel_layer:
         return
     async_to_sync(channel_layer.group_send)(
         group,
-        {"type": event_type, "payload": payload},
+        tracing.inject({"type": event_type, "payload": payload}),
+    )
+
+
+async def _asend_ws(group: str, event_type: str, payload: dict):
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    await channel_layer.group_send(
+        group,
+        tracing.inject({"type": event_type, "payload": payload}),
     )
 
 
@@ -51,7 +81,7 @@ def _resolve_pickup_location(job_type: str, job_doc: dict):
     if job_type == "ORDER":
         restaurant_id = job_doc.get("restaurant_id")
         if restaurant_id:
-            restaurant = db.restaurants.find_one({"_id": restaurant_id})
+            restaurant = identity_map.find_one(db.restaurants, {"_id": restaurant_id}, RESTAURANT_DISPATCH)
             if restaurant and restaurant.get("location"):
                 return restaurant.get("location")
     if job_type == "RIDE":
@@ -154,17 +184,19 @@ def _go_home_metrics(captain: dict, pickup_location: dict, job_doc: dict):
     route_distance_km = None
     try:
         from maps import services as maps_services
-        baseline_eta = maps_services.get_eta(origin, home)
+        caller = maps_services.metering.CALLER_GO_HOME
+        baseline_eta = maps_services.get_eta(origin, home, caller=caller)
         baseline_eta_s = int(baseline_eta.get("duration_in_traffic_s") or baseline_eta.get("duration_s") or 0)
-        leg1 = maps_services.get_eta(origin, job)
-        leg2 = maps_services.get_eta(job, home)
+        leg1 = maps_services.get_eta(origin, job, caller=caller)
+        leg2 = maps_services.get_eta(job, home, caller=caller)
         job_eta_s = int((leg1.get("duration_in_traffic_s") or leg1.get("duration_s") or 0) + (leg2.get("duration_in_traffic_s") or leg2.get("duration_s") or 0))
-        route = maps_services.get_route(origin, home)
-        points = route.get("points")
-        if not points and route.get("polyline"):
-            points = decode_polyline(route.get("polyline"))
-        if points:
-            route_distance_km = distance_point_to_polyline_km(job, points)
+        route = maps_services.get_route(origin, home, caller=caller)
+        if route.get("polyline"):
+            line = decode_polyline_array(route.get("polyline"))
+        else:
+            line = points_to_array(route.get("points") or [])
+        if len(line):
+            route_distance_km = distance_point_to_polyline_km(job, line)
     except Exception:
         baseline_eta_s = None
         job_eta_s = None
@@ -209,26 +241,42 @@ def _try_batch_order(job_doc: dict, pickup_location: dict):
     db = get_db()
     radius = min(settings.CAPTAIN_MATCH_RADIUS_M, 2000)
     allowed = vehicle_services.get_food_allowed_vehicles()
+    location_filter = {
+        "$near": {
+            "$geometry": pickup_location,
+            "$maxDistance": radius,
+        }
+    }
+    polygon = None
+    isochrone_minutes = int(getattr(settings, "ISOCHRONE_BATCH_MINUTES", 0))
+    if isochrone_minutes and job_doc.get("restaurant_id"):
+        try:
+            from maps import isochrones
+            polygon = isochrones.cached_polygon(isochrones.REF_RESTAURANT, job_doc["restaurant_id"], isochrone_minutes)
+        except Exception:
+            polygon = None
+        if polygon:
+            # $near keeps nearest-first order; the isochrone is applied to the candidates below.
+            lng, lat = pickup_location["coordinates"]
+            location_filter["$near"]["$maxDistance"] = polygon_reach_m(polygon, lng, lat)
     query = {
         "is_online": True,
         "is_verified": True,
         "is_busy": True,
         "current_job_type": "ORDER",
-        "location": {
-            "$near": {
-                "$geometry": pickup_location,
-                "$maxDistance": radius,
-            }
-        },
+        "location": location_filter,
     }
     if allowed:
         query["vehicle_type"] = {"$in": allowed}
-    cursor = db.captains.find(query).limit(10)
+    cursor = db.captains.find(query, CAPTAIN_DISPATCH).limit(10)
 
     for captain in cursor:
         batched = captain.get("batched_order_ids") or []
         if len(batched) >= settings.CAPTAIN_MAX_BATCH_ORDERS:
             continue
+        coords = (captain.get("location") or {}).get("coordinates") or []
+        if polygon and (len(coords) != 2 or not polygon_contains(polygon, coords[0], coords[1])):
+            continue
         captain_id = str(captain.get("user_id"))
         if not captain_id:
             continue
@@ -268,7 +316,7 @@ def _try_batch_order(job_doc: dict, pickup_location: dict):
 
         restaurant_id = job_doc.get("restaurant_id")
         if restaurant_id:
-            restaurant = db.restaurants.find_one({"_id": restaurant_id})
+            restaurant = identity_map.find_one(db.restaurants, {"_id": restaurant_id}, RESTAURANT_DISPATCH)
             if restaurant and restaurant.get("owner_id"):
                 notification_services.send_to_user(
                     str(restaurant.get("owner_id")),
@@ -284,8 +332,7 @@ def _try_batch_order(job_doc: dict, pickup_location: dict):
 
 
 def _log_matching_decision(job_type: str, job_id: str, candidate_ids: list, eta_map: dict):
-    db = get_db()
-    db.matching_logs.insert_one({
+    log_writer.write("matching_logs", {
         "job_type": job_type,
         "job_id": to_object_id(job_id),
         "candidate_ids": [to_object_id(cid) for cid in candidate_ids if to_object_id(cid)],
@@ -294,6 +341,7 @@ def _log_matching_decision(job_type: str, job_id: str, candidate_ids: list, eta_
     })
 
 
+@traced()
 def find_nearby_captains(
     pickup_location: dict,
     radius_m: Optional[int] = None,
@@ -301,7 +349,6 @@ def find_nearby_captains(
     vehicle_type: Optional[str] = None,
     allowed_vehicle_types: Optional[list] = None,
 ):
-    ensure_captain_geo_index()
     db = get_db()
     radius = radius_m or settings.CAPTAIN_MATCH_RADIUS_M
     max_limit = limit or settings.CAPTAIN_MATCH_MAX_CANDIDATES
@@ -320,23 +367,26 @@ def find_nearby_captains(
         query["vehicle_type"] = vehicle_type
     if allowed_vehicle_types:
         query["vehicle_type"] = {"$in": allowed_vehicle_types}
-    cursor = db.captains.find(query).limit(max_limit)
+    cursor = db.captains.find(query, CAPTAIN_DISPATCH).limit(max_limit)
     return list(cursor)
 
 
+@traced()
+@identity_map.unit_of_work()
 def create_job(job_type: str, job_id: str):
     collection = _job_collection(job_type)
     oid = to_object_id(job_id)
     if not oid:
         raise ValueError("Invalid job id")
 
-    job_doc = collection.find_one({"_id": oid})
+    job_doc = identity_map.find_one(collection, {"_id": oid}, JOB_DISPATCH)
     if not job_doc:
         raise ValueError("Job not found")
 
     pickup_location = _resolve_pickup_location(job_type, job_doc)
     if not pickup_location:
         collection.update_one({"_id": oid}, {"$set": {"job_status": "NO_LOCATION"}})
+        identity_map.invalidate(collection.name, oid)
         return []
 
     if job_type == "ORDER":
@@ -376,7 +426,11 @@ def create_job(job_type: str, job_id: str):
     eta_map = {}
     try:
         from maps import services as maps_services
-        ranked, eta_map = maps_services.rank_captains_by_eta(pickup_location, ranked)
+        ranked, eta_map = maps_services.rank_captains_by_eta(
+            pickup_location,
+            ranked,
+            caller=maps_services.metering.CALLER_MATCHING,
+        )
     except Exception:
         eta_map = {}
     candidate_ids = [str(captain.get("user_id")) for captain in ranked if captain.get("user_id")]
@@ -394,12 +448,14 @@ def create_job(job_type: str, job_id: str):
             "rejected_captains": [],
         }},
     )
+    identity_map.invalidate(collection.name, oid)
 
     _log_matching_decision(job_type, job_id, candidate_ids, eta_map)
     offer_next_captain(job_type, job_id)
     return candidate_ids
 
 
+@traced()
 def offer_next_captain(job_type: str, job_id: str):
     collection = _job_collection(job_type)
     oid = to_object_id(job_id)
@@ -423,7 +479,8 @@ def offer_next_captain(job_type: str, job_id: str):
             {"_id": oid},
             {"$set": {"job_status": "NO_CAPTAIN", "current_offer": None}},
         )
-        job_doc = collection.find_one({"_id": oid})
+        identity_map.invalidate(collection.name, oid)
+        job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
         if job_doc and job_doc.get("user_id"):
             user_id = str(job_doc.get("user_id"))
             _send_ws(f"user_{user_id}", "job_status", {"status": "NO_CAPTAIN", "job_id": job_id})
@@ -447,11 +504,12 @@ def offer_next_captain(job_type: str, job_id: str):
             },
         }, "$inc": {"job_attempts": 1}},
     )
+    identity_map.invalidate(collection.name, oid)
 
     db = get_db()
     go_home_job = False
     try:
-        captain_doc = db.captains.find_one({"user_id": to_object_id(candidate_id)})
+        captain_doc = db.captains.find_one({"user_id": to_object_id(candidate_id)}, CAPTAIN_DISPATCH)
         go_home_job = bool(captain_doc.get("go_home_mode")) if captain_doc else False
     except Exception:
         go_home_job = False
@@ -463,7 +521,7 @@ def offer_next_captain(job_type: str, job_id: str):
     }
     _send_ws(f"captain_{candidate_id}", "job_offer", payload)
 
-    db.matching_logs.insert_one({
+    log_writer.write("matching_logs", {
         "job_type": job_type,
         "job_id": to_object_id(job_id),
         "offered_captain_id": to_object_id(candidate_id),
@@ -494,7 +552,7 @@ def handle_offer_timeout(job_type: str, job_id: str, captain_id: str):
     oid = to_object_id(job_id)
     if not oid:
         return
-    job_doc = collection.find_one({"_id": oid})
+    job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
     if not job_doc:
         return
     if job_doc.get("job_status") in {"ASSIGNED", "COMPLETED"}:
@@ -517,42 +575,69 @@ def handle_offer_timeout(job_type: str, job_id: str, captain_id: str):
     offer_next_captain(job_type, job_id)
 
 
-def accept_job(job_type: str, job_id: str, captain_id: str):
-    db = get_db()
-    collection = _job_collection(job_type)
-    oid = to_object_id(job_id)
-    captain_oid = to_object_id(captain_id)
-    if not oid or not captain_oid:
-        raise ValueError("Invalid job or captain id")
-
-    job_doc = collection.find_one({"_id": oid})
+def _check_offer(job_doc: Optional[dict], captain_oid):
     if not job_doc:
         raise ValueError("Job not found")
-
     current_offer = job_doc.get("current_offer") or {}
     offered = current_offer.get("captain_id")
     if not offered or str(offered) != str(captain_oid):
         raise ValueError("Job not offered to this captain")
 
+
+def _captain_claim_query(job_type: str, job_doc: dict, captain_oid, food_allowed: Optional[list]):
     captain_query = {"user_id": captain_oid, "is_online": True, "is_busy": False, "is_verified": True}
     if job_type == "ORDER":
-        allowed = vehicle_services.get_food_allowed_vehicles()
-        if allowed:
-            captain_query["vehicle_type"] = {"$in": allowed}
+        if food_allowed:
+            captain_query["vehicle_type"] = {"$in": food_allowed}
     else:
         job_vehicle_type = job_doc.get("vehicle_type")
         if job_vehicle_type:
             captain_query["vehicle_type"] = job_vehicle_type
+    return captain_query
+
+
+def _captain_claim_update(job_type: str, job_id: str, oid):
+    return {"$set": {
+        "is_busy": True,
+        "current_job_id": oid,
+        "current_job_type": job_type,
+        "current_job": {"type": job_type, "id": job_id},
+        "last_assigned_at": utcnow(),
+        "last_seen": utcnow(),
+    }}
+
+
+def _job_assigned_update(captain_oid):
+    return {"$set": {
+        "captain_id": captain_oid,
+        "job_status": "ASSIGNED",
+        "matched_at": utcnow(),
+        "current_offer": None,
+    }}
+
+
+def _job_rejected_update(captain_oid):
+    return {"$addToSet": {"rejected_captains": captain_oid}, "$set": {"current_offer": None, "job_status": "SEARCHING"}}
+
+
+@traced()
+@identity_map.unit_of_work()
+def accept_job(job_type: str, job_id: str, captain_id: str):
+    db = get_db()
+    collection = _job_collection(job_type)
+    oid = to_object_id(job_id)
+    captain_oid = to_object_id(captain_id)
+    if not oid or not captain_oid:
+        raise ValueError("Invalid job or captain id")
+
+    job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
+    _check_offer(job_doc, captain_oid)
+
+    food_allowed = vehicle_services.get_food_allowed_vehicles() if job_type == "ORDER" else None
     captain = db.captains.find_one_and_update(
-        captain_query,
-        {"$set": {
-            "is_busy": True,
-            "current_job_id": oid,
-            "current_job_type": job_type,
-            "current_job": {"type": job_type, "id": job_id},
-            "last_assigned_at": utcnow(),
-            "last_seen": utcnow(),
-        }},
+        _captain_claim_query(job_type, job_doc, captain_oid, food_allowed),
+        _captain_claim_update(job_type, job_id, oid),
+        projection={"_id": 1},
         return_document=ReturnDocument.AFTER,
     )
     if not captain:
@@ -571,15 +656,7 @@ def accept_job(job_type: str, job_id: str, captain_id: str):
         except Exception:
             collection.update_one({"_id": oid}, {"$set": {"status": "ASSIGNED"}})
 
-    collection.update_one(
-        {"_id": oid},
-        {"$set": {
-            "captain_id": captain_oid,
-            "job_status": "ASSIGNED",
-            "matched_at": utcnow(),
-            "current_offer": None,
-        }},
-    )
+    collection.update_one({"_id": oid}, _job_assigned_update(captain_oid))
     clear_offer(job_id)
 
     user_id = str(job_doc.get("user_id")) if job_doc.get("user_id") else None
@@ -595,7 +672,7 @@ def accept_job(job_type: str, job_id: str, captain_id: str):
     if job_type == "ORDER":
         restaurant_id = job_doc.get("restaurant_id")
         if restaurant_id:
-            restaurant = db.restaurants.find_one({"_id": restaurant_id})
+            restaurant = identity_map.find_one(db.restaurants, {"_id": restaurant_id}, RESTAURANT_DISPATCH)
             if restaurant and restaurant.get("owner_id"):
                 notification_services.send_to_user(
                     str(restaurant.get("owner_id")),
@@ -612,6 +689,71 @@ def accept_job(job_type: str, job_id: str, captain_id: str):
     return collection.find_one({"_id": oid})
 
 
+@traced()
+async def aaccept_job(job_type: str, job_id: str, captain_id: str):
+    db = get_async_db()
+    collection = _async_job_collection(job_type)
+    oid = to_object_id(job_id)
+    captain_oid = to_object_id(captain_id)
+    if not oid or not captain_oid:
+        raise ValueError("Invalid job or captain id")
+
+    job_doc = await collection.find_one({"_id": oid}, JOB_DISPATCH)
+    _check_offer(job_doc, captain_oid)
+
+    food_allowed = await vehicle_services.aget_food_allowed_vehicles() if job_type == "ORDER" else None
+    captain = await db.captains.find_one_and_update(
+        _captain_claim_query(job_type, job_doc, captain_oid, food_allowed),
+        _captain_claim_update(job_type, job_id, oid),
+        projection={"_id": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not captain:
+        raise ValueError("Captain unavailable")
+
+    try:
+        if job_type == "ORDER":
+            from orders import state_machine as order_state
+            await order_state.aset_order_status(job_id, "ASSIGNED", reason="CAPTAIN_ASSIGNED")
+        else:
+            from rides import state_machine as ride_state
+            await ride_state.aset_ride_status(job_id, "ASSIGNED", reason="CAPTAIN_ASSIGNED")
+    except Exception:
+        await collection.update_one({"_id": oid}, {"$set": {"status": "ASSIGNED"}})
+
+    await collection.update_one({"_id": oid}, _job_assigned_update(captain_oid))
+    await aclear_offer(job_id)
+
+    user_id = str(job_doc.get("user_id")) if job_doc.get("user_id") else None
+    if user_id:
+        await _asend_ws(f"user_{user_id}", "job_assigned", {"job_id": job_id, "job_type": job_type, "captain_id": captain_id})
+        await notification_services.asend_to_user(
+            user_id,
+            "Captain assigned",
+            "A captain has been assigned to your request.",
+            {"job_id": job_id, "job_type": job_type},
+        )
+
+    if job_type == "ORDER":
+        restaurant_id = job_doc.get("restaurant_id")
+        if restaurant_id:
+            restaurant = await identity_map.afind_one(db.restaurants, {"_id": restaurant_id}, RESTAURANT_DISPATCH)
+            if restaurant and restaurant.get("owner_id"):
+                await notification_services.asend_to_user(
+                    str(restaurant.get("owner_id")),
+                    "Order assigned",
+                    "A captain has been assigned for pickup.",
+                    {"order_id": job_id},
+                )
+        await db.captains.update_one(
+            {"user_id": captain_oid},
+            {"$addToSet": {"batched_order_ids": oid}},
+        )
+
+    await _asend_ws(f"captain_{captain_id}", "job_assigned", {"job_id": job_id, "job_type": job_type})
+    return await collection.find_one({"_id": oid})
+
+
 def reject_job(job_type: str, job_id: str, captain_id: str):
     collection = _job_collection(job_type)
     oid = to_object_id(job_id)
@@ -619,19 +761,10 @@ def reject_job(job_type: str, job_id: str, captain_id: str):
     if not oid or not captain_oid:
         raise ValueError("Invalid job or captain id")
 
-    job_doc = collection.find_one({"_id": oid})
-    if not job_doc:
-        raise ValueError("Job not found")
+    job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
+    _check_offer(job_doc, captain_oid)
 
-    current_offer = job_doc.get("current_offer") or {}
-    offered = current_offer.get("captain_id")
-    if not offered or str(offered) != str(captain_oid):
-        raise ValueError("Job not offered to this captain")
-
-    collection.update_one(
-        {"_id": oid},
-        {"$addToSet": {"rejected_captains": captain_oid}, "$set": {"current_offer": None, "job_status": "SEARCHING"}},
-    )
+    collection.update_one({"_id": oid}, _job_rejected_update(captain_oid))
     db = get_db()
     db.captains.update_one(
         {"user_id": captain_oid},
@@ -642,6 +775,27 @@ def reject_job(job_type: str, job_id: str, captain_id: str):
     return True
 
 
+async def areject_job(job_type: str, job_id: str, captain_id: str):
+    collection = _async_job_collection(job_type)
+    oid = to_object_id(job_id)
+    captain_oid = to_object_id(captain_id)
+    if not oid or not captain_oid:
+        raise ValueError("Invalid job or captain id")
+
+    job_doc = await collection.find_one({"_id": oid}, JOB_DISPATCH)
+    _check_offer(job_doc, captain_oid)
+
+    await collection.update_one({"_id": oid}, _job_rejected_update(captain_oid))
+    await get_async_db().captains.update_one(
+        {"user_id": captain_oid},
+        {"$inc": {"cancellations": 1}},
+    )
+    await aclear_offer(job_id)
+    # Re-offering scores candidates and arms the offer timer on the sync dispatch path.
+    await sync_to_async(offer_next_captain, thread_sensitive=False)(job_type, job_id)
+    return True
+
+
 def complete_job(job_type: str, job_id: str, captain_id: str):
     db = get_db()
     collection = _job_collection(job_type)
@@ -650,7 +804,7 @@ def complete_job(job_type: str, job_id: str, captain_id: str):
     if not oid or not captain_oid:
         raise ValueError("Invalid job or captain id")
 
-    job_doc = collection.find_one({"_id": oid})
+    job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
     if not job_doc:
         raise ValueError("Job not found")
 
@@ -671,7 +825,7 @@ def complete_job(job_type: str, job_id: str, captain_id: str):
             {"user_id": captain_oid},
             {"$pull": {"batched_order_ids": oid}},
         )
-        captain_doc = db.captains.find_one({"user_id": captain_oid})
+        captain_doc = db.captains.find_one({"user_id": captain_oid}, CAPTAIN_BATCH)
         remaining = captain_doc.get("batched_order_ids") if captain_doc else []
         if remaining:
             db.captains.update_one(
@@ -696,22 +850,42 @@ def complete_job(job_type: str, job_id: str, captain_id: str):
     return collection.find_one({"_id": oid})
 
 
+def _location_payload(job_type: str, job_id: str, captain_id: str, lat: float, lng: float):
+    return {
+        "job_id": job_id,
+        "job_type": job_type,
+        "captain_id": captain_id,
+        "location": {"lat": lat, "lng": lng},
+    }
+
+
 def broadcast_location(job_type: str, job_id: str, captain_id: str, lat: float, lng: float):
     collection = _job_collection(job_type)
     oid = to_object_id(job_id)
     if not oid:
         return
-    job_doc = collection.find_one({"_id": oid})
+    job_doc = collection.find_one({"_id": oid}, JOB_DISPATCH)
     if not job_doc:
         return
     user_id = str(job_doc.get("user_id")) if job_doc.get("user_id") else None
     if not user_id:
         return
-    payload = {
-        "job_id": job_id,
-        "job_type": job_type,
-        "captain_id": captain_id,
-        "location": {"lat": lat, "lng": lng},
-    }
+    payload = _location_payload(job_type, job_id, captain_id, lat, lng)
     _send_ws(f"user_{user_id}", "location_update", payload)
     _send_ws(f"{job_type.lower()}_{job_id}", "location_update", payload)
+
+
+async def abroadcast_location(job_type: str, job_id: str, captain_id: str, lat: float, lng: float):
+    collection = _async_job_collection(job_type)
+    oid = to_object_id(job_id)
+    if not oid:
+        return
+    job_doc = await collection.find_one({"_id": oid}, JOB_DISPATCH)
+    if not job_doc:
+        return
+    user_id = str(job_doc.get("user_id")) if job_doc.get("user_id") else None
+    if not user_id:
+        return
+    payload = _location_payload(job_type, job_id, captain_id, lat, lng)
+    await _asend_ws(f"user_{user_id}", "location_update", payload)
+    await _asend_ws(f"{job_type.lower()}_{job_id}", "location_update", payload)
@@ -0,0 +1,136 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from pymongo import monitoring
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY
+    from prometheus_client import multiprocess
+except Exception:
+    CollectorRegistry = None
+    Counter = None
+    Histogram = None
+    REGISTRY = None
+    multiprocess = None
+
+STAGE_MONGO = "mongo"
+STAGE_REDIS = "redis"
+STAGE_MAPS = "maps"
+STAGE_FCM = "fcm"
+STAGES = [STAGE_MONGO, STAGE_REDIS, STAGE_MAPS, STAGE_FCM]
+
+UNRESOLVED_ROUTE = "unresolved"
+
+_STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+if Counter:
+    REQUEST_COUNT = Counter(
+        "http_requests_total",
+        "Total HTTP requests",
+        ["method", "route", "status"],
+    )
+    REQUEST_LATENCY = Histogram(
+        "http_request_duration_seconds",
+        "HTTP request duration in seconds",
+        ["method", "route"],
+    )
+    REQUEST_STAGE_LATENCY = Histogram(
+        "http_request_stage_duration_seconds",
+        "Time a request spent in each dependency",
+        ["stage", "method", "route"],
+        buckets=_STAGE_BUCKETS,
+    )
+    MONGO_COMMAND_LATENCY = Histogram(
+        "mongo_command_duration_seconds",
+        "Mongo command duration in seconds",
+        ["command", "outcome"],
+        buckets=_STAGE_BUCKETS,
+    )
+else:
+    REQUEST_COUNT = None
+    REQUEST_LATENCY = None
+    REQUEST_STAGE_LATENCY = None
+    MONGO_COMMAND_LATENCY = None
+
+_stage_times: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stage_times", default=None)
+
+
+def start_request():
+    return _stage_times.set({})
+
+
+def finish_request(token) -> Dict[str, float]:
+    stages = _stage_times.get() or {}
+    _stage_times.reset(token)
+    return stages
+
+
+def add_stage_time(stage: str, seconds: float):
+    stages = _stage_times.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_time(stage, time.perf_counter() - start)
+
+
+def route_label(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if not match:
+        return UNRESOLVED_ROUTE
+    return match.route or match.view_name or UNRESOLVED_ROUTE
+
+
+def observe_request(method: str, route: str, status: int, duration: float, stages: Dict[str, float]):
+    if not REQUEST_COUNT:
+        return
+    REQUEST_COUNT.labels(method, route, str(status)).inc()
+    REQUEST_LATENCY.labels(method, route).observe(duration)
+    for stage in STAGES:
+        REQUEST_STAGE_LATENCY.labels(stage, method, route).observe(stages.get(stage, 0.0))
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
+
+    def _record(self, event, outcome: str):
+        seconds = event.duration_micros / 1e6
+        add_stage_time(STAGE_MONGO, seconds)
+        if MONGO_COMMAND_LATENCY:
+            MONGO_COMMAND_LATENCY.labels(event.command_name, outcome).observe(seconds)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(multiprocess and os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def collect_registry():
+    # Under gunicorn/uvicorn workers each process writes its own files to
+    # PROMETHEUS_MULTIPROC_DIR, and a scrape has to merge them.
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+# Call from the process manager's worker-exit hook (gunicorn `child_exit`) in multiprocess mode.
+def mark_process_dead(pid: int):
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
@@ -1,59 +1,76 @@
-import base64
+import asyncio
 import hashlib
-import json
 import time
+import zlib
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.conf import settings
 from django.http import JsonResponse, HttpResponse
 from django.urls import resolve
 from rest_framework.exceptions import AuthenticationFailed
 
-from core.auth import get_user_from_request
-from core.redis_queue import get_client
+from core import identity_map, metrics, ratelimit, tracing
+from core.auth import aget_user_from_request, decode_token, get_user_from_request
+from core.redis_queue import get_async_binary_client, get_binary_client
+from observability import profiler
 
-try:
-    from prometheus_client import Counter, Histogram
-    REQUEST_COUNT = Counter(
-        "http_requests_total",
-        "Total HTTP requests",
-        ["method", "path", "status"],
-    )
-    REQUEST_LATENCY = Histogram(
-        "http_request_duration_seconds",
-        "HTTP request duration in seconds",
-        ["method", "path"],
-    )
-except Exception:
-    REQUEST_COUNT = None
-    REQUEST_LATENCY = None
 
+class HybridMiddleware:
+    # Sync-only middleware would push async views back onto a worker thread for the whole request.
+    sync_capable = True
+    async_capable = True
 
-class RoleRequiredMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
-        try:
-            match = resolve(request.path_info)
-        except Exception:
-            return self.get_response(request)
 
-        view_func = match.func
-        view_cls = getattr(view_func, "view_class", None)
-        allowed_roles = getattr(view_cls, "allowed_roles", None)
+def _allowed_roles(request):
+    try:
+        match = resolve(request.path_info)
+    except Exception:
+        return None
+    return getattr(getattr(match.func, "view_class", None), "allowed_roles", None)
+
 
+def _role_denied(request, user_doc: dict, allowed_roles):
+    role = user_doc.get("role")
+    if role not in allowed_roles:
+        return JsonResponse({"detail": "Role not allowed"}, status=403)
+    request.role = role
+    request.user_doc = user_doc
+    return None
+
+
+class RoleRequiredMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        allowed_roles = _allowed_roles(request)
         if allowed_roles:
             try:
                 user_doc = get_user_from_request(request)
             except AuthenticationFailed as exc:
                 return JsonResponse({"detail": str(exc)}, status=401)
-            role = user_doc.get("role")
-            if role not in allowed_roles:
-                return JsonResponse({"detail": "Role not allowed"}, status=403)
-            request.role = role
-            request.user_doc = user_doc
-
+            denied = _role_denied(request, user_doc, allowed_roles)
+            if denied:
+                return denied
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        allowed_roles = _allowed_roles(request)
+        if allowed_roles:
+            try:
+                user_doc = await aget_user_from_request(request)
+            except AuthenticationFailed as exc:
+                return JsonResponse({"detail": str(exc)}, status=401)
+            denied = _role_denied(request, user_doc, allowed_roles)
+            if denied:
+                return denied
+        return await self.get_response(request)
+
 
 def _get_ip_address(request) -> str:
     forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
@@ -62,102 +79,370 @@ def _get_ip_address(request) -> str:
     return request.META.get("REMOTE_ADDR") or "unknown"
 
 
-class RateLimitMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
-        if not getattr(settings, "RATE_LIMIT_ENABLED", False):
-            return self.get_response(request)
-        path = request.path_info or ""
-        exempt = set(getattr(settings, "RATE_LIMIT_EXEMPT_PATHS", []) or [])
-        if path in exempt:
-            return self.get_response(request)
-
-        limit = int(getattr(settings, "RATE_LIMIT_MAX_REQUESTS", 300))
-        window = int(getattr(settings, "RATE_LIMIT_WINDOW_SEC", 60))
-        ip = _get_ip_address(request)
-        key = f"rl:{ip}:{request.method}:{path}"
+def _rate_limit_subject(request):
+    # Runs before authentication, so the token is only decoded here; a forged or revoked
+    # token is still rejected later, it just gets limited under its claimed subject.
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if auth.startswith("Bearer "):
         try:
-            client = get_client()
-            count = client.incr(key)
-            if count == 1:
-                client.expire(key, window)
-            if count > limit:
-                return JsonResponse(
-                    {"detail": "Rate limit exceeded", "retry_after_sec": window},
-                    status=429,
-                )
+            payload = decode_token(auth.split(" ", 1)[1], verify_type="access")
+            return f"u:{payload.get('sub')}", payload.get("role")
         except Exception:
             pass
+    return f"ip:{_get_ip_address(request)}", None
+
+
+def _rate_limit_key(request):
+    if not getattr(settings, "RATE_LIMIT_ENABLED", False):
+        return None
+    path = request.path_info or ""
+    exempt = set(getattr(settings, "RATE_LIMIT_EXEMPT_PATHS", []) or [])
+    if path in exempt:
+        return None
+    pattern, name = ratelimit.resolve_route(path)
+    subject, role = _rate_limit_subject(request)
+    limit, window = ratelimit.limit_for(name, role)
+    return f"rl:{subject}:{request.method}:{pattern}", limit, window
+
+
+def _rate_limited(retry_after: int):
+    response = JsonResponse(
+        {"detail": "Rate limit exceeded", "retry_after_sec": retry_after},
+        status=429,
+    )
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+class RateLimitMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        limited = _rate_limit_key(request)
+        if limited:
+            allowed, retry_after = ratelimit.check(*limited)
+            if not allowed:
+                return _rate_limited(retry_after)
         return self.get_response(request)
 
+    async def __acall__(self, request):
+        limited = _rate_limit_key(request)
+        if limited:
+            allowed, retry_after = await ratelimit.acheck(*limited)
+            if not allowed:
+                return _rate_limited(retry_after)
+        return await self.get_response(request)
 
-class IdempotencyKeyMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+
+IDEMPOTENCY_ENCODING_RAW = b"raw"
+IDEMPOTENCY_ENCODING_ZLIB = b"zlib"
+IDEMPOTENCY_ENCODING_OMITTED = b"omitted"
+
+
+def _idempotency_record(response, body_hash: str):
+    body = response.content or b""
+    encoding = IDEMPOTENCY_ENCODING_RAW
+    if len(body) >= int(getattr(settings, "IDEMPOTENCY_COMPRESS_MIN_BYTES", 512)):
+        body = zlib.compress(body, 6)
+        encoding = IDEMPOTENCY_ENCODING_ZLIB
+    # Oversized responses keep only the status so a retry still cannot re-execute the request.
+    if len(body) > int(getattr(settings, "IDEMPOTENCY_MAX_BODY_BYTES", 65536)):
+        body = b""
+        encoding = IDEMPOTENCY_ENCODING_OMITTED
+    return {
+        "status": response.status_code,
+        "content_type": response.get("Content-Type", "application/json"),
+        "request_hash": body_hash,
+        "encoding": encoding,
+        "body": body,
+    }
+
+
+def _idempotency_replay(record: dict):
+    encoding = record.get(b"encoding")
+    status = int(record.get(b"status") or 200)
+    if encoding == IDEMPOTENCY_ENCODING_OMITTED:
+        resp = JsonResponse({"detail": "Request already processed", "idempotency_replay": True}, status=status)
+    else:
+        body = record.get(b"body") or b""
+        if encoding == IDEMPOTENCY_ENCODING_ZLIB:
+            body = zlib.decompress(body)
+        resp = HttpResponse(body, status=status)
+        if record.get(b"content_type"):
+            resp["Content-Type"] = record[b"content_type"].decode("utf-8")
+    resp["Idempotency-Replay"] = "true"
+    return resp
+
+
+def _idempotency_keys(request, idem_key: str):
+    path = request.path_info or ""
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    token = auth.split(" ", 1)[1] if auth.startswith("Bearer ") else auth
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()[:12] if token else "anon"
+    body_hash = hashlib.sha256(request.body or b"").hexdigest()
+    cache_key = f"idemp:{request.method}:{path}:{token_hash}:{idem_key}"
+    return cache_key, f"{cache_key}:lock", body_hash
+
+
+def _idempotency_in_progress():
+    return JsonResponse(
+        {"detail": "A request with this idempotency key is already in progress"},
+        status=409,
+    )
+
+
+def _idempotency_answer(record: dict, body_hash: str):
+    if record.get(b"request_hash", b"").decode("utf-8") != body_hash:
+        return JsonResponse(
+            {"detail": "Idempotency key reuse with different payload"},
+            status=409,
+        )
+    return _idempotency_replay(record)
+
+
+def _idempotency_storable(response) -> bool:
+    return response.status_code in (200, 201, 202) and hasattr(response, "content")
+
+
+class IdempotencyKeyMiddleware(HybridMiddleware):
+    def _wait_for_record(self, client, cache_key: str):
+        wait_ms = int(getattr(settings, "IDEMPOTENCY_WAIT_MS", 0))
+        deadline = time.monotonic() + wait_ms / 1000.0
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            record = client.hgetall(cache_key)
+            if record:
+                return record
+        return None
+
+    async def _await_record(self, client, cache_key: str):
+        wait_ms = int(getattr(settings, "IDEMPOTENCY_WAIT_MS", 0))
+        deadline = time.monotonic() + wait_ms / 1000.0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            record = await client.hgetall(cache_key)
+            if record:
+                return record
+        return None
 
     def __call__(self, request):
-        if request.method != "POST":
-            return self.get_response(request)
-        idem_key = request.META.get("HTTP_IDEMPOTENCY_KEY")
+        if self.async_mode:
+            return self.__acall__(request)
+        idem_key = request.META.get("HTTP_IDEMPOTENCY_KEY") if request.method == "POST" else None
         if not idem_key:
             return self.get_response(request)
+        cache_key, lock_key, body_hash = _idempotency_keys(request, idem_key)
+
+        try:
+            client = get_binary_client()
+            record = client.hgetall(cache_key)
+            locked = False
+            if not record:
+                lock_ttl = int(getattr(settings, "IDEMPOTENCY_LOCK_TTL_SEC", 30))
+                locked = bool(client.set(lock_key, body_hash, nx=True, ex=lock_ttl))
+                if not locked:
+                    record = self._wait_for_record(client, cache_key)
+                    if not record:
+                        return _idempotency_in_progress()
+            if record:
+                return _idempotency_answer(record, body_hash)
+        except Exception:
+            client = None
+            locked = False
 
-        path = request.path_info or ""
-        auth = request.META.get("HTTP_AUTHORIZATION", "")
-        token = auth.split(" ", 1)[1] if auth.startswith("Bearer ") else auth
-        token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()[:12] if token else "anon"
-        body_hash = hashlib.sha256(request.body or b"").hexdigest()
-        cache_key = f"idemp:{request.method}:{path}:{token_hash}:{idem_key}"
+        try:
+            response = self.get_response(request)
+        except Exception:
+            if locked:
+                try:
+                    client.delete(lock_key)
+                except Exception:
+                    pass
+            raise
+        if not client:
+            return response
+        try:
+            if _idempotency_storable(response):
+                ttl = int(getattr(settings, "IDEMPOTENCY_TTL_SEC", 86400))
+                pipe = client.pipeline(transaction=True)
+                pipe.hset(cache_key, mapping=_idempotency_record(response, body_hash))
+                pipe.expire(cache_key, ttl)
+                pipe.delete(lock_key)
+                pipe.execute()
+            elif locked:
+                client.delete(lock_key)
+        except Exception:
+            pass
+        return response
+
+    async def __acall__(self, request):
+        idem_key = request.META.get("HTTP_IDEMPOTENCY_KEY") if request.method == "POST" else None
+        if not idem_key:
+            return await self.get_response(request)
+        cache_key, lock_key, body_hash = _idempotency_keys(request, idem_key)
 
         try:
-            client = get_client()
-            cached = client.get(cache_key)
-            if cached:
-                payload = json.loads(cached)
-                if payload.get("request_hash") != body_hash:
-                    return JsonResponse(
-                        {"detail": "Idempotency key reuse with different payload"},
-                        status=409,
-                    )
-                body = base64.b64decode(payload.get("body_b64") or "")
-                resp = HttpResponse(body, status=payload.get("status", 200))
-                if payload.get("content_type"):
-                    resp["Content-Type"] = payload.get("content_type")
-                resp["Idempotency-Replay"] = "true"
-                return resp
+            client = get_async_binary_client()
+            record = await client.hgetall(cache_key)
+            locked = False
+            if not record:
+                lock_ttl = int(getattr(settings, "IDEMPOTENCY_LOCK_TTL_SEC", 30))
+                locked = bool(await client.set(lock_key, body_hash, nx=True, ex=lock_ttl))
+                if not locked:
+                    record = await self._await_record(client, cache_key)
+                    if not record:
+                        return _idempotency_in_progress()
+            if record:
+                return _idempotency_answer(record, body_hash)
         except Exception:
-            cached = None
+            client = None
+            locked = False
 
-        response = self.get_response(request)
         try:
-            if response.status_code in (200, 201, 202) and hasattr(response, "content"):
+            response = await self.get_response(request)
+        except Exception:
+            if locked:
+                try:
+                    await client.delete(lock_key)
+                except Exception:
+                    pass
+            raise
+        if not client:
+            return response
+        try:
+            if _idempotency_storable(response):
                 ttl = int(getattr(settings, "IDEMPOTENCY_TTL_SEC", 86400))
-                payload = {
-                    "status": response.status_code,
-                    "content_type": response.get("Content-Type", "application/json"),
-                    "request_hash": body_hash,
-                    "body_b64": base64.b64encode(response.content or b"").decode("utf-8"),
-                }
-                client = get_client()
-                client.setex(cache_key, ttl, json.dumps(payload))
+                pipe = client.pipeline(transaction=True)
+                pipe.hset(cache_key, mapping=_idempotency_record(response, body_hash))
+                pipe.expire(cache_key, ttl)
+                pipe.delete(lock_key)
+                await pipe.execute()
+            elif locked:
+                await client.delete(lock_key)
         except Exception:
             pass
         return response
 
 
-class PrometheusMetricsMiddleware:
-    def __init__(self, get_response):
-        self.get_response = get_response
+class PrometheusMetricsMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics.REQUEST_COUNT:
+            return self.get_response(request)
+        token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            stages = metrics.finish_request(token)
+        self._observe(request, response, start, stages)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.REQUEST_COUNT:
+            return await self.get_response(request)
+        token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stages = metrics.finish_request(token)
+        self._observe(request, response, start, stages)
+        return response
+
+    @staticmethod
+    def _observe(request, response, start: float, stages):
+        metrics.observe_request(
+            request.method,
+            metrics.route_label(request),
+            response.status_code,
+            time.perf_counter() - start,
+            stages,
+        )
 
+
+def _server_span(request):
+    parent = tracing.extract(request.META.get("HTTP_TRACEPARENT"))
+    attributes = {"http.method": request.method, "http.target": request.path_info}
+    return tracing.start_span(f"HTTP {request.method}", tracing.KIND_SERVER, attributes, parent=parent, root=True)
+
+
+def _finish_server_span(span, request, response):
+    if span:
+        span.name = f"{request.method} {metrics.route_label(request)}"
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.status = "error"
+        response["X-Trace-Id"] = span.trace_id
+
+
+class TracingMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not tracing.enabled():
+            return self.get_response(request)
+        with _server_span(request) as span:
+            response = self.get_response(request)
+            _finish_server_span(span, request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not tracing.enabled():
+            return await self.get_response(request)
+        with _server_span(request) as span:
+            response = await self.get_response(request)
+            _finish_server_span(span, request, response)
+        return response
+
+
+def _slow_profile(samples, start: float) -> bool:
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return bool(samples) and elapsed_ms >= float(getattr(settings, "PROFILER_SLOW_MS", 500))
+
+
+def _record_profile(request, samples, start: float):
+    if _slow_profile(samples, start):
+        profiler.record_slow_request(metrics.route_label(request), samples)
+
+
+class ProfilingMiddleware(HybridMiddleware):
     def __call__(self, request):
-        if not REQUEST_COUNT or not REQUEST_LATENCY:
+        if self.async_mode:
+            return self.__acall__(request)
+        if not profiler.enabled():
             return self.get_response(request)
-        start = time.time()
-        response = self.get_response(request)
-        duration = time.time() - start
-        path = request.path_info or ""
-        REQUEST_COUNT.labels(request.method, path, str(response.status_code)).inc()
-        REQUEST_LATENCY.labels(request.method, path).observe(duration)
+        sampler = profiler.get_profiler()
+        sampling = sampler.begin()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            samples = sampler.end() if sampling else None
+        _record_profile(request, samples, start)
+        return response
+
+    async def __acall__(self, request):
+        # The event-loop thread is shared by every request in flight; profiler.ProfilingASGIHandler
+        # samples the executor thread each sync view runs on into `request.profile_samples` instead.
+        if not profiler.enabled():
+            return await self.get_response(request)
+        request.profile_samples = Counter()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        if _slow_profile(request.profile_samples, start):
+            await profiler.arecord_slow_request(metrics.route_label(request), request.profile_samples)
         return response
+
+
+class IdentityMapMiddleware(HybridMiddleware):
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with identity_map.unit_of_work():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with identity_map.unit_of_work():
+            return await self.get_response(request)
@@ -0,0 +1,85 @@
+import base64
+from typing import Any, Dict, Iterator, List, Optional
+
+import bson
+from django.conf import settings
+from pymongo import DESCENDING
+
+# Keyset pagination: a page continues strictly after the (sort field, _id) of the previous page's
+# last document, so every page is an index range scan however deep it is. The cursor handed to
+# clients is that key, BSON-encoded and base64url'd; it is opaque and only valid for the query
+# that produced it. Each paginated query needs an index ending in (sort field, _id).
+
+
+def _page_limit(limit: int) -> int:
+    return max(1, min(int(limit), int(getattr(settings, "PAGINATION_MAX_LIMIT", 200))))
+
+
+def encode_cursor(key: List[Any]) -> str:
+    return base64.urlsafe_b64encode(bson.encode({"k": key})).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        key = bson.decode(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["k"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def _after(fields: List[str], key: List[Any], direction: int) -> Dict:
+    op = "$lt" if direction == DESCENDING else "$gt"
+    branches = []
+    for idx, field in enumerate(fields):
+        branch = {prior: key[pos] for pos, prior in enumerate(fields[:idx])}
+        branch[field] = {op: key[idx]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+
+class Page:
+    """One page of a keyset query. Iterating it yields the documents straight off the Mongo
+    cursor; `next_cursor` is set once iteration has gone past the last document of a full page."""
+
+    def __init__(self, mongo_cursor, fields: List[str], limit: int):
+        self._cursor = mongo_cursor
+        self._fields = fields
+        self._limit = limit
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        last = None
+        for idx, doc in enumerate(self._cursor):
+            if idx == self._limit:
+                self.next_cursor = encode_cursor([last.get(field) for field in self._fields])
+                break
+            last = doc
+            yield doc
+
+    def trailer(self) -> Dict[str, Optional[str]]:
+        return {"next_cursor": self.next_cursor}
+
+
+def empty_page() -> Page:
+    return Page([], ["_id"], 0)
+
+
+def paginate(
+    collection,
+    query: Dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_field: Optional[str] = None,
+    direction: int = DESCENDING,
+    projection: Optional[Dict] = None,
+) -> Page:
+    """Sorts by (sort_field, _id), or by _id alone, and returns the page after `cursor`."""
+    fields = [sort_field, "_id"] if sort_field else ["_id"]
+    limit = _page_limit(limit)
+    if cursor:
+        after = _after(fields, decode_cursor(cursor, len(fields)), direction)
+        query = {"$and": [query, after]} if query else after
+    mongo_cursor = collection.find(query, projection).sort([(field, direction) for field in fields]).limit(limit + 1)
+    return Page(mongo_cursor, fields, limit)
@@ -0,0 +1,161 @@
+import asyncio
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from core.redis_queue import get_async_client, get_client
+
+# Token bucket refilled continuously at capacity / window. Grants up to ARGV[3] tokens (at
+# least one) in a single round-trip and reports how many were granted and when the next
+# token will be available.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local granted = math.min(requested, math.floor(tokens))
+local retry_ms = 0
+if granted > 0 then
+  tokens = tokens - granted
+else
+  retry_ms = math.ceil((1 - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {granted, retry_ms}
+"""
+
+_script = None
+_async_scripts = weakref.WeakKeyDictionary()
+_local = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _token_bucket():
+    global _script
+    if _script is None:
+        _script = get_client().register_script(TOKEN_BUCKET_LUA)
+    return _script
+
+
+def _async_token_bucket():
+    loop = asyncio.get_running_loop()
+    script = _async_scripts.get(loop)
+    if script is None:
+        script = get_async_client().register_script(TOKEN_BUCKET_LUA)
+        _async_scripts[loop] = script
+    return script
+
+
+def resolve_route(path: str):
+    """Returns (route pattern, url name) so keys do not fan out per object id."""
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return "unresolved", None
+    return match.route or match.view_name, match.url_name
+
+
+def limit_for(name: Optional[str], role: Optional[str]):
+    limit = int(getattr(settings, "RATE_LIMIT_MAX_REQUESTS", 300))
+    role_limits = getattr(settings, "RATE_LIMIT_ROLE_MAX_REQUESTS", {}) or {}
+    route_limits = getattr(settings, "RATE_LIMIT_ROUTE_MAX_REQUESTS", {}) or {}
+    if role and role in role_limits:
+        limit = int(role_limits[role])
+    if name and name in route_limits:
+        limit = int(route_limits[name])
+    window = int(getattr(settings, "RATE_LIMIT_WINDOW_SEC", 60))
+    return limit, window
+
+
+def _local_take(key: str, now: float):
+    """Returns (allowed, retry_after_sec) when the local lease decides, None when Redis must be asked."""
+    with _local_lock:
+        entry = _local.get(key)
+        if not entry:
+            return None
+        if entry["blocked_until"] > now:
+            return False, max(1, math.ceil(entry["blocked_until"] - now))
+        if entry["tokens"] > 0 and entry["expires_at"] > now:
+            entry["tokens"] -= 1
+            return True, 0
+        _local.pop(key, None)
+        return None
+
+
+def _local_store(key: str, tokens: int, blocked_until: float, now: float):
+    lease_sec = float(getattr(settings, "RATE_LIMIT_LOCAL_LEASE_SEC", 1.0))
+    max_keys = int(getattr(settings, "RATE_LIMIT_LOCAL_MAX_KEYS", 10000))
+    with _local_lock:
+        _local[key] = {"tokens": tokens, "blocked_until": blocked_until, "expires_at": now + lease_sec}
+        _local.move_to_end(key)
+        while len(_local) > max_keys:
+            _local.popitem(last=False)
+
+
+def _lease_size(limit: int) -> int:
+    # Workers lease a few tokens at a time and spend them locally, so bursts of pings from
+    # one caller cost a single Redis call. Unused leases lapse after RATE_LIMIT_LOCAL_LEASE_SEC.
+    return max(1, min(int(getattr(settings, "RATE_LIMIT_LOCAL_LEASE", 5)), limit // 10 or 1))
+
+
+def _settle(key: str, granted, retry_ms, now: float):
+    granted = int(granted)
+    if granted > 0:
+        if granted > 1:
+            _local_store(key, granted - 1, 0.0, now)
+        return True, 0
+    retry_sec = max(1, math.ceil(int(retry_ms) / 1000.0))
+    _local_store(key, 0, now + int(retry_ms) / 1000.0, now)
+    return False, retry_sec
+
+
+def check(key: str, limit: int, window: int):
+    """Returns (allowed, retry_after_sec). Fails open when Redis is unreachable."""
+    if limit <= 0:
+        return True, 0
+    now = time.monotonic()
+    local = _local_take(key, now)
+    if local is not None:
+        return local
+    try:
+        granted, retry_ms = _token_bucket()(keys=[key], args=[limit, limit / float(window), _lease_size(limit)])
+    except Exception:
+        return True, 0
+    return _settle(key, granted, retry_ms, now)
+
+
+async def acheck(key: str, limit: int, window: int):
+    if limit <= 0:
+        return True, 0
+    now = time.monotonic()
+    local = _local_take(key, now)
+    if local is not None:
+        return local
+    try:
+        granted, retry_ms = await _async_token_bucket()(
+            keys=[key], args=[limit, limit / float(window), _lease_size(limit)]
+        )
+    except Exception:
+        return True, 0
+    return _settle(key, granted, retry_ms, now)
+
+
+def reset_local():
+    with _local_lock:
+        _local.clear()
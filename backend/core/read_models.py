@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TypedDict
+
+from bson import ObjectId
+
+# Slim read models for hot paths. Each view lists exactly the fields its callers read, and
+# `projection(View)` turns it into the Mongo projection used to fetch it, so a field has to
+# be added to the view before code can rely on it.
+
+
+def projection(view) -> Dict[str, int]:
+    return {field: 1 for field in view.__annotations__}
+
+
+class CaptainDispatchView(TypedDict, total=False):
+    _id: ObjectId
+    user_id: ObjectId
+    location: Dict[str, Any]
+    home_location: Optional[Dict[str, Any]]
+    go_home_mode: bool
+    vehicle_type: str
+    average_rating: float
+    last_assigned_at: datetime
+    batched_order_ids: List[ObjectId]
+
+
+class CaptainGpsView(TypedDict, total=False):
+    _id: ObjectId
+    location: Dict[str, Any]
+    last_seen: datetime
+
+
+class CaptainBatchView(TypedDict, total=False):
+    _id: ObjectId
+    batched_order_ids: List[ObjectId]
+
+
+class UserPushTarget(TypedDict, total=False):
+    _id: ObjectId
+    fcm_token: Optional[str]
+
+
+class JobDispatchView(TypedDict, total=False):
+    _id: ObjectId
+    user_id: ObjectId
+    restaurant_id: ObjectId
+    captain_id: ObjectId
+    vehicle_type: str
+    status: str
+    job_status: str
+    current_offer: Optional[Dict[str, Any]]
+    pickup_location: Dict[str, Any]
+    pickup: Dict[str, Any]
+    payment_amount: int
+    payment_mode: str
+    fare: int
+
+
+class JobStateView(TypedDict, total=False):
+    _id: ObjectId
+    status: str
+    status_updated_at: datetime
+    status_reason: Optional[str]
+    job_status: str
+    matching_retry_count: int
+
+
+class JobTrackingView(TypedDict, total=False):
+    _id: ObjectId
+    user_id: ObjectId
+    captain_id: ObjectId
+    restaurant_id: ObjectId
+    status: str
+
+
+class RestaurantDispatchView(TypedDict, total=False):
+    _id: ObjectId
+    owner_id: ObjectId
+    location: Dict[str, Any]
+
+
+CAPTAIN_DISPATCH = projection(CaptainDispatchView)
+CAPTAIN_GPS = projection(CaptainGpsView)
+CAPTAIN_BATCH = projection(CaptainBatchView)
+USER_PUSH_TARGET = projection(UserPushTarget)
+JOB_DISPATCH = projection(JobDispatchView)
+JOB_STATE = projection(JobStateView)
+JOB_TRACKING = projection(JobTrackingView)
+RESTAURANT_DISPATCH = projection(RestaurantDispatchView)
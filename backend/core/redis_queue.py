@@ -1,18 +1,83 @@
+import asyncio
+import weakref
 from datetime import datetime
 from typing import List
 import redis
+import redis.asyncio
 from django.conf import settings
 
+from core.metrics import STAGE_REDIS, timed
+from core.tracing import KIND_CLIENT, start_span
+
 _client = None
+_binary_client = None
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        attributes = {"db.system": "redis", "db.redis.commands": len(self.command_stack)}
+        with timed(STAGE_REDIS), start_span("redis pipeline", KIND_CLIENT, attributes):
+            return super().execute(raise_on_error=raise_on_error)
+
+
+class InstrumentedRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        with timed(STAGE_REDIS), start_span(f"redis {args[0]}", KIND_CLIENT, {"db.system": "redis"}):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class InstrumentedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, raise_on_error=True):
+        attributes = {"db.system": "redis", "db.redis.commands": len(self.command_stack)}
+        with timed(STAGE_REDIS), start_span("redis pipeline", KIND_CLIENT, attributes):
+            return await super().execute(raise_on_error=raise_on_error)
+
+
+class InstrumentedAsyncRedis(redis.asyncio.Redis):
+    async def execute_command(self, *args, **options):
+        with timed(STAGE_REDIS), start_span(f"redis {args[0]}", KIND_CLIENT, {"db.system": "redis"}):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 def get_client():
     global _client
     if _client is None:
-        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        _client = InstrumentedRedis.from_url(settings.REDIS_URL, decode_responses=True)
     return _client
 
 
+def get_binary_client():
+    global _binary_client
+    if _binary_client is None:
+        _binary_client = InstrumentedRedis.from_url(settings.REDIS_URL)
+    return _binary_client
+
+
+def _async_client(decode_responses: bool):
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(decode_responses)
+    if client is None:
+        client = InstrumentedAsyncRedis.from_url(settings.REDIS_URL, decode_responses=decode_responses)
+        clients[decode_responses] = client
+    return client
+
+
+def get_async_client():
+    """Async counterpart of `get_client`; connections belong to the running event loop."""
+    return _async_client(True)
+
+
+def get_async_binary_client():
+    return _async_client(False)
+
+
 def enqueue_job(job_id: str):
     client = get_client()
     client.rpush("jobs:queue", job_id)
@@ -52,6 +117,11 @@ def clear_offer(job_id: str):
     client.delete(f"job:{job_id}:offer")
 
 
+async def aclear_offer(job_id: str):
+    client = get_async_client()
+    await client.delete(f"job:{job_id}:offer")
+
+
 def _ws_key(kind: str):
     if kind.endswith("s"):
         return f"ws:{kind}"
@@ -71,3 +141,18 @@ def is_ws_online(kind: str, user_id: str) -> bool:
     client = get_client()
     key = _ws_key(kind)
     return client.sismember(key, user_id)
+
+
+async def aset_ws_presence(kind: str, user_id: str, is_online: bool):
+    client = get_async_client()
+    key = _ws_key(kind)
+    if is_online:
+        await client.sadd(key, user_id)
+    else:
+        await client.srem(key, user_id)
+
+
+async def ais_ws_online(kind: str, user_id: str) -> bool:
+    client = get_async_client()
+    key = _ws_key(kind)
+    return await client.sismember(key, user_id)
@@ -0,0 +1,118 @@
+from datetime import datetime
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from bson import ObjectId
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from core.utils import BSONPayload
+
+SHORT_SEPARATORS = (",", ":")
+LONG_SEPARATORS = (", ", ": ")
+# Chunks pulled per thread hop when a list is streamed to an ASGI server.
+ASYNC_STREAM_BATCH = 100
+
+
+class PayloadEncoder(encoders.JSONEncoder):
+    """DRF's encoder, plus payloads nested below the top level of the response data."""
+
+    def default(self, obj):
+        if isinstance(obj, BSONPayload):
+            return obj.normalized()
+        return super().default(obj)
+
+
+class BSONEncoder(encoders.JSONEncoder):
+    """Encodes the contents of a payload: ObjectId and datetime come out exactly as `normalize` writes them."""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        if isinstance(obj, BSONPayload):
+            return obj.value
+        return super().default(obj)
+
+
+def _escape_line_separators(text: str) -> str:
+    return text.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+
+
+class BSONJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes `serialize_doc` payloads in the C encoder pass.
+
+    Payloads are encoded with `BSONEncoder` and everything else with DRF's encoder, so the bytes
+    match what JSONRenderer produced when views converted documents with `normalize` up front.
+    """
+
+    encoder_class = PayloadEncoder
+
+    def _encoder(self, cls, separators):
+        return cls(ensure_ascii=self.ensure_ascii, allow_nan=not self.strict, separators=separators)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not isinstance(data, (dict, BSONPayload)):
+            return super().render(data, accepted_media_type, renderer_context)
+        separators = SHORT_SEPARATORS if self.compact else LONG_SEPARATORS
+        plain = self._encoder(PayloadEncoder, separators)
+        bson = self._encoder(BSONEncoder, separators)
+        if isinstance(data, BSONPayload):
+            return _escape_line_separators(bson.encode(data.value)).encode()
+        chunks = []
+        for key, value in data.items():
+            if not isinstance(key, str):
+                return super().render(data, accepted_media_type, renderer_context)
+            if isinstance(value, BSONPayload):
+                chunks.append(f"{plain.encode(key)}{separators[1]}{bson.encode(value.value)}")
+            else:
+                chunks.append(f"{plain.encode(key)}{separators[1]}{plain.encode(value)}")
+        return _escape_line_separators("{" + separators[0].join(chunks) + "}").encode()
+
+
+def _served_async(request) -> bool:
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+async def _abatched(chunks):
+    # The cursor blocks, so it is read and encoded in a worker thread a batch at a time; handing
+    # Django a sync iterator would make it buffer the whole list before sending the first byte.
+    while True:
+        batch = await sync_to_async(lambda: list(islice(chunks, ASYNC_STREAM_BATCH)))()
+        for chunk in batch:
+            yield chunk
+        if len(batch) < ASYNC_STREAM_BATCH:
+            return
+
+
+def streamed_list(request, key: str, docs, status: int = 200, trailer=None) -> StreamingHttpResponse:
+    """Streams `{"<key>": [...]}` one document at a time, e.g. straight off a Mongo cursor.
+
+    `trailer` is called once the list is done and its items follow the list, e.g. a page's next
+    cursor. The body is byte-identical to rendering `Response({key: serialize_doc(list(docs)), **trailer()})`.
+    Under ASGI the response gets an async iterator so the server streams it as well.
+    """
+    renderer = BSONJSONRenderer()
+    separators = SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS
+    plain = renderer._encoder(PayloadEncoder, separators)
+    bson = renderer._encoder(BSONEncoder, separators)
+
+    def chunks():
+        yield _escape_line_separators("{" + plain.encode(key) + separators[1] + "[").encode()
+        for idx, doc in enumerate(docs):
+            text = bson.encode(doc)
+            yield _escape_line_separators(separators[0] + text if idx else text).encode()
+        yield b"]"
+        for name, value in (trailer() if trailer else {}).items():
+            text = f"{separators[0]}{plain.encode(name)}{separators[1]}{plain.encode(value)}"
+            yield _escape_line_separators(text).encode()
+        yield b"}"
+
+    content = _abatched(chunks()) if _served_async(request) else chunks()
+    return StreamingHttpResponse(content, status=status, content_type=renderer.media_type)
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'channels',
     'rest_framework',
+    'core',
     'users',
     'wallet',
     'rewards',
@@ -69,9 +70,12 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.middleware.TracingMiddleware',
+    'core.middleware.PrometheusMetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'core.middleware.RateLimitMiddleware',
     'core.middleware.IdempotencyKeyMiddleware',
-    'core.middleware.PrometheusMetricsMiddleware',
+    'core.middleware.IdentityMapMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -156,18 +160,71 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "core.renderers.BSONJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
 API_VERSION = "v1"
+PAGINATION_MAX_LIMIT = int(os.getenv("PAGINATION_MAX_LIMIT", "200"))
+# Serves location, job accept/reject, nearby captains and order tracking from async views. Off by
+# default and switched on by core.asgi: under WSGI every async view runs on a fresh event loop, so the
+# per-loop async Mongo and Redis clients would be rebuilt on each request.
+ASYNC_HOT_VIEWS = os.getenv("ASYNC_HOT_VIEWS", "0") == "1"
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "hybrid_db")
+# Client options per workload, see core.db.get_db. An empty or zero value keeps the PyMongo default;
+# a write concern of 0 makes writes unacknowledged.
+MONGO_WORKLOADS = {
+    name: {
+        "max_pool_size": int(os.getenv(f"MONGO_{name.upper()}_MAX_POOL_SIZE", pool)),
+        "min_pool_size": int(os.getenv(f"MONGO_{name.upper()}_MIN_POOL_SIZE", "0")),
+        "server_selection_timeout_ms": int(os.getenv(f"MONGO_{name.upper()}_SERVER_SELECTION_TIMEOUT_MS", selection)),
+        "socket_timeout_ms": int(os.getenv(f"MONGO_{name.upper()}_SOCKET_TIMEOUT_MS", socket)),
+        "wait_queue_timeout_ms": int(os.getenv(f"MONGO_{name.upper()}_WAIT_QUEUE_TIMEOUT_MS", wait)),
+        "read_preference": os.getenv(f"MONGO_{name.upper()}_READ_PREFERENCE", read_preference),
+        "write_concern": os.getenv(f"MONGO_{name.upper()}_WRITE_CONCERN", write_concern),
+    }
+    for name, pool, selection, socket, wait, read_preference, write_concern in (
+        ("dispatch", "100", "5000", "0", "0", "primary", ""),
+        ("analytics", "10", "5000", "60000", "0", "secondaryPreferred", ""),
+        ("logging", "10", "2000", "5000", "1000", "primary", "0"),
+    )
+}
+# Append-only log collections are written in bulk from a background thread, see core.log_writer.
+LOG_WRITER_ENABLED = os.getenv("LOG_WRITER_ENABLED", "1") == "1"
+LOG_WRITER_BATCH_SIZE = int(os.getenv("LOG_WRITER_BATCH_SIZE", "500"))
+LOG_WRITER_FLUSH_INTERVAL_MS = int(os.getenv("LOG_WRITER_FLUSH_INTERVAL_MS", "1000"))
+LOG_WRITER_MAX_BUFFERED = int(os.getenv("LOG_WRITER_MAX_BUFFERED", "10000"))
+# Admin-tunable config is snapshotted per worker and invalidated over Redis pub/sub, see core.config_snapshot.
+CONFIG_SNAPSHOT_SUBSCRIBE = os.getenv("CONFIG_SNAPSHOT_SUBSCRIBE", "1") == "1"
+CONFIG_SNAPSHOT_MAX_AGE_SEC = float(os.getenv("CONFIG_SNAPSHOT_MAX_AGE_SEC", "30"))
+# Pools and config snapshots are opened before a worker takes traffic, see core.warmup.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+# Import budget for `django.setup()` plus the URLconf, enforced by core.tests.StartupImportTests.
+STARTUP_IMPORT_BUDGET_MS = int(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1200"))
+# Repeated _id lookups within one request or unit of work are served once, see core.identity_map.
+IDENTITY_MAP_ENABLED = os.getenv("IDENTITY_MAP_ENABLED", "1") == "1"
+MONGO_INDEX_CHECK = os.getenv("MONGO_INDEX_CHECK", "warn")
+MONGO_QUERY_STATS_ENABLED = os.getenv("MONGO_QUERY_STATS_ENABLED", "1") == "1"
+MONGO_QUERY_STATS_SAMPLE_RATE = float(os.getenv("MONGO_QUERY_STATS_SAMPLE_RATE", "1.0"))
+MONGO_QUERY_STATS_WINDOW_SEC = int(os.getenv("MONGO_QUERY_STATS_WINDOW_SEC", "300"))
+MONGO_QUERY_STATS_MAX_SHAPES = int(os.getenv("MONGO_QUERY_STATS_MAX_SHAPES", "500"))
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+MONGO_QUERY_EXPLAIN_INTERVAL_SEC = int(os.getenv("MONGO_QUERY_EXPLAIN_INTERVAL_SEC", "600"))
+MONGO_SLOW_QUERY_PERSIST = os.getenv("MONGO_SLOW_QUERY_PERSIST", "0") == "1"
+MONGO_SLOW_QUERY_TTL_HOURS = int(os.getenv("MONGO_SLOW_QUERY_TTL_HOURS", "72"))
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", SECRET_KEY)
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_EXP_MINUTES = int(os.getenv("JWT_EXP_MINUTES", "720"))
 JWT_REFRESH_EXP_MINUTES = int(os.getenv("JWT_REFRESH_EXP_MINUTES", "43200"))
 JWT_ISSUER = os.getenv("JWT_ISSUER", "hybrid-core")
+AUTH_PRINCIPAL_CACHE_TTL_SEC = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SEC", "60"))
+AUTH_REVOCATION_REFRESH_SEC = float(os.getenv("AUTH_REVOCATION_REFRESH_SEC", "5"))
+AUTH_REVOCATION_RECONCILE_SEC = float(os.getenv("AUTH_REVOCATION_RECONCILE_SEC", "60"))
 
 ALLOWED_ROLES = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
 
@@ -196,6 +253,28 @@ DISPATCH_DISTANCE_WEIGHT = float(os.getenv("DISPATCH_DISTANCE_WEIGHT", "1.0"))
 WEATHER_FACTOR = float(os.getenv("WEATHER_FACTOR", "1.0"))
 GOOGLE_MAPS_KEY = os.getenv("GOOGLE_MAPS_KEY")
 MAPS_CACHE_TTL_MIN = int(os.getenv("MAPS_CACHE_TTL_MIN", "30"))
+MAPS_ELEMENTS_PER_MIN = int(os.getenv("MAPS_ELEMENTS_PER_MIN", "0"))
+MAPS_CALLER_ELEMENTS_PER_MIN = {
+    caller.strip(): int(limit)
+    for caller, _, limit in (
+        item.partition(":") for item in os.getenv("MAPS_CALLER_ELEMENTS_PER_MIN", "isochrone:640").split(",")
+    )
+    if caller.strip() and limit.strip()
+}
+MAPS_DEGRADE_AT_PCT = float(os.getenv("MAPS_DEGRADE_AT_PCT", "0.9"))
+MAPS_ETA_CACHE_TTL_SEC = int(os.getenv("MAPS_ETA_CACHE_TTL_SEC", "300"))
+MAPS_FALLBACK_SPEED_KMPH = float(os.getenv("MAPS_FALLBACK_SPEED_KMPH", "25"))
+MAPS_FALLBACK_DETOUR_FACTOR = float(os.getenv("MAPS_FALLBACK_DETOUR_FACTOR", "1.3"))
+ISOCHRONE_MINUTES = [
+    int(m.strip())
+    for m in os.getenv("ISOCHRONE_MINUTES", "10,20,30").split(",")
+    if m.strip()
+]
+ISOCHRONE_BEARINGS = int(os.getenv("ISOCHRONE_BEARINGS", "16"))
+ISOCHRONE_CACHE_TTL_MIN = int(os.getenv("ISOCHRONE_CACHE_TTL_MIN", "1440"))
+ISOCHRONE_FALLBACK_SPEED_KMPH = float(os.getenv("ISOCHRONE_FALLBACK_SPEED_KMPH", "18"))
+ISOCHRONE_PROBE_SPEED_KMPH = float(os.getenv("ISOCHRONE_PROBE_SPEED_KMPH", "40"))
+ISOCHRONE_BATCH_MINUTES = int(os.getenv("ISOCHRONE_BATCH_MINUTES", "0"))
 EV_REWARD_PERCENTAGE = float(os.getenv("EV_REWARD_PERCENTAGE", "0.10"))
 EV_BONUS_MULTIPLIER = float(os.getenv("EV_BONUS_MULTIPLIER", "1.0"))
 FOOD_ALLOWED_VEHICLES = [
@@ -208,16 +287,54 @@ NOTIFICATION_MAX_RETRIES = int(os.getenv("NOTIFICATION_MAX_RETRIES", "3"))
 GO_HOME_ROUTE_BUFFER_KM = float(os.getenv("GO_HOME_ROUTE_BUFFER_KM", "1.0"))
 GO_HOME_ETA_BUFFER_MIN = int(os.getenv("GO_HOME_ETA_BUFFER_MIN", "10"))
 GO_HOME_MAX_SPEED_KMPH = float(os.getenv("GO_HOME_MAX_SPEED_KMPH", "200"))
+ROUTE_OPTIMIZER_TIME_BUDGET_MS = int(os.getenv("ROUTE_OPTIMIZER_TIME_BUDGET_MS", "50"))
 
 RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
 RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "300"))
 RATE_LIMIT_WINDOW_SEC = int(os.getenv("RATE_LIMIT_WINDOW_SEC", "60"))
+RATE_LIMIT_ROLE_MAX_REQUESTS = {
+    role.strip(): int(limit)
+    for role, _, limit in (
+        item.partition(":") for item in os.getenv("RATE_LIMIT_ROLE_MAX_REQUESTS", "CAPTAIN:600,ADMIN:1200").split(",")
+    )
+    if role.strip() and limit.strip()
+}
+RATE_LIMIT_ROUTE_MAX_REQUESTS = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        item.partition(":") for item in os.getenv("RATE_LIMIT_ROUTE_MAX_REQUESTS", "").split(",")
+    )
+    if name.strip() and limit.strip()
+}
+RATE_LIMIT_LOCAL_LEASE = int(os.getenv("RATE_LIMIT_LOCAL_LEASE", "5"))
+RATE_LIMIT_LOCAL_LEASE_SEC = float(os.getenv("RATE_LIMIT_LOCAL_LEASE_SEC", "1"))
+RATE_LIMIT_LOCAL_MAX_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_MAX_KEYS", "10000"))
 RATE_LIMIT_EXEMPT_PATHS = [
     "/api/v1/health",
     "/api/v1/metrics",
 ]
 
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file")
+TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", str(BASE_DIR / "traces.jsonl"))
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "hybrid-backend")
+TRACING_QUEUE_SIZE = int(os.getenv("TRACING_QUEUE_SIZE", "2048"))
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_INTERVAL_MS = int(os.getenv("PROFILER_INTERVAL_MS", "20"))
+PROFILER_SLOW_MS = float(os.getenv("PROFILER_SLOW_MS", "500"))
+PROFILER_MAX_DEPTH = int(os.getenv("PROFILER_MAX_DEPTH", "64"))
+PROFILER_MAX_STACKS_PER_REQUEST = int(os.getenv("PROFILER_MAX_STACKS_PER_REQUEST", "50"))
+PROFILER_MAX_CAPTURE_SEC = float(os.getenv("PROFILER_MAX_CAPTURE_SEC", "30"))
+PROFILER_RETENTION_SEC = int(os.getenv("PROFILER_RETENTION_SEC", "3600"))
+
 IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", "86400"))
+IDEMPOTENCY_LOCK_TTL_SEC = int(os.getenv("IDEMPOTENCY_LOCK_TTL_SEC", "30"))
+IDEMPOTENCY_WAIT_MS = int(os.getenv("IDEMPOTENCY_WAIT_MS", "1000"))
+IDEMPOTENCY_COMPRESS_MIN_BYTES = int(os.getenv("IDEMPOTENCY_COMPRESS_MIN_BYTES", "512"))
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", "65536"))
 
 ORDER_ASSIGN_TIMEOUT_SEC = int(os.getenv("ORDER_ASSIGN_TIMEOUT_SEC", "600"))
 ORDER_DELIVERY_SLA_MIN = int(os.getenv("ORDER_DELIVERY_SLA_MIN", "45"))
@@ -0,0 +1,1453 @@
+import asyncio
+import json
+from unittest import SkipTest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+from bson import ObjectId
+from pymongo import WriteConcern
+from django.conf import settings
+from django.http import HttpResponse
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import path
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import geometry, indexes, metrics, ratelimit, tracing
+from core.route_utils import decode_polyline, distance_point_to_polyline_km
+
+GOOGLE_SAMPLE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+GOOGLE_SAMPLE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+
+
+class PolylineCodecTests(SimpleTestCase):
+    def test_decode_matches_reference_sample(self):
+        coords = geometry.decode_polyline_array(GOOGLE_SAMPLE)
+        np.testing.assert_allclose(coords, GOOGLE_SAMPLE_POINTS)
+        self.assertEqual(decode_polyline(GOOGLE_SAMPLE)[0], {"lat": 38.5, "lng": -120.2})
+
+    def test_encode_round_trip(self):
+        self.assertEqual(geometry.encode_polyline(np.array(GOOGLE_SAMPLE_POINTS)), GOOGLE_SAMPLE)
+        rng = np.random.default_rng(3)
+        coords = np.round(rng.uniform([12.8, 77.4], [13.1, 77.8], size=(200, 2)), 5)
+        np.testing.assert_allclose(geometry.decode_polyline_array(geometry.encode_polyline(coords)), coords)
+
+    def test_decode_rejects_truncated_input(self):
+        with self.assertRaises(ValueError):
+            geometry.decode_polyline_array(GOOGLE_SAMPLE[:-1])
+
+
+class PolylineDistanceTests(SimpleTestCase):
+    def test_point_between_vertices_uses_segment_distance(self):
+        line = np.array([[12.90, 77.50], [12.90, 77.60]])
+        point = {"lat": 12.90, "lng": 77.55}
+        self.assertAlmostEqual(distance_point_to_polyline_km(point, [{"lat": 12.90, "lng": 77.50}, {"lat": 12.90, "lng": 77.60}]), 0.0, places=6)
+        offset = geometry.distance_point_to_polyline_km({"lat": 12.91, "lng": 77.55}, line)
+        self.assertAlmostEqual(offset, 1.112, places=2)
+
+    def test_batch_distances_match_single_point(self):
+        line = geometry.decode_polyline_array(GOOGLE_SAMPLE)
+        points = np.array([[39.0, -121.0], [42.0, -123.0], [38.5, -120.2]])
+        batch = geometry.distance_points_to_polyline_km(points, line)
+        single = [geometry.distance_point_to_polyline_km({"lat": p[0], "lng": p[1]}, line) for p in points]
+        np.testing.assert_allclose(batch, single)
+        self.assertAlmostEqual(batch[2], 0.0, places=6)
+
+    def test_empty_route(self):
+        self.assertEqual(distance_point_to_polyline_km({"lat": 1, "lng": 1}, []), 9999.0)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.ops.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        ops, self.ops = self.ops, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in ops]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+        self.hashes = {}
+        self.calls = 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def get(self, key):
+        self.calls += 1
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value if isinstance(value, bytes) else str(value)
+        return True
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({
+            k.encode(): v if isinstance(v, bytes) else str(v).encode() for k, v in mapping.items()
+        })
+
+    def expire(self, key, ttl):
+        return True
+
+    def exists(self, key):
+        return int(key in self.values)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.hashes.pop(key, None)
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= float(high)]:
+            zset.pop(member)
+
+    def zrangebyscore(self, key, low, high):
+        return [m for m, score in self.zsets.get(key, {}).items() if score >= float(low)]
+
+
+class AuthCacheTestMixin:
+    def setUp(self):
+        from bson import ObjectId
+        from core import auth
+
+        self.auth = auth
+        auth._revocations.update({
+            "jtis": set(), "version": None, "checked_at": 0.0, "loaded": False, "reconciled": {}, "reconciled_at": None,
+        })
+        self.user = {"_id": ObjectId(), "phone": "+910000000000", "role": "USER", "is_active": True, "fcm_token": None}
+        self.token = auth.create_access_token(self.user)
+        self.db = MagicMock()
+        self.db.users.find_one.return_value = dict(self.user)
+        self.db.token_blacklist.find_one.return_value = None
+        self.db.token_blacklist.find.return_value = []
+        self.redis = _FakeRedis()
+        patchers = [
+            patch("core.auth.get_db", return_value=self.db),
+            patch("core.auth.get_client", return_value=self.redis),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _request(self, token=None):
+        return RequestFactory().get("/api/v1/users/me/", HTTP_AUTHORIZATION=f"Bearer {token or self.token}")
+
+
+class PrincipalCacheTests(AuthCacheTestMixin, SimpleTestCase):
+    def test_request_is_authenticated_once(self):
+        from rest_framework.request import Request
+
+        request = self._request()
+        self.auth.get_user_from_request(request)
+        user, _ = self.auth.JWTAuthentication().authenticate(Request(request))
+        self.assertEqual(user.id, str(self.user["_id"]))
+        self.db.users.find_one.assert_called_once()
+
+    def test_cached_principal_skips_mongo(self):
+        self.auth.get_user_from_request(self._request())
+        doc = self.auth.get_user_from_request(self._request())
+        self.assertEqual(doc["_id"], self.user["_id"])
+        self.assertEqual(doc["role"], "USER")
+        self.db.users.find_one.assert_called_once()
+        self.db.token_blacklist.find_one.assert_not_called()
+
+    def test_invalidate_principal_forces_reload(self):
+        self.auth.get_user_from_request(self._request())
+        self.auth.invalidate_principal(self.user["_id"])
+        self.db.users.find_one.return_value = None
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user_from_request(self._request())
+
+    def test_falls_back_to_mongo_without_redis(self):
+        with patch("core.auth.get_client", side_effect=Exception("down")):
+            self.auth.get_user_from_request(self._request())
+        self.db.token_blacklist.find_one.assert_called_once()
+        self.db.users.find_one.assert_called_once()
+
+
+class TokenRevocationTests(AuthCacheTestMixin, SimpleTestCase):
+    def _revoke(self, token):
+        payload = self.auth.decode_token(token)
+        self.auth.blacklist_token(payload["jti"], "access", payload["sub"], payload["exp"])
+
+    def test_revoked_token_is_rejected_locally(self):
+        self._revoke(self.token)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user_from_request(self._request())
+        update = self.db.token_blacklist.update_one.call_args[0][1]["$set"]
+        self.assertIn("expires_at", update)
+        self.db.token_blacklist.find_one.assert_not_called()
+
+    def test_snapshot_answers_without_network_until_refresh(self):
+        self.auth.get_user_from_request(self._request())
+        calls = self.redis.calls
+        for _ in range(5):
+            self.auth._is_token_blacklisted("unknown")
+        self.assertEqual(self.redis.calls, calls)
+
+    def test_revocation_from_another_worker_lands_after_refresh(self):
+        self.auth.get_user_from_request(self._request())
+        jti = self.auth.decode_token(self.token)["jti"]
+        self.redis.zadd(self.auth.REVOKED_JTIS_KEY, {jti: self.auth._now_ts() + 600})
+        self.redis.incr(self.auth.REVOKED_VERSION_KEY)
+        self.assertFalse(self.auth._is_token_blacklisted(jti))
+        self.auth._revocations["checked_at"] = 0.0
+        self.assertTrue(self.auth._is_token_blacklisted(jti))
+
+    def test_only_access_tokens_enter_the_snapshot(self):
+        refresh = self.auth.decode_token(self.auth.create_refresh_token(self.user))
+        self.auth.blacklist_token(refresh["jti"], "refresh", refresh["sub"], refresh["exp"])
+        self.assertNotIn(refresh["jti"], self.auth._revocations["jtis"])
+        self.assertNotIn(refresh["jti"], self.redis.zsets.get(self.auth.REVOKED_JTIS_KEY, {}))
+        self.assertIsNone(self.redis.get(self.auth.REVOKED_VERSION_KEY))
+        self.db.token_blacklist.find_one.return_value = {"jti": refresh["jti"]}
+        self.assertTrue(self.auth.is_token_blacklisted(refresh["jti"]))
+
+        access = self.auth.decode_token(self.token)
+        self._revoke(self.token)
+        self.assertEqual(self.redis.zsets[self.auth.REVOKED_JTIS_KEY][access["jti"]], access["exp"])
+
+    def test_backfill_mirrors_only_access_tokens(self):
+        self.auth._is_token_blacklisted("unknown")
+        query = self.db.token_blacklist.find.call_args[0][0]
+        self.assertEqual(query["token_type"], "access")
+
+    def test_revocation_lands_from_mongo_when_the_mirror_write_fails(self):
+        from datetime import timedelta
+
+        self.auth.get_user_from_request(self._request())
+        payload = self.auth.decode_token(self.token)
+        with patch.object(self.redis, "pipeline", side_effect=Exception("down")):
+            self._revoke(self.token)
+        # Another worker: its snapshot never saw the JTI and the Redis version did not move.
+        self.auth._revocations["jtis"] = set()
+        self.db.token_blacklist.find.return_value = [{"jti": payload["jti"], "exp": payload["exp"]}]
+        self.auth._revocations["checked_at"] = 0.0
+        self.auth.get_user_from_request(self._request())
+
+        self.auth._revocations["reconciled_at"] -= timedelta(seconds=settings.AUTH_REVOCATION_RECONCILE_SEC)
+        self.auth._revocations["checked_at"] = 0.0
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user_from_request(self._request())
+        query = self.db.token_blacklist.find.call_args[0][0]
+        self.assertEqual(query["token_type"], "access")
+        self.assertIn("created_at", query)
+
+        self.redis.incr(self.auth.REVOKED_VERSION_KEY)
+        self.auth._revocations["checked_at"] = 0.0
+        self.assertTrue(self.auth._is_token_blacklisted(payload["jti"]))
+
+    def test_expired_revocations_are_pruned(self):
+        self.redis.set(self.auth.REVOKED_SYNC_KEY, 1)
+        self.redis.zadd(self.auth.REVOKED_JTIS_KEY, {"old": self.auth._now_ts() - 10})
+        self.assertFalse(self.auth._is_token_blacklisted("old"))
+        self.assertNotIn("old", self.redis.zsets[self.auth.REVOKED_JTIS_KEY])
+
+
+@override_settings(RATE_LIMIT_LOCAL_LEASE=5, RATE_LIMIT_LOCAL_LEASE_SEC=1.0)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        ratelimit.reset_local()
+        self.script = MagicMock(return_value=[5, 0])
+        patcher = patch("core.ratelimit._token_bucket", return_value=self.script)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_keys_use_route_pattern(self):
+        first, name = ratelimit.resolve_route("/api/v1/orders/reorder/64b000000000000000000001")
+        second, _ = ratelimit.resolve_route("/api/v1/orders/reorder/64b000000000000000000002")
+        self.assertEqual(first, second)
+        self.assertIn("<str:order_id>", first)
+        self.assertEqual(name, "order-reorder")
+
+    @override_settings(
+        RATE_LIMIT_MAX_REQUESTS=100,
+        RATE_LIMIT_ROLE_MAX_REQUESTS={"CAPTAIN": 600},
+        RATE_LIMIT_ROUTE_MAX_REQUESTS={"captain-location": 1200},
+    )
+    def test_limits_by_role_and_route(self):
+        self.assertEqual(ratelimit.limit_for("order-create", None)[0], 100)
+        self.assertEqual(ratelimit.limit_for("order-create", "CAPTAIN")[0], 600)
+        self.assertEqual(ratelimit.limit_for("captain-location", "CAPTAIN")[0], 1200)
+
+    def test_leased_tokens_are_spent_locally(self):
+        for _ in range(5):
+            self.assertEqual(ratelimit.check("rl:k", 300, 60), (True, 0))
+        self.script.assert_called_once()
+        ratelimit.check("rl:k", 300, 60)
+        self.assertEqual(self.script.call_count, 2)
+
+    def test_denial_is_cached_until_retry(self):
+        self.script.return_value = [0, 1500]
+        self.assertEqual(ratelimit.check("rl:k", 300, 60), (False, 2))
+        self.assertFalse(ratelimit.check("rl:k", 300, 60)[0])
+        self.script.assert_called_once()
+
+    def test_fails_open_without_redis(self):
+        self.script.side_effect = Exception("down")
+        self.assertEqual(ratelimit.check("rl:k", 300, 60), (True, 0))
+
+    def test_middleware_returns_429_with_retry_after(self):
+        from core.middleware import RateLimitMiddleware
+
+        self.script.return_value = [0, 3000]
+        middleware = RateLimitMiddleware(lambda request: HttpResponse("ok"))
+        response = middleware(RequestFactory().get("/api/v1/orders/reorder/abc"))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+        key = self.script.call_args.kwargs["keys"][0]
+        self.assertEqual(key, "rl:ip:127.0.0.1:GET:api/v1/orders/reorder/<str:order_id>")
+
+
+@override_settings(IDEMPOTENCY_WAIT_MS=0, IDEMPOTENCY_COMPRESS_MIN_BYTES=64, IDEMPOTENCY_MAX_BODY_BYTES=4096)
+class IdempotencyTests(SimpleTestCase):
+    def setUp(self):
+        from core.middleware import IdempotencyKeyMiddleware
+
+        self.redis = _FakeRedis()
+        patcher = patch("core.middleware.get_binary_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+        self.body = b'{"order": "' + b"x" * 1000 + b'"}'
+
+        def view(request):
+            self.calls += 1
+            return HttpResponse(self.body, status=201, content_type="application/json")
+
+        self.middleware = IdempotencyKeyMiddleware(view)
+
+    def _post(self, payload='{"a": 1}'):
+        request = RequestFactory().post(
+            "/api/v1/orders/", data=payload, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k1"
+        )
+        return self.middleware(request)
+
+    def test_replay_returns_stored_response_compressed(self):
+        first = self._post()
+        second = self._post()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Idempotency-Replay"], "true")
+        record = next(iter(self.redis.hashes.values()))
+        self.assertEqual(record[b"encoding"], b"zlib")
+        self.assertLess(len(record[b"body"]), len(self.body))
+        self.assertFalse([key for key in self.redis.values if key.endswith(":lock")])
+
+    def test_in_flight_duplicate_returns_409(self):
+        key = "idemp:POST:/api/v1/orders/:anon:k1:lock"
+        self.redis.set(key, b"hash", nx=True)
+        response = self._post()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+    def test_different_payload_is_rejected(self):
+        self._post()
+        self.assertEqual(self._post('{"a": 2}').status_code, 409)
+
+    def test_large_body_keeps_only_status(self):
+        self.body = np.random.default_rng(5).bytes(8192)
+        self._post()
+        replay = self._post()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(replay.status_code, 201)
+        self.assertIn(b"idempotency_replay", replay.content)
+
+
+class RequestMetricsTests(SimpleTestCase):
+    def test_route_label_and_stage_times(self):
+        from django.urls import resolve
+        from core.middleware import PrometheusMetricsMiddleware
+
+        path = "/api/v1/orders/reorder/64b000000000000000000001"
+
+        def view(request):
+            request.resolver_match = resolve(path)
+            with metrics.timed(metrics.STAGE_REDIS):
+                pass
+            event = MagicMock(duration_micros=2500, command_name="find")
+            metrics.MongoCommandTimer().succeeded(event)
+            return HttpResponse("ok")
+
+        with patch("core.metrics.observe_request") as observe:
+            PrometheusMetricsMiddleware(view)(RequestFactory().get(path))
+        method, route, status, _, stages = observe.call_args[0]
+        self.assertEqual((method, route, status), ("GET", "api/v1/orders/reorder/<str:order_id>", 200))
+        self.assertAlmostEqual(stages[metrics.STAGE_MONGO], 0.0025)
+        self.assertIn(metrics.STAGE_REDIS, stages)
+
+    def test_stage_time_outside_request_is_ignored(self):
+        metrics.add_stage_time(metrics.STAGE_MAPS, 1.0)
+        token = metrics.start_request()
+        self.assertEqual(metrics.finish_request(token), {})
+
+
+@override_settings(TRACING_ENABLED=True, TRACING_SAMPLE_RATE=1.0)
+class TracingTests(SimpleTestCase):
+    def setUp(self):
+        self.spans = []
+        patcher = patch("core.tracing._export", side_effect=lambda span: self.spans.append(span.to_dict()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_child_spans_share_trace_and_propagate(self):
+        with tracing.start_span("root", root=True) as root:
+            with tracing.start_span("child") as child:
+                carrier = tracing.inject({})
+        self.assertEqual(child.parent_id, root.span_id)
+        self.assertEqual(tracing.extract(carrier[tracing.TRACEPARENT]), (root.trace_id, child.span_id))
+        self.assertEqual([s["name"] for s in self.spans], ["child", "root"])
+
+    def test_no_orphan_spans_outside_a_trace(self):
+        with tracing.start_span("library call") as span:
+            self.assertIsNone(span)
+        with override_settings(TRACING_ENABLED=False), tracing.start_span("root", root=True) as span:
+            self.assertIsNone(span)
+        self.assertEqual(self.spans, [])
+        self.assertIsNone(tracing.extract("00-" + "a" * 32 + "-" + "b" * 16 + "-00"))
+
+    def test_mongo_commands_become_client_spans(self):
+        listener = tracing.MongoTracingListener()
+        started = MagicMock(command_name="find", database_name="hybrid", request_id=1, operation_id=1)
+        started.command = {"find": "orders"}
+        with tracing.start_span("root", root=True) as root:
+            listener.started(started)
+            listener.succeeded(MagicMock(request_id=1, operation_id=1))
+        mongo = self.spans[0]
+        self.assertEqual(mongo["name"], "mongo find")
+        self.assertEqual(mongo["parent_id"], root.span_id)
+        self.assertEqual(mongo["attributes"]["db.mongodb.collection"], "orders")
+
+    def test_middleware_continues_incoming_trace(self):
+        from django.urls import resolve
+        from core.middleware import TracingMiddleware
+
+        path = "/api/v1/orders/reorder/abc"
+
+        def view(request):
+            request.resolver_match = resolve(path)
+            return HttpResponse("ok")
+
+        traceparent = "00-" + "1" * 32 + "-" + "2" * 16 + "-01"
+        response = TracingMiddleware(view)(RequestFactory().get(path, HTTP_TRACEPARENT=traceparent))
+        self.assertEqual(response["X-Trace-Id"], "1" * 32)
+        self.assertEqual(self.spans[0]["name"], "GET api/v1/orders/reorder/<str:order_id>")
+        self.assertEqual(self.spans[0]["parent_id"], "2" * 16)
+
+    def test_consumer_messages_continue_sender_trace(self):
+        import asyncio
+
+        class Base:
+            async def dispatch(self, message):
+                return tracing.current_span()
+
+        class Consumer(tracing.TracedConsumerMixin, Base):
+            pass
+
+        with tracing.start_span("matching", root=True):
+            event = tracing.inject({"type": "job_offer", "payload": {}})
+        span = asyncio.run(Consumer().dispatch(event))
+        self.assertEqual(span.trace_id, self.spans[0]["trace_id"])
+        self.assertEqual(span.name, "ws Consumer job_offer")
+
+
+class IndexRegistryTests(SimpleTestCase):
+    def test_apps_declare_indexes(self):
+        declared = indexes.declared()
+        for collection in ("token_blacklist", "auth_sessions", "user_addresses", "favorites", "ledger_entries", "captains"):
+            self.assertIn(collection, declared)
+        names = [indexes.index_name(model) for models in declared.values() for model in models]
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_conflicting_declaration_is_rejected(self):
+        from pymongo import IndexModel
+
+        with self.assertRaises(ValueError):
+            indexes.register("token_blacklist", [IndexModel([("jti", 1)], name="token_blacklist_jti")])
+
+    def test_apply_and_missing(self):
+        db = MagicMock()
+        db.__getitem__.return_value.list_indexes.return_value = [{"name": "_id_"}, {"name": "token_blacklist_jti"}]
+        indexes.apply(db=db, collections=["token_blacklist"])
+        db.__getitem__.assert_called_once_with("token_blacklist")
+        absent = indexes.missing(db=db)
+        self.assertIn("token_blacklist.token_blacklist_ttl", absent)
+        self.assertNotIn("token_blacklist.token_blacklist_jti", absent)
+
+    def test_startup_check_modes(self):
+        with patch("core.indexes.missing", return_value=["users.users_created_at"]):
+            with override_settings(MONGO_INDEX_CHECK="warn"), self.assertLogs("core.indexes", "WARNING"):
+                self.assertEqual(indexes.verify_on_startup(), ["users.users_created_at"])
+            with override_settings(MONGO_INDEX_CHECK="strict"), self.assertRaises(ImproperlyConfigured):
+                indexes.verify_on_startup()
+            with override_settings(MONGO_INDEX_CHECK="off"):
+                self.assertEqual(indexes.verify_on_startup(), [])
+
+    def test_hot_paths_do_not_create_indexes(self):
+        from users import services as user_services
+        from wallet import services as wallet_services
+
+        db = MagicMock()
+        with patch("wallet.services.get_db", return_value=db), patch("users.services.get_db", return_value=db):
+            wallet_services.create_ledger_transaction("ORDER", "o1", [
+                {"account": "user", "direction": "DEBIT", "amount": 100},
+                {"account": "platform", "direction": "CREDIT", "amount": 100},
+            ])
+            user_services.list_user_addresses("64b000000000000000000001")
+        self.assertFalse(any("create_index" in str(call) for call in db.mock_calls))
+
+
+_OID = ObjectId()
+_POINT = {"type": "Point", "coordinates": [77.59, 12.97]}
+
+# (collection, filter, sort) for the queries on request and matching hot paths.
+HOT_QUERIES = [
+    ("captains", {"user_id": _OID}, None),
+    ("captains", {
+        "is_online": True,
+        "is_verified": True,
+        "is_busy": {"$ne": True},
+        "vehicle_type": {"$in": ["BIKE", "EV_BIKE"]},
+        "location": {"$near": {"$geometry": _POINT, "$maxDistance": 3000}},
+    }, None),
+    ("captains", {
+        "is_online": True,
+        "is_verified": True,
+        "is_busy": True,
+        "current_job_type": "ORDER",
+        "location": {"$near": {"$geometry": _POINT, "$maxDistance": 1500}},
+    }, None),
+    ("orders", {"restaurant_id": _OID, "status": "DELIVERED"}, None),
+    ("orders", {"user_id": _OID, "status": "DELIVERED"}, None),
+    ("orders", {"settled": {"$ne": True}, "status": "DELIVERED"}, None),
+    ("rides", {"user_id": _OID}, None),
+    ("rides", {"settled": {"$ne": True}, "status": "COMPLETED"}, None),
+    ("token_blacklist", {"jti": "jti-1"}, None),
+    ("users", {"phone": "+919000000000"}, None),
+    ("wallet_transactions", {"user_id": _OID}, [("created_at", -1), ("_id", -1)]),
+    ("ledger_entries", {"user_id": _OID}, [("created_at", -1), ("_id", -1)]),
+    ("messages", {"room_id": "room-1"}, [("created_at", -1), ("_id", -1)]),
+    ("payouts", {"captain_id": _OID}, [("requested_at", -1), ("_id", -1)]),
+    ("menu_items", {"restaurant_id": _OID, "is_available": True}, None),
+]
+
+
+def _supports(model, query, sort):
+    document = model.document
+    keys = list(document["key"].items())
+    if keys[0][0] not in query:
+        return False
+    for field, value in (document.get("partialFilterExpression") or {}).items():
+        if query.get(field) != value:
+            return False
+    for field, condition in query.items():
+        if isinstance(condition, dict) and "$near" in condition and (field, "2dsphere") not in keys:
+            return False
+    if sort:
+        start = next((idx for idx, (field, _) in enumerate(keys) if field not in query), len(keys))
+        tail = keys[start:start + len(sort)]
+        if [field for field, _ in tail] != [field for field, _ in sort]:
+            return False
+        same = all(direction == wanted for (_, direction), (_, wanted) in zip(tail, sort))
+        flipped = all(direction == -wanted for (_, direction), (_, wanted) in zip(tail, sort))
+        return same or flipped
+    return True
+
+
+def _plan_stages(plan):
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        for child in plan.get("inputStages") or []:
+            stages.extend(_plan_stages(child))
+        plan = plan.get("inputStage") or plan.get("queryPlan")
+    return stages
+
+
+class HotQueryIndexTests(SimpleTestCase):
+    def test_every_hot_query_has_a_declared_index(self):
+        declared = indexes.declared()
+        for collection, query, sort in HOT_QUERIES:
+            with self.subTest(collection=collection, query=sorted(query)):
+                supporting = [indexes.index_name(m) for m in declared.get(collection, []) if _supports(m, query, sort)]
+                self.assertTrue(supporting, f"no declared index serves {collection} {sorted(query)}")
+
+    def test_superseded_captain_geo_index_is_retired(self):
+        self.assertIn("captain_location_2dsphere", indexes.retired()["captains"])
+        names = [indexes.index_name(m) for m in indexes.declared()["captains"]]
+        self.assertNotIn("captain_location_2dsphere", names)
+
+
+class HotQueryExplainTests(SimpleTestCase):
+    """Runs the hot queries through explain() on a scratch database; skipped without a Mongo server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from pymongo import MongoClient
+
+        cls.client = MongoClient(settings.MONGO_URI, serverSelectionTimeoutMS=1000)
+        try:
+            cls.client.admin.command("ping")
+        except Exception:
+            cls.client.close()
+            raise SkipTest("MongoDB is not reachable")
+        cls.db = cls.client[f"{settings.MONGO_DB_NAME}_index_audit"]
+        collections = {collection for collection, _, _ in HOT_QUERIES}
+        indexes.apply(db=cls.db, collections=collections)
+        for collection in collections:
+            cls.db[collection].insert_many([
+                {"user_id": ObjectId(), "restaurant_id": ObjectId(), "status": "CREATED", "settled": False,
+                 "jti": f"seed-{collection}-{idx}", "phone": f"+91800000{idx:04d}", "is_available": True,
+                 "created_at": idx}
+                for idx in range(20)
+            ])
+        cls.db.captains.insert_many([
+            {"user_id": ObjectId(), "location": _POINT, "is_online": True, "is_verified": True,
+             "is_busy": False, "vehicle_type": "BIKE"}
+            for _ in range(5)
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.drop_database(cls.db.name)
+        cls.client.close()
+        super().tearDownClass()
+
+    def test_hot_queries_do_not_scan_collections(self):
+        for collection, query, sort in HOT_QUERIES:
+            with self.subTest(collection=collection, query=sorted(query)):
+                cursor = self.db[collection].find(query).limit(20)
+                if sort:
+                    cursor = cursor.sort(sort)
+                plan = cursor.explain()["queryPlanner"]["winningPlan"]
+                stages = _plan_stages(plan)
+                self.assertNotIn("COLLSCAN", stages)
+                self.assertNotIn("SORT", stages)
+
+
+
+def _unprojected_reads(db):
+    reads = []
+    for name, args, kwargs in db.mock_calls:
+        method = name.split(".")[-1]
+        if method in ("find", "find_one"):
+            projected = len(args) > 1 or "projection" in kwargs
+        elif method == "find_one_and_update":
+            projected = len(args) > 2 or "projection" in kwargs
+        else:
+            continue
+        if not projected:
+            reads.append(name)
+    return reads
+
+
+class HotPathProjectionTests(SimpleTestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from core.utils import utcnow
+
+        self.db = MagicMock()
+        self.job_id = ObjectId()
+        self.captain_id = ObjectId()
+        self.db.orders.find_one.return_value = {
+            "_id": self.job_id,
+            "user_id": ObjectId(),
+            "status": "PLACED",
+            "current_offer": {"captain_id": self.captain_id},
+        }
+        self.db.captains.find_one.return_value = {
+            "user_id": self.captain_id,
+            "location": _POINT,
+            "last_seen": utcnow() - timedelta(seconds=30),
+        }
+        self.db.users.find_one.return_value = {"fcm_token": None}
+        patches = [
+            patch("core.matching_service.get_db", return_value=self.db),
+            patch("orders.state_machine.get_db", return_value=self.db),
+            patch("notifications.services.get_db", return_value=self.db),
+            patch("captains.services.get_db", return_value=self.db),
+            patch("core.matching_service._send_ws"),
+            patch("core.matching_service.clear_offer"),
+            patch("core.matching_service.set_offer"),
+            patch("core.matching_service.pop_candidate", return_value=str(self.captain_id)),
+            patch("core.matching_service.is_ws_online", return_value=False),
+            patch("core.matching_service.threading.Timer"),
+            patch("vehicles.services.get_food_allowed_vehicles", return_value=["BIKE"]),
+        ]
+        for item in patches:
+            item.start()
+            self.addCleanup(item.stop)
+
+    def assertProjected(self, api_reads=0):
+        reads = _unprojected_reads(self.db)
+        self.assertEqual(len(reads), api_reads, f"unprojected reads: {reads}")
+
+    def test_offer_and_push_read_slim_documents(self):
+        from core import matching_service
+
+        matching_service.offer_next_captain("ORDER", str(self.job_id))
+        self.assertProjected()
+
+    def test_accept_only_reads_full_job_for_response(self):
+        from core import matching_service
+
+        self.db.captains.find_one_and_update.return_value = {"_id": ObjectId()}
+        matching_service.accept_job("ORDER", str(self.job_id), str(self.captain_id))
+        self.assertProjected(api_reads=1)
+
+    def test_dispatch_search_and_status_transitions_are_projected(self):
+        from core import matching_service
+        from orders import state_machine
+
+        matching_service.find_nearby_captains(_POINT, allowed_vehicle_types=["BIKE"])
+        matching_service.broadcast_location("ORDER", str(self.job_id), str(self.captain_id), 12.97, 77.59)
+        state_machine.set_order_status(str(self.job_id), "ASSIGNED")
+        state_machine.handle_no_captain(str(self.job_id))
+        self.assertProjected()
+
+    def test_location_ping_reads_only_gps_fields(self):
+        from captains import services as captain_services
+
+        self.db.captains.find_one_and_update.return_value = {"user_id": self.captain_id}
+        captain_services.update_location(str(self.captain_id), 12.9701, 77.5901)
+        self.assertProjected(api_reads=1)
+
+
+class AsyncDataAccessTests(SimpleTestCase):
+    def setUp(self):
+        from core import db as db_module, redis_queue
+
+        self.addCleanup(db_module._async_dbs.clear)
+        self.addCleanup(redis_queue._async_clients.clear)
+
+    @override_settings(MONGO_URI="mongodb://localhost:27017/hybrid_db")
+    def test_async_db_is_cached_per_event_loop(self):
+        from core import db as db_module
+
+        async def two_lookups():
+            return db_module.get_async_db(), db_module.get_async_db()
+
+        with patch("core.db.AsyncMongoClient", side_effect=lambda *a, **kw: MagicMock()) as client_cls:
+            first, again = asyncio.run(two_lookups())
+            other, _ = asyncio.run(two_lookups())
+        self.assertIs(first, again)
+        self.assertIsNot(first, other)
+        self.assertEqual(client_cls.call_count, 2)
+        listeners = client_cls.call_args.kwargs["event_listeners"]
+        self.assertEqual(len(listeners), 3)
+
+    def test_async_db_requires_running_loop(self):
+        from core import db as db_module
+
+        with self.assertRaises(RuntimeError):
+            db_module.get_async_db()
+
+    def test_presence_uses_async_redis(self):
+        from core import redis_queue
+
+        client = MagicMock(sadd=AsyncMock(), srem=AsyncMock(), sismember=AsyncMock(return_value=1))
+        with patch("core.redis_queue.get_async_client", return_value=client):
+            asyncio.run(redis_queue.aset_ws_presence("captain", "c1", True))
+            asyncio.run(redis_queue.aset_ws_presence("user", "u1", False))
+            online = asyncio.run(redis_queue.ais_ws_online("captain", "c1"))
+        client.sadd.assert_awaited_once_with("ws:captains", "c1")
+        client.srem.assert_awaited_once_with("ws:users", "u1")
+        self.assertTrue(online)
+
+
+def _async_collection(**results):
+    collection = MagicMock()
+    for method in ("find_one", "find_one_and_update", "update_one", "insert_one"):
+        setattr(collection, method, AsyncMock(return_value=results.get(method)))
+    return collection
+
+
+def _hot_urlpatterns():
+    from captains import views as captain_views
+
+    # What core.asgi routes to; the test runner itself imports the URLconf with ASYNC_HOT_VIEWS off.
+    return [path("api/v1/captain/location/", captain_views.AsyncCaptainLocationView.as_view())]
+
+
+urlpatterns = _hot_urlpatterns()
+
+
+@override_settings(RATE_LIMIT_ENABLED=False, TRACING_ENABLED=False, ROOT_URLCONF="core.tests")
+class AsyncHotPathViewTests(SimpleTestCase):
+    def setUp(self):
+        self.captain_id = ObjectId()
+        self.principal = {"_id": self.captain_id, "role": "CAPTAIN", "phone": "9000000000", "is_active": True}
+        self.captain = {
+            "_id": ObjectId(),
+            "user_id": self.captain_id,
+            "location": {"type": "Point", "coordinates": [77.5901, 12.9701]},
+            "is_online": True,
+        }
+        patches = [
+            patch("core.auth.get_user_doc_by_token", return_value=self.principal),
+            patch("core.auth.aget_user_doc_by_token", AsyncMock(return_value=self.principal)),
+        ]
+        for item in patches:
+            item.start()
+            self.addCleanup(item.stop)
+
+    def _sync_location_response(self):
+        from captains import views
+
+        db = MagicMock()
+        db.captains.find_one.return_value = None
+        db.captains.find_one_and_update.return_value = self.captain
+        request = RequestFactory().post(
+            "/api/v1/captain/location/", {"lat": 12.9701, "lng": 77.5901},
+            content_type="application/json", HTTP_AUTHORIZATION="Bearer t",
+        )
+        with patch("captains.services.get_db", return_value=db):
+            response = views.CaptainLocationView.as_view()(request)
+        response.render()
+        return response
+
+    async def test_location_update_runs_on_the_event_loop_with_the_same_schema(self):
+        db = MagicMock(captains=_async_collection(find_one_and_update=self.captain))
+        with patch("captains.services.get_async_db", return_value=db), \
+                patch("captains.services.get_db", side_effect=AssertionError("sync Mongo on async path")):
+            response = await self.async_client.post(
+                "/api/v1/captain/location/", {"lat": 12.9701, "lng": 77.5901},
+                content_type="application/json", headers={"authorization": "Bearer t"},
+            )
+        self.assertEqual(response.status_code, 200)
+        db.captains.find_one_and_update.assert_awaited_once()
+        sync_response = await asyncio.to_thread(self._sync_location_response)
+        self.assertEqual(response.json(), json.loads(sync_response.content))
+
+    def test_hot_views_are_sync_unless_enabled(self):
+        from captains import views
+        from core.async_views import hot_path_view
+
+        view = hot_path_view(views.CaptainLocationView, views.AsyncCaptainLocationView)
+        self.assertIs(view.view_class, views.CaptainLocationView)
+        with override_settings(ASYNC_HOT_VIEWS=True):
+            view = hot_path_view(views.CaptainLocationView, views.AsyncCaptainLocationView)
+        self.assertIs(view.view_class, views.AsyncCaptainLocationView)
+
+    async def test_role_is_enforced_before_the_async_handler(self):
+        self.principal["role"] = "USER"
+        with patch("captains.services.aupdate_location", AsyncMock()) as update:
+            response = await self.async_client.post(
+                "/api/v1/captain/location/", {"lat": 12.97, "lng": 77.59},
+                content_type="application/json", headers={"authorization": "Bearer t"},
+            )
+        self.assertEqual(response.status_code, 403)
+        update.assert_not_awaited()
+
+    def test_accept_job_awaits_every_dependency(self):
+        from core import matching_service
+
+        job_id = ObjectId()
+        job = {"_id": job_id, "user_id": ObjectId(), "current_offer": {"captain_id": self.captain_id}}
+        orders = _async_collection(find_one=job)
+        db = MagicMock(
+            orders=orders,
+            captains=_async_collection(find_one_and_update={"_id": self.captain["_id"]}),
+        )
+        with patch("core.matching_service.get_async_db", return_value=db), \
+                patch("core.matching_service.get_db", side_effect=AssertionError("sync Mongo on async path")), \
+                patch("core.matching_service.aclear_offer", AsyncMock()) as clear_offer, \
+                patch("core.matching_service._asend_ws", AsyncMock()) as send_ws, \
+                patch("vehicles.services.aget_food_allowed_vehicles", AsyncMock(return_value=["BIKE"])), \
+                patch("orders.state_machine.aset_order_status", AsyncMock()) as set_status, \
+                patch("notifications.services.asend_to_user", AsyncMock()):
+            asyncio.run(matching_service.aaccept_job("ORDER", str(job_id), str(self.captain_id)))
+        claim_query = db.captains.find_one_and_update.await_args.args[0]
+        self.assertEqual(claim_query["vehicle_type"], {"$in": ["BIKE"]})
+        set_status.assert_awaited_once_with(str(job_id), "ASSIGNED", reason="CAPTAIN_ASSIGNED")
+        clear_offer.assert_awaited_once_with(str(job_id))
+        self.assertEqual(send_ws.await_count, 2)
+
+    def test_accept_job_rejects_a_captain_without_the_offer(self):
+        from core import matching_service
+
+        job_id = ObjectId()
+        db = MagicMock(orders=_async_collection(find_one={"_id": job_id, "current_offer": {"captain_id": ObjectId()}}))
+        with patch("core.matching_service.get_async_db", return_value=db):
+            with self.assertRaisesMessage(ValueError, "Job not offered to this captain"):
+                asyncio.run(matching_service.aaccept_job("ORDER", str(job_id), str(self.captain_id)))
+
+    def test_custom_middleware_stays_async(self):
+        from asgiref.sync import iscoroutinefunction
+
+        from core import middleware
+
+        async def view(request):
+            return HttpResponse("ok")
+
+        for cls in (
+            middleware.TracingMiddleware,
+            middleware.PrometheusMetricsMiddleware,
+            middleware.ProfilingMiddleware,
+            middleware.RateLimitMiddleware,
+            middleware.IdempotencyKeyMiddleware,
+            middleware.RoleRequiredMiddleware,
+        ):
+            self.assertTrue(iscoroutinefunction(cls(view)), cls.__name__)
+            self.assertFalse(iscoroutinefunction(cls(lambda request: HttpResponse("ok"))), cls.__name__)
+
+    @override_settings(RATE_LIMIT_ENABLED=True)
+    def test_async_rate_limit_uses_async_redis(self):
+        from core.middleware import RateLimitMiddleware
+
+        async def view(request):
+            return HttpResponse("ok")
+
+        ratelimit.reset_local()
+        with patch("core.ratelimit.acheck", AsyncMock(return_value=(False, 3))) as acheck, \
+                patch("core.ratelimit.check", side_effect=AssertionError("sync Redis on async path")):
+            response = asyncio.run(RateLimitMiddleware(view)(RequestFactory().get("/api/v1/captain/nearby")))
+        acheck.assert_awaited_once()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "3")
+
+
+class BSONRendererTests(SimpleTestCase):
+    def setUp(self):
+        from datetime import datetime, timezone
+
+        self.doc = {
+            "_id": ObjectId(),
+            "name": "Caf\u00e9\u2028 <b>",
+            "created_at": datetime(2024, 1, 2, 3, 4, 5, 678000),
+            "updated_at": datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+            "items": [{"menu_item_id": ObjectId(), "qty": 2, "price": 12.5}, [ObjectId()]],
+            "meta": None,
+        }
+        self.stamp = datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc)
+
+    def _legacy(self, data, **kwargs):
+        from rest_framework.renderers import JSONRenderer
+
+        from core.utils import normalize
+
+        return JSONRenderer().render(normalize(data), **kwargs)
+
+    def _render(self, data, **kwargs):
+        from core.renderers import BSONJSONRenderer
+
+        return BSONJSONRenderer().render(data, **kwargs)
+
+    def test_payloads_render_byte_identical_to_normalized_documents(self):
+        from core.utils import serialize_doc
+
+        from rest_framework.renderers import JSONRenderer
+
+        from core.utils import normalize
+
+        legacy = JSONRenderer().render({"order": normalize(self.doc), "items": normalize([self.doc]), "ok": True, "at": self.stamp})
+        rendered = self._render({
+            "order": serialize_doc(self.doc),
+            "items": serialize_doc([self.doc]),
+            "ok": True,
+            "at": self.stamp,
+        })
+        self.assertEqual(rendered, legacy)
+        self.assertIn(b'"created_at":"2024-01-02T03:04:05.678000"', rendered)
+        self.assertIn(b"\\u2028", rendered)
+
+    def test_nested_payloads_and_indent_fall_back_to_drf_path(self):
+        from core.utils import serialize_doc
+
+        self.assertEqual(self._render({"wrap": {"order": serialize_doc(self.doc)}}), self._legacy({"wrap": {"order": self.doc}}))
+        self.assertEqual(
+            self._render({"order": serialize_doc(self.doc)}, accepted_media_type="application/json; indent=4"),
+            self._legacy({"order": self.doc}, accepted_media_type="application/json; indent=4"),
+        )
+        self.assertEqual(self._render({1: serialize_doc(self.doc)}), self._legacy({1: self.doc}))
+        self.assertEqual(self._render(serialize_doc(self.doc)), self._legacy(self.doc))
+
+    def test_streamed_list_matches_rendered_list(self):
+        from core.renderers import streamed_list
+
+        docs = [self.doc, {**self.doc, "_id": ObjectId()}]
+        request = RequestFactory().get("/")
+        response = streamed_list(request, "users", iter(docs))
+        self.assertEqual(b"".join(response.streaming_content), self._legacy({"users": docs}))
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(b"".join(streamed_list(request, "users", []).streaming_content), b'{"users":[]}')
+
+    def test_streamed_list_streams_under_asgi(self):
+        import warnings
+
+        from django.test import AsyncRequestFactory
+
+        from core.renderers import ASYNC_STREAM_BATCH, streamed_list
+
+        docs = [{**self.doc, "_id": ObjectId()} for _ in range(ASYNC_STREAM_BATCH * 2 + 5)]
+        pulled = []
+
+        def cursor():
+            for doc in docs:
+                pulled.append(doc)
+                yield doc
+
+        request = AsyncRequestFactory().get("/")
+        response = streamed_list(request, "users", cursor(), trailer=lambda: {"next_cursor": None})
+
+        async def drain():
+            chunks = []
+            async for chunk in response:
+                if not chunks:
+                    self.assertLess(len(pulled), len(docs))
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            body = asyncio.run(drain())
+        self.assertTrue(response.is_async)
+        self.assertEqual(body, self._legacy({"users": docs, "next_cursor": None}))
+
+
+@override_settings(MONGO_URI="mongodb://db.internal:27017/hybrid")
+class MongoWorkloadTests(SimpleTestCase):
+    def setUp(self):
+        from core import db
+
+        self.db = db
+        patcher = patch.dict(db._dbs, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_workload_options_come_from_settings(self):
+        dispatch = self.db._client_options(self.db.DISPATCH)
+        analytics = self.db._client_options(self.db.ANALYTICS)
+        logging_ = self.db._client_options(self.db.LOGGING)
+        self.assertEqual(dispatch["serverSelectionTimeoutMS"], 5000)
+        self.assertNotIn("w", dispatch)
+        self.assertNotIn("socketTimeoutMS", dispatch)
+        self.assertEqual(analytics["readPreference"], "secondaryPreferred")
+        self.assertEqual(logging_["w"], 0)
+        with override_settings(MONGO_WORKLOADS={"dispatch": {"write_concern": "majority", "max_pool_size": 5}}):
+            self.assertEqual(self.db._client_options("dispatch")["w"], "majority")
+            self.assertEqual(self.db._client_options("dispatch")["maxPoolSize"], 5)
+        with self.assertRaises(ValueError):
+            self.db._client_options("reporting")
+
+    def test_each_workload_gets_its_own_cached_client(self):
+        from pymongo import MongoClient
+
+        with patch("core.db.MongoClient", side_effect=lambda uri, **kw: MongoClient(uri, connect=False, **kw)) as client:
+            dispatch = self.db.get_db()
+            self.assertIs(self.db.get_db(self.db.DISPATCH), dispatch)
+            analytics = self.db.get_db(self.db.ANALYTICS)
+            logs = self.db.get_db(self.db.LOGGING)
+        self.assertEqual(client.call_count, 3)
+        self.assertEqual(analytics.read_preference.mongos_mode, "secondaryPreferred")
+        self.assertFalse(logs.write_concern.acknowledged)
+        self.assertTrue(dispatch.write_concern.acknowledged)
+        for handle in (dispatch, analytics, logs):
+            handle.client.close()
+
+    def test_concurrent_first_calls_build_one_client(self):
+        import threading
+        import time
+
+        def slow_client(uri, **kw):
+            time.sleep(0.05)
+            return MagicMock()
+
+        barrier = threading.Barrier(8)
+        handles = []
+
+        def call():
+            barrier.wait()
+            handles.append(self.db.get_db())
+
+        with patch("core.db.MongoClient", side_effect=slow_client) as client:
+            threads = [threading.Thread(target=call) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        client.assert_called_once()
+        self.assertEqual(len({id(handle) for handle in handles}), 1)
+
+
+class LogWriterTests(SimpleTestCase):
+    def setUp(self):
+        from core.log_writer import LogWriter
+
+        self.writer = LogWriter()
+        self.db = MagicMock()
+        self.acked = self.db.__getitem__.return_value.with_options.return_value
+        patcher = patch("core.log_writer.get_db", return_value=self.db)
+        self.get_db = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.writer.close, 1.0)
+
+    @override_settings(LOG_WRITER_FLUSH_INTERVAL_MS=60000)
+    def test_buffered_documents_are_flushed_in_one_unordered_insert_per_collection(self):
+        first, second, event = {"job_id": 1}, {"job_id": 2}, {"room_id": "r"}
+        self.writer.write("matching_logs", first)
+        self.writer.write("matching_logs", second)
+        self.writer.write("chat_typing_events", event)
+        self.assertIsInstance(event["_id"], ObjectId)
+        self.db.__getitem__.return_value.insert_one.assert_not_called()
+
+        self.writer.flush()
+        self.get_db.assert_called_with("logging")
+        calls = self.db.__getitem__.call_args_list
+        self.assertEqual([c.args[0] for c in calls], ["matching_logs", "chat_typing_events"])
+        self.db.__getitem__.return_value.with_options.assert_called_with(write_concern=WriteConcern(w=1))
+        insert_many = self.acked.insert_many
+        insert_many.assert_any_call([first, second], ordered=False)
+        insert_many.assert_any_call([event], ordered=False)
+
+    @override_settings(LOG_WRITER_BATCH_SIZE=2, LOG_WRITER_FLUSH_INTERVAL_MS=60000)
+    def test_background_thread_flushes_when_a_batch_fills(self):
+        import threading
+
+        flushed = threading.Event()
+        self.acked.insert_many.side_effect = lambda docs, ordered: flushed.set()
+        self.writer.write("eta_logs", {"n": 1})
+        self.writer.write("eta_logs", {"n": 2})
+        self.assertTrue(flushed.wait(2.0))
+
+    @override_settings(LOG_WRITER_MAX_BUFFERED=1, LOG_WRITER_FLUSH_INTERVAL_MS=60000)
+    def test_full_buffer_pushes_the_write_back_to_the_caller(self):
+        self.writer.write("trust_logs", {"n": 1})
+        overflow = {"n": 2}
+        self.writer.write("trust_logs", overflow)
+        self.acked.insert_one.assert_called_once_with(overflow)
+        self.db.__getitem__.return_value.insert_one.assert_not_called()
+
+    @override_settings(LOG_WRITER_ENABLED=False)
+    def test_only_fire_and_forget_collections_skip_acknowledgement_inline(self):
+        self.writer.write("eta_logs", {"n": 1})
+        self.db.__getitem__.return_value.insert_one.assert_called_once()
+        self.acked.insert_one.assert_not_called()
+        self.writer.write("notification_receipts", {"n": 2})
+        self.acked.insert_one.assert_called_once()
+
+    @override_settings(LOG_WRITER_FLUSH_INTERVAL_MS=60000)
+    def test_failed_counter_counts_per_document_write_errors(self):
+        from pymongo.errors import BulkWriteError
+
+        from core import log_writer
+
+        if log_writer.LOG_WRITER_FAILED is None:
+            raise SkipTest("prometheus_client is not installed")
+        self.acked.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 0}, {"index": 2}]})
+        for n in range(3):
+            self.writer.write("trust_logs", {"n": n})
+        failed = log_writer.LOG_WRITER_FAILED.labels("trust_logs")
+        written = log_writer.LOG_WRITER_WRITTEN.labels("trust_logs")
+        failed_before, written_before = failed._value.get(), written._value.get()
+        self.writer.flush()
+        self.assertEqual(failed._value.get() - failed_before, 2)
+        self.assertEqual(written._value.get() - written_before, 1)
+
+    def test_close_flushes_and_later_writes_go_inline(self):
+        self.writer.write("notification_logs", {"n": 1})
+        self.writer.close(1.0)
+        self.acked.insert_many.assert_called_once()
+        late = {"n": 2}
+        self.writer.write("notification_logs", late)
+        self.acked.insert_one.assert_called_once_with(late)
+
+    @override_settings(LOG_WRITER_ENABLED=False)
+    def test_async_write_inserts_inline_when_disabled(self):
+        async_db = MagicMock()
+        acked = async_db.__getitem__.return_value.with_options.return_value
+        acked.insert_one = AsyncMock()
+        doc = {"n": 1}
+        with patch("core.log_writer.get_async_db", return_value=async_db) as get_async_db:
+            asyncio.run(self.writer.awrite("trust_logs", doc))
+        get_async_db.assert_called_once_with("logging")
+        acked.insert_one.assert_awaited_once_with(doc)
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def _collection(self, docs):
+        collection = MagicMock()
+        collection.find.return_value.sort.return_value.limit.return_value = iter(docs)
+        return collection
+
+    def test_full_page_yields_limit_docs_and_a_cursor_for_the_rest(self):
+        from datetime import datetime
+
+        from core.pagination import decode_cursor, paginate
+
+        docs = [{"_id": ObjectId(), "created_at": datetime(2024, 1, 3 - idx)} for idx in range(3)]
+        collection = self._collection(docs)
+        page = paginate(collection, {"user_id": _OID}, 2, sort_field="created_at")
+        self.assertEqual(list(page), docs[:2])
+        collection.find.assert_called_once_with({"user_id": _OID}, None)
+        collection.find.return_value.sort.assert_called_once_with([("created_at", -1), ("_id", -1)])
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+        self.assertEqual(decode_cursor(page.next_cursor, 2), [docs[1]["created_at"], docs[1]["_id"]])
+
+        last = paginate(self._collection(docs[2:]), {"user_id": _OID}, 2, sort_field="created_at")
+        self.assertEqual(list(last), docs[2:])
+        self.assertIsNone(last.next_cursor)
+
+    def test_cursor_continues_strictly_after_the_last_key(self):
+        from datetime import datetime
+
+        from core.pagination import encode_cursor, paginate
+
+        stamp, oid = datetime(2024, 1, 2), ObjectId()
+        collection = self._collection([])
+        list(paginate(collection, {"room_id": "r"}, 50, cursor=encode_cursor([stamp, oid]), sort_field="created_at"))
+        collection.find.assert_called_once_with({"$and": [{"room_id": "r"}, {"$or": [
+            {"created_at": {"$lt": stamp}},
+            {"created_at": stamp, "_id": {"$lt": oid}},
+        ]}]}, None)
+
+        by_id = self._collection([])
+        list(paginate(by_id, {}, 50, cursor=encode_cursor([oid])))
+        by_id.find.assert_called_once_with({"_id": {"$lt": oid}}, None)
+
+    @override_settings(PAGINATION_MAX_LIMIT=100)
+    def test_limit_is_clamped_and_bad_cursors_are_rejected(self):
+        from core.pagination import encode_cursor, paginate
+
+        collection = self._collection([])
+        paginate(collection, {}, 10000)
+        collection.find.return_value.sort.return_value.limit.assert_called_once_with(101)
+        for cursor in ("not-a-cursor", encode_cursor([ObjectId()])):
+            with self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                paginate(collection, {}, 10, cursor=cursor, sort_field="created_at")
+
+    def test_streamed_page_matches_rendered_page(self):
+        from rest_framework.renderers import JSONRenderer
+
+        from core.pagination import paginate
+        from core.renderers import streamed_list
+        from core.utils import normalize
+
+        docs = [{"_id": ObjectId(), "phone": "+91900000000%d" % idx} for idx in range(3)]
+        page = paginate(self._collection(docs), {}, 2)
+        body = b"".join(streamed_list(RequestFactory().get("/"), "users", page, trailer=page.trailer).streaming_content)
+        self.assertEqual(body, JSONRenderer().render({"users": normalize(docs[:2]), "next_cursor": page.next_cursor}))
+        self.assertIsNotNone(page.next_cursor)
+
+
+@override_settings(CONFIG_SNAPSHOT_SUBSCRIBE=False)
+class ConfigSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        from core import config_snapshot
+
+        self.module = config_snapshot
+        self.redis = MagicMock()
+        self.redis.get.return_value = "3"
+        patcher = patch("core.config_snapshot.get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        snapshots = patch.dict(config_snapshot._snapshots, clear=True)
+        snapshots.start()
+        self.addCleanup(snapshots.stop)
+        self.loader = MagicMock(side_effect=lambda: {"ev_reward_percentage": self.loader.call_count})
+        self.snapshot = config_snapshot.register("vehicle_rules", self.loader)
+
+    def test_value_is_loaded_once_and_then_read_without_io(self):
+        self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 1})
+        self.assertEqual(asyncio.run(self.snapshot.aget()), {"ev_reward_percentage": 1})
+        self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 1})
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(self.redis.get.call_count, 1)
+        self.assertEqual(self.snapshot.version, 3)
+
+    def test_publish_bumps_the_version_and_reloads_the_writer(self):
+        self.snapshot.get()
+        self.redis.incr.return_value = 4
+        self.snapshot.publish()
+        self.redis.publish.assert_called_once_with(self.module.CONFIG_CHANNEL, "vehicle_rules:4")
+        self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 2})
+        self.assertEqual(self.snapshot.version, 4)
+
+    def test_messages_reload_only_newer_versions(self):
+        self.snapshot.get()
+        self.module._handle_message("vehicle_rules:3")
+        self.assertEqual(self.loader.call_count, 1)
+        self.module._handle_message("vehicle_rules:5")
+        self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 2})
+        self.assertEqual(self.snapshot.version, 5)
+
+    def test_version_check_catches_up_on_missed_messages(self):
+        self.snapshot.get()
+        self.redis.pipeline.return_value.execute.return_value = ["7"]
+        self.module._check_versions()
+        self.assertEqual(self.snapshot.version, 7)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_failed_reload_keeps_the_previous_value(self):
+        self.snapshot.get()
+        self.loader.side_effect = RuntimeError("mongo down")
+        self.module._handle_message("vehicle_rules:9")
+        self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 1})
+
+    def test_forked_worker_restarts_the_listener_for_a_loaded_snapshot(self):
+        self.snapshot.get()
+        # What a child of a preloading parent sees: a loaded value and no listener thread.
+        listener = self.module._Listener()
+        with patch.object(self.module, "_listener", listener), \
+                patch.object(self.module._Listener, "_run", lambda _self: None), \
+                override_settings(CONFIG_SNAPSHOT_SUBSCRIBE=True):
+            self.assertEqual(self.snapshot.get(), {"ev_reward_percentage": 1})
+            started = listener._thread
+            self.assertIsNotNone(started)
+            started.join()
+            self.assertEqual(asyncio.run(self.snapshot.aget()), {"ev_reward_percentage": 1})
+            self.assertIsNot(listener._thread, started)
+        self.assertEqual(self.loader.call_count, 1)
+
+
+class IdentityMapTests(SimpleTestCase):
+    def _collection(self, name, doc):
+        collection = MagicMock()
+        collection.name = name
+        collection.find_one.side_effect = lambda *args: dict(doc)
+        return collection
+
+    def test_reads_outside_a_unit_go_to_mongo(self):
+        from core import identity_map
+
+        oid = ObjectId()
+        restaurants = self._collection("restaurants", {"_id": oid, "is_active": True})
+        identity_map.find_one(restaurants, {"_id": oid})
+        identity_map.find_one(restaurants, {"_id": oid})
+        self.assertEqual(restaurants.find_one.call_count, 2)
+        restaurants.find_one.assert_called_with({"_id": oid})
+
+    def test_repeated_reads_in_a_unit_hit_mongo_once(self):
+        from core import identity_map
+        from core.read_models import RESTAURANT_DISPATCH
+
+        oid = ObjectId()
+        restaurants = self._collection("restaurants", {"_id": oid, "is_active": True, "owner_id": ObjectId()})
+        with identity_map.unit_of_work():
+            first = identity_map.find_one(restaurants, {"_id": oid, "is_active": True})
+            first["mutated"] = True
+            again = identity_map.find_one(restaurants, {"_id": oid, "is_active": True})
+            projected = asyncio.run(identity_map.afind_one(restaurants, {"_id": oid}, RESTAURANT_DISPATCH))
+            inactive = identity_map.find_one(restaurants, {"_id": oid, "is_active": False})
+        self.assertNotIn("mutated", again)
+        self.assertEqual(projected["owner_id"], first["owner_id"])
+        self.assertEqual(restaurants.find_one.call_count, 2)
+        self.assertEqual(inactive, {"_id": oid, "is_active": True, "owner_id": first["owner_id"]})
+
+    def test_projected_entry_does_not_serve_a_wider_read(self):
+        from core import identity_map
+
+        oid = ObjectId()
+        orders = self._collection("orders", {"_id": oid, "status": "PLACED"})
+        with identity_map.unit_of_work():
+            identity_map.find_one(orders, {"_id": oid}, {"status": 1})
+            identity_map.find_one(orders, {"_id": oid}, {"_id": 1, "status": 1})
+            identity_map.find_one(orders, {"_id": oid})
+        self.assertEqual(orders.find_one.call_count, 2)
+
+    def test_invalidate_and_remember(self):
+        from core import identity_map
+
+        oid = ObjectId()
+        orders = self._collection("orders", {"_id": oid, "status": "ASSIGNED"})
+        with identity_map.unit_of_work():
+            identity_map.remember("orders", {"_id": oid, "status": "PLACED"})
+            self.assertEqual(identity_map.find_one(orders, {"_id": oid})["status"], "PLACED")
+            identity_map.invalidate("orders", oid)
+            self.assertEqual(identity_map.find_one(orders, {"_id": oid})["status"], "ASSIGNED")
+        orders.find_one.assert_called_once_with({"_id": oid})
+
+    @override_settings(IDENTITY_MAP_ENABLED=False)
+    def test_disabled_map_reads_through(self):
+        from core import identity_map
+
+        oid = ObjectId()
+        restaurants = self._collection("restaurants", {"_id": oid})
+        with identity_map.unit_of_work() as unit:
+            identity_map.find_one(restaurants, {"_id": oid})
+            identity_map.find_one(restaurants, {"_id": oid})
+        self.assertIsNone(unit)
+        self.assertEqual(restaurants.find_one.call_count, 2)
+
+
+class StartupImportTests(SimpleTestCase):
+    LAZY_MODULES = ("sklearn", "firebase_admin", "google.auth")
+
+    def test_url_conf_imports_within_budget_and_without_lazy_dependencies(self):
+        import os
+        import subprocess
+        import sys
+
+        code = (
+            "import sys, django; django.setup(); import core.urls; "
+            f"print(','.join(m for m in {self.LAZY_MODULES!r} if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE="core.settings")
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(result.stdout.strip(), "")
+        total_us = 0
+        for line in result.stderr.splitlines():
+            parts = line.split("|")
+            if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+                if not parts[2].startswith("  "):
+                    total_us += int(parts[1])
+        self.assertLess(total_us / 1000, settings.STARTUP_IMPORT_BUDGET_MS)
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_each_step_runs_and_failures_do_not_stop_startup(self):
+        from core import warmup
+
+        calls = []
+        steps = (
+            ("mongo", lambda: calls.append("mongo")),
+            ("redis", MagicMock(side_effect=ConnectionError("down"))),
+            ("config", lambda: calls.append("config")),
+        )
+        with patch.object(warmup, "STEPS", steps):
+            timings = warmup.warm_up()
+            with override_settings(STARTUP_WARMUP=False):
+                self.assertEqual(warmup.warm_up(), {})
+        self.assertEqual(calls, ["mongo", "config"])
+        self.assertEqual(list(timings), ["mongo", "redis", "config"])
+
+    def test_mongo_step_pings_every_workload(self):
+        from core import warmup
+
+        with patch("core.warmup.get_db") as get_db:
+            warmup._mongo()
+        self.assertEqual([c.args[0] for c in get_db.call_args_list], list(settings.MONGO_WORKLOADS))
+        get_db.return_value.command.assert_called_with("ping")
@@ -0,0 +1,379 @@
+import functools
+import inspect
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from pymongo import monitoring
+
+KIND_INTERNAL = "internal"
+KIND_SERVER = "server"
+KIND_CLIENT = "client"
+KIND_PRODUCER = "producer"
+KIND_CONSUMER = "consumer"
+_OTLP_KINDS = {KIND_INTERNAL: 1, KIND_SERVER: 2, KIND_CLIENT: 3, KIND_PRODUCER: 4, KIND_CONSUMER: 5}
+
+TRACEPARENT = "traceparent"
+
+_current = ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "attributes", "status", "start_ns", "end_ns")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], kind: str, attributes: Optional[Dict]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = "error"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class FileExporter:
+    def __init__(self):
+        self.path = getattr(settings, "TRACING_FILE_PATH", "traces.jsonl")
+
+    def export(self, spans: List[Dict]):
+        with open(self.path, "a", encoding="utf-8") as fh:
+            for span in spans:
+                fh.write(json.dumps(span, default=str) + "\n")
+
+
+class OtlpHttpExporter:
+    """Posts OTLP/HTTP JSON, accepted by the OpenTelemetry Collector, Jaeger and Tempo."""
+
+    def __init__(self):
+        self.endpoint = getattr(settings, "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        self.service_name = getattr(settings, "TRACING_SERVICE_NAME", "hybrid-backend")
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _span(self, span: Dict) -> Dict:
+        doc = {
+            "traceId": span["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": _OTLP_KINDS.get(span["kind"], 1),
+            "startTimeUnixNano": str(span["start_ns"]),
+            "endTimeUnixNano": str(span["end_ns"] or span["start_ns"]),
+            "attributes": [{"key": k, "value": self._value(v)} for k, v in span["attributes"].items()],
+            "status": {"code": 2 if span["status"] == "error" else 1},
+        }
+        if span["parent_id"]:
+            doc["parentSpanId"] = span["parent_id"]
+        return doc
+
+    def export(self, spans: List[Dict]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "hybrid.tracing"}, "spans": [self._span(s) for s in spans]}],
+            }]
+        }
+        requests.post(self.endpoint, json=payload, timeout=5)
+
+
+EXPORTERS = {"file": FileExporter, "otlp": OtlpHttpExporter}
+
+_state = {"pid": None, "queue": None, "exporter": None}
+_state_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "TRACING_ENABLED", False))
+
+
+def _build_exporter():
+    name = getattr(settings, "TRACING_EXPORTER", "file") or "none"
+    if name == "none":
+        return None
+    cls = EXPORTERS.get(name) or import_string(name)
+    return cls()
+
+
+def _export_loop(spans_queue: queue.Queue, exporter):
+    while True:
+        batch = [spans_queue.get()]
+        while len(batch) < 256:
+            try:
+                batch.append(spans_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            exporter.export(batch)
+        except Exception:
+            pass
+        for _ in batch:
+            spans_queue.task_done()
+
+
+def _span_queue():
+    # Spans are handed to a per-process daemon thread; re-created after a fork.
+    pid = os.getpid()
+    if _state["pid"] == pid:
+        return _state["queue"]
+    with _state_lock:
+        if _state["pid"] != pid:
+            exporter = _build_exporter()
+            spans_queue = None
+            if exporter:
+                spans_queue = queue.Queue(maxsize=int(getattr(settings, "TRACING_QUEUE_SIZE", 2048)))
+                threading.Thread(target=_export_loop, args=(spans_queue, exporter), daemon=True).start()
+            _state.update({"pid": pid, "queue": spans_queue, "exporter": exporter})
+    return _state["queue"]
+
+
+def _export(span: Span):
+    spans_queue = _span_queue()
+    if spans_queue is None:
+        return
+    try:
+        spans_queue.put_nowait(span.to_dict())
+    except queue.Full:
+        pass
+
+
+def flush(timeout: float = 5.0):
+    spans_queue = _state["queue"]
+    if spans_queue is None:
+        return
+    deadline = time.monotonic() + timeout
+    while spans_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def inject(carrier: Dict) -> Dict:
+    span = _current.get()
+    if span:
+        carrier[TRACEPARENT] = f"00-{span.trace_id}-{span.span_id}-01"
+    return carrier
+
+
+def extract(traceparent: Optional[str]):
+    """Parses a W3C traceparent into (trace_id, parent_span_id); None when absent or unsampled."""
+    if not traceparent:
+        return None
+    parts = traceparent.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        if not int(parts[3], 16) & 1:
+            return None
+    except ValueError:
+        return None
+    return parts[1], parts[2]
+
+
+def _open_span(name: str, kind: str, attributes: Optional[Dict], parent, root: bool) -> Optional[Span]:
+    if not enabled():
+        return None
+    current = _current.get()
+    if parent:
+        trace_id, parent_id = parent
+    elif current:
+        trace_id, parent_id = current.trace_id, current.span_id
+    elif root and random.random() < float(getattr(settings, "TRACING_SAMPLE_RATE", 0.1)):
+        trace_id, parent_id = secrets.token_hex(16), None
+    else:
+        # Library calls outside a sampled trace stay untraced rather than emitting orphan spans.
+        return None
+    return Span(name, trace_id, parent_id, kind, attributes)
+
+
+@contextmanager
+def start_span(name: str, kind: str = KIND_INTERNAL, attributes: Optional[Dict] = None, parent=None, root: bool = False):
+    span = _open_span(name, kind, attributes, parent, root)
+    if span is None:
+        yield None
+        return
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.record_exception(exc)
+        raise
+    finally:
+        _current.reset(token)
+        span.end()
+        _export(span)
+
+
+def traced(name: Optional[str] = None, kind: str = KIND_INTERNAL):
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    def __init__(self):
+        self._spans = {}
+
+    def started(self, event):
+        span = _open_span(
+            f"mongo {event.command_name}",
+            KIND_CLIENT,
+            {
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": str(event.command.get(event.command_name, "")),
+            },
+            None,
+            False,
+        )
+        if span:
+            self._spans[(event.request_id, event.operation_id)] = span
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, event.failure)
+
+    def _finish(self, event, failure):
+        span = self._spans.pop((event.request_id, event.operation_id), None)
+        if not span:
+            return
+        if failure:
+            span.status = "error"
+            span.set_attribute("exception.message", str(failure)[:500])
+        span.end()
+        _export(span)
+
+
+class TracedConsumerMixin:
+    """Channels consumers: one span per handled message, continuing the sender's trace."""
+
+    async def dispatch(self, message):
+        parent = extract(message.get(TRACEPARENT)) if isinstance(message, dict) else None
+        with start_span(
+            f"ws {type(self).__name__} {message.get('type')}",
+            KIND_CONSUMER,
+            {"messaging.system": "channels"},
+            parent=parent,
+            root=True,
+        ):
+            return await super().dispatch(message)
+
+
+_installed = False
+
+
+def _http_span_name(method: str, url) -> str:
+    host = getattr(url, "host", None) or urlparse(str(url)).hostname or ""
+    return f"HTTP {method} {host}"
+
+
+def install():
+    """Patches requests and httpx so outbound calls get client spans and a traceparent header."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    original_send = requests.Session.send
+
+    def traced_send(session, request, **kwargs):
+        with start_span(_http_span_name(request.method, request.url), KIND_CLIENT, {"http.method": request.method}) as span:
+            if span:
+                inject(request.headers)
+            response = original_send(session, request, **kwargs)
+            if span:
+                span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    requests.Session.send = traced_send
+
+    try:
+        import httpx
+    except Exception:
+        return
+
+    original_httpx_send = httpx.Client.send
+    original_httpx_async_send = httpx.AsyncClient.send
+
+    def traced_httpx_send(client, request, **kwargs):
+        with start_span(_http_span_name(request.method, request.url), KIND_CLIENT, {"http.method": request.method}) as span:
+            if span:
+                inject(request.headers)
+            response = original_httpx_send(client, request, **kwargs)
+            if span:
+                span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    async def traced_httpx_async_send(client, request, **kwargs):
+        with start_span(_http_span_name(request.method, request.url), KIND_CLIENT, {"http.method": request.method}) as span:
+            if span:
+                inject(request.headers)
+            response = await original_httpx_async_send(client, request, **kwargs)
+            if span:
+                span.set_attribute("http.status_code", response.status_code)
+            return response
+
+    httpx.Client.send = traced_httpx_send
+    httpx.AsyncClient.send = traced_httpx_async_send
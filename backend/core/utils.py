@@ -25,7 +25,20 @@ def normalize(value):
     return value
 
 
+class BSONPayload:
+    """A Mongo document or list handed to the response renderer as is. `BSONJSONRenderer` turns
+    ObjectId and datetime into the same strings as `normalize` while encoding, in one pass."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def normalized(self):
+        return normalize(self.value)
+
+
 def serialize_doc(doc):
     if doc is None:
         return None
-    return normalize(doc)
+    return BSONPayload(doc)
@@ -0,0 +1,63 @@
+import logging
+import time
+from typing import Dict
+
+from django.conf import settings
+from django.urls import get_resolver
+
+from core import config_snapshot
+from core.db import get_db
+from core.redis_queue import get_binary_client, get_client
+
+logger = logging.getLogger(__name__)
+
+
+def _urls():
+    # Imports every view module, which also registers their config snapshots.
+    get_resolver().url_patterns
+
+
+def _mongo():
+    for workload in getattr(settings, "MONGO_WORKLOADS", {}):
+        get_db(workload).command("ping")
+
+
+def _redis():
+    get_client().ping()
+    get_binary_client().ping()
+
+
+def _http():
+    from maps import services as maps_services
+
+    maps_services.warm_up()
+
+
+STEPS = (
+    ("urls", _urls),
+    ("mongo", _mongo),
+    ("redis", _redis),
+    ("http", _http),
+    ("config", config_snapshot.load_all),
+)
+
+
+def warm_up() -> Dict[str, float]:
+    """Opens the Mongo, Redis and HTTP pools and loads config snapshots before the worker serves traffic.
+
+    Runs from the WSGI/ASGI entry points, i.e. once per worker process and after any fork. A step
+    that fails is logged and skipped; the first request then pays for it as before. Returns the
+    milliseconds each step took.
+    """
+    timings = {}
+    if not getattr(settings, "STARTUP_WARMUP", True):
+        return timings
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as exc:
+            logger.warning("startup_warmup_failed step=%s error=%s", name, exc)
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info("startup_warmup %s", " ".join(f"{name}_ms={ms}" for name, ms in timings.items()))
+    return timings
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+from core.indexes import verify_on_startup  # noqa: E402
+from core.warmup import warm_up  # noqa: E402
+
+verify_on_startup()
+warm_up()
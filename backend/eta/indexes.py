@@ -0,0 +1,7 @@
+from pymongo import DESCENDING, IndexModel
+
+from core.indexes import register
+
+register("eta_logs", [
+    IndexModel([("created_at", DESCENDING)], name="eta_logs_created_at"),
+])
@@ -1,27 +1,15 @@
 from typing import Dict
-from pymongo import ASCENDING
 
-from core.db import get_db
+from core.log_writer import log_writer
 from core.utils import utcnow
 from maps import services as maps_services
-
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.eta_logs.create_index([("created_at", -1)], name="eta_logs_created_at")
-    _index_ready = True
+from maps.metering import CALLER_ETA
 
 
 def predict_eta(payload: Dict):
-    ensure_indexes()
     origin = {"lat": payload["origin_lat"], "lng": payload["origin_lng"]}
     destination = {"lat": payload["destination_lat"], "lng": payload["destination_lng"]}
-    base = maps_services.get_eta(origin, destination, mode="driving")
+    base = maps_services.get_eta(origin, destination, mode="driving", caller=CALLER_ETA)
 
     prep_time_min = int(payload.get("prep_time_min", 0))
     batch_size = int(payload.get("batch_size", 1))
@@ -33,7 +21,6 @@ def predict_eta(payload: Dict):
     travel_s = int(base.get("duration_in_traffic_s") or base.get("duration_s") or 0)
     adjusted_s = int(travel_s * traffic_factor * weather_factor) + buffer_s + batch_buffer_s
 
-    db = get_db()
     log_doc = {
         "origin": origin,
         "destination": destination,
@@ -45,7 +32,7 @@ def predict_eta(payload: Dict):
         "weather_factor": weather_factor,
         "created_at": utcnow(),
     }
-    db.eta_logs.insert_one(log_doc)
+    log_writer.write("eta_logs", log_doc)
     return {
         "base_duration_s": travel_s,
         "adjusted_duration_s": adjusted_s,
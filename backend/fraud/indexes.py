@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("fraud_flags", [
+    IndexModel([("user_id", ASCENDING)], name="fraud_user"),
+    IndexModel([("created_at", ASCENDING)], name="fraud_created_at"),
+])
@@ -1,26 +1,12 @@
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from pymongo import ASCENDING
 
-from core.db import get_db
+from core.db import ANALYTICS, get_db
 from core.utils import utcnow
 from rides.services import haversine_km
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.fraud_flags.create_index([("user_id", ASCENDING)], name="fraud_user")
-    db.fraud_flags.create_index([("created_at", ASCENDING)], name="fraud_created_at")
-    _index_ready = True
-
 
 def _wallet_stats(user_id):
-    db = get_db()
+    db = get_db(ANALYTICS)
     pipeline = [
         {"$match": {"user_id": user_id}},
         {"$group": {
@@ -57,7 +43,7 @@ def _wallet_stats(user_id):
 
 
 def _ride_stats(user_id):
-    db = get_db()
+    db = get_db(ANALYTICS)
     rides = list(db.rides.find({"user_id": user_id}))
     ride_count = 0
     short_rides = 0
@@ -74,15 +60,14 @@ def _ride_stats(user_id):
 
 
 def _order_stats(user_id):
-    db = get_db()
+    db = get_db(ANALYTICS)
     order_count = db.orders.count_documents({"user_id": user_id, "status": "DELIVERED"})
     return {"order_count": order_count}
 
 
 def scan_users(limit: int = 200):
-    ensure_indexes()
     db = get_db()
-    users = list(db.users.find({"is_active": True}).limit(limit))
+    users = list(get_db(ANALYTICS).users.find({"is_active": True}).limit(limit))
     if not users:
         return []
 
@@ -121,6 +106,9 @@ def scan_users(limit: int = 200):
     if len(features) < 5:
         return []
 
+    # scikit-learn takes about a second to import, so only the scan pays for it.
+    from sklearn.ensemble import IsolationForest
+
     model = IsolationForest(n_estimators=200, contamination=0.08, random_state=42)
     preds = model.fit_predict(np.array(features))
     scores = model.decision_function(np.array(features))
@@ -0,0 +1,10 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register
+
+register("engagement_logs", [
+    IndexModel([("created_at", DESCENDING)], name="engagement_logs_created_at"),
+])
+register("experiments", [
+    IndexModel([("experiment_key", ASCENDING)], name="experiments_key"),
+])
@@ -0,0 +1,17 @@
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+
+from core.indexes import register
+
+register("routes_cache", [
+    IndexModel([("cache_key", ASCENDING)], unique=True, name="routes_cache_key"),
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="routes_cache_ttl"),
+])
+register("isochrones", [
+    IndexModel(
+        [("ref_type", ASCENDING), ("ref_id", ASCENDING), ("mode", ASCENDING), ("minutes", ASCENDING)],
+        unique=True,
+        name="isochrones_ref",
+    ),
+    IndexModel([("polygon", GEOSPHERE), ("ref_type", ASCENDING), ("minutes", ASCENDING)], name="isochrones_polygon_2dsphere"),
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="isochrones_ttl"),
+])
@@ -0,0 +1,214 @@
+from datetime import timedelta
+from typing import List, Optional
+
+import numpy as np
+from django.conf import settings
+
+from core.db import get_db
+from core.geo_utils import to_point
+from core.geometry import EARTH_RADIUS_KM
+from core.utils import utcnow, to_object_id
+from maps import services as maps_services
+from maps.metering import CALLER_ISOCHRONE
+
+REF_POINT = "POINT"
+REF_ZONE = "ZONE"
+REF_RESTAURANT = "RESTAURANT"
+REF_TYPES = {REF_POINT, REF_ZONE, REF_RESTAURANT}
+
+METHOD_DISTANCE_MATRIX = "DISTANCE_MATRIX"
+METHOD_ESTIMATE = "ESTIMATE"
+
+MIN_RADIUS_KM = 0.05
+_PROBE_FRACTIONS = np.array([0.25, 0.5, 0.75, 1.0])
+
+
+def _bearings():
+    count = int(getattr(settings, "ISOCHRONE_BEARINGS", 16))
+    return np.linspace(0.0, 2 * np.pi, count, endpoint=False)
+
+
+def _destinations(lat: float, lng: float, bearings, distances_km):
+    lat1 = np.radians(lat)
+    lng1 = np.radians(lng)
+    angular = np.asarray(distances_km, dtype=np.float64) / EARTH_RADIUS_KM
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(angular) + np.cos(lat1) * np.sin(angular) * np.cos(bearings))
+    lng2 = lng1 + np.arctan2(
+        np.sin(bearings) * np.sin(angular) * np.cos(lat1),
+        np.cos(angular) - np.sin(lat1) * np.sin(lat2),
+    )
+    return np.degrees(lat2), np.degrees(lng2)
+
+
+def _estimated_radii_km(minutes: List[int], bearings):
+    # Effective straight-line speed, already discounted for road detours and stops.
+    speed = float(getattr(settings, "ISOCHRONE_FALLBACK_SPEED_KMPH", 18.0))
+    radii = np.asarray(minutes, dtype=np.float64) / 60.0 * speed
+    return np.repeat(radii[:, None], len(bearings), axis=1)
+
+
+def _distance_matrix_radii_km(lat: float, lng: float, minutes: List[int], bearings, mode: str):
+    probe_speed = float(getattr(settings, "ISOCHRONE_PROBE_SPEED_KMPH", 40.0))
+    probe_km = max(minutes) / 60.0 * probe_speed * _PROBE_FRACTIONS
+    lat2, lng2 = _destinations(lat, lng, bearings[:, None], probe_km[None, :])
+    destinations = [{"lat": a, "lng": b} for a, b in zip(lat2.ravel().tolist(), lng2.ravel().tolist())]
+    durations = maps_services.get_durations(
+        {"lat": lat, "lng": lng},
+        destinations,
+        mode,
+        caller=CALLER_ISOCHRONE,
+    )
+    if not any(d is not None for d in durations):
+        raise ValueError("No reachable isochrone probes")
+
+    # Each bearing is sampled outward from the centre (0 km, 0 s); the radius for a budget
+    # is interpolated between the last probe inside it and the first one beyond it.
+    probe_s = np.array([np.inf if d is None else float(d) for d in durations]).reshape(len(bearings), len(probe_km))
+    probe_s = np.hstack([np.zeros((len(bearings), 1)), probe_s])
+    probe_km = np.concatenate([[0.0], probe_km])
+    radii = np.zeros((len(minutes), len(bearings)))
+    for m_idx, budget_min in enumerate(minutes):
+        budget_s = budget_min * 60.0
+        for b_idx in range(len(bearings)):
+            inside = np.flatnonzero(probe_s[b_idx] <= budget_s)
+            last = int(inside[-1])
+            if last == len(probe_km) - 1 or not np.isfinite(probe_s[b_idx, last + 1]):
+                radii[m_idx, b_idx] = probe_km[last]
+                continue
+            t0, t1 = probe_s[b_idx, last], probe_s[b_idx, last + 1]
+            d0, d1 = probe_km[last], probe_km[last + 1]
+            radii[m_idx, b_idx] = d0 + (d1 - d0) * (budget_s - t0) / max(t1 - t0, 1.0)
+    return radii
+
+
+def _polygon(lat: float, lng: float, bearings, radii_km):
+    lat2, lng2 = _destinations(lat, lng, bearings, np.maximum(radii_km, MIN_RADIUS_KM))
+    ring = [[round(x, 6), round(y, 6)] for x, y in zip(lng2.tolist(), lat2.tolist())]
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+def _normalize_minutes(minutes: Optional[List[int]]):
+    values = minutes or getattr(settings, "ISOCHRONE_MINUTES", [10, 20, 30])
+    return sorted({int(m) for m in values if int(m) > 0})
+
+
+def compute_isochrones(lat: float, lng: float, minutes: Optional[List[int]] = None, mode: str = "driving"):
+    minutes = _normalize_minutes(minutes)
+    bearings = _bearings()
+    method = METHOD_ESTIMATE
+    radii = None
+    if settings.GOOGLE_MAPS_KEY:
+        try:
+            radii = _distance_matrix_radii_km(lat, lng, minutes, bearings, mode)
+            method = METHOD_DISTANCE_MATRIX
+        except Exception:
+            radii = None
+    if radii is None:
+        radii = _estimated_radii_km(minutes, bearings)
+    # A larger time budget can never reach less far along the same bearing.
+    radii = np.maximum.accumulate(radii, axis=0)
+    return [
+        {"minutes": budget, "method": method, "polygon": _polygon(lat, lng, bearings, radii[idx])}
+        for idx, budget in enumerate(minutes)
+    ]
+
+
+def get_isochrones(
+    ref_type: str,
+    ref_id,
+    lat: float,
+    lng: float,
+    minutes: Optional[List[int]] = None,
+    mode: str = "driving",
+    refresh: bool = False,
+):
+    if ref_type not in REF_TYPES:
+        raise ValueError("Invalid isochrone reference type")
+    minutes = _normalize_minutes(minutes)
+    db = get_db()
+    found = {}
+    if not refresh:
+        cursor = db.isochrones.find({
+            "ref_type": ref_type,
+            "ref_id": ref_id,
+            "mode": mode,
+            "minutes": {"$in": minutes},
+            "expires_at": {"$gt": utcnow()},
+        })
+        found = {doc["minutes"]: doc for doc in cursor}
+    missing = [m for m in minutes if m not in found]
+    if missing:
+        expires_at = utcnow() + timedelta(minutes=int(getattr(settings, "ISOCHRONE_CACHE_TTL_MIN", 1440)))
+        for iso in compute_isochrones(lat, lng, missing, mode):
+            doc = {
+                "ref_type": ref_type,
+                "ref_id": ref_id,
+                "mode": mode,
+                "minutes": iso["minutes"],
+                "center": to_point(lat, lng),
+                "polygon": iso["polygon"],
+                "method": iso["method"],
+                "created_at": utcnow(),
+                "expires_at": expires_at,
+            }
+            db.isochrones.update_one(
+                {"ref_type": ref_type, "ref_id": ref_id, "mode": mode, "minutes": iso["minutes"]},
+                {"$set": doc},
+                upsert=True,
+            )
+            found[iso["minutes"]] = doc
+    return [found[m] for m in minutes]
+
+
+def point_isochrones(lat: float, lng: float, minutes: Optional[List[int]] = None, mode: str = "driving"):
+    ref_id = f"{round(float(lat), 4)}:{round(float(lng), 4)}"
+    return get_isochrones(REF_POINT, ref_id, round(float(lat), 4), round(float(lng), 4), minutes, mode)
+
+
+def zone_isochrones(lat: float, lng: float, minutes: Optional[List[int]] = None, mode: str = "driving"):
+    zone_lat = round(float(lat), 2)
+    zone_lng = round(float(lng), 2)
+    return get_isochrones(REF_ZONE, f"{zone_lat}:{zone_lng}", zone_lat, zone_lng, minutes, mode)
+
+
+def restaurant_isochrones(restaurant_id: str, minutes: Optional[List[int]] = None, mode: str = "driving", refresh: bool = False):
+    rid = to_object_id(restaurant_id)
+    if not rid:
+        raise ValueError("Invalid restaurant id")
+    db = get_db()
+    restaurant = db.restaurants.find_one({"_id": rid}, {"location": 1})
+    coords = ((restaurant or {}).get("location") or {}).get("coordinates")
+    if not coords:
+        raise ValueError("Restaurant location not found")
+    return get_isochrones(REF_RESTAURANT, rid, coords[1], coords[0], minutes, mode, refresh=refresh)
+
+
+def cached_polygon(ref_type: str, ref_id, minutes: int, mode: str = "driving"):
+    db = get_db()
+    doc = db.isochrones.find_one(
+        {
+            "ref_type": ref_type,
+            "ref_id": ref_id,
+            "mode": mode,
+            "minutes": int(minutes),
+            "expires_at": {"$gt": utcnow()},
+        },
+        {"polygon": 1},
+    )
+    return doc.get("polygon") if doc else None
+
+
+def reachable_refs(lat: float, lng: float, minutes: int, ref_type: str = REF_RESTAURANT, mode: str = "driving"):
+    db = get_db()
+    cursor = db.isochrones.find(
+        {
+            "polygon": {"$geoIntersects": {"$geometry": to_point(lat, lng)}},
+            "ref_type": ref_type,
+            "minutes": int(minutes),
+            "mode": mode,
+            "expires_at": {"$gt": utcnow()},
+        },
+        {"ref_id": 1},
+    )
+    return [doc["ref_id"] for doc in cursor]
@@ -0,0 +1,145 @@
+import time
+from typing import Dict
+
+from django.conf import settings
+
+from core.redis_queue import get_async_client, get_client
+
+CALLER_API = "api"
+CALLER_MATCHING = "matching"
+CALLER_GO_HOME = "go_home"
+CALLER_ETA = "eta"
+CALLER_ISOCHRONE = "isochrone"
+CALLERS = [CALLER_API, CALLER_MATCHING, CALLER_GO_HOME, CALLER_ETA, CALLER_ISOCHRONE]
+
+API_DIRECTIONS = "directions"
+API_DISTANCE_MATRIX = "distance_matrix"
+
+try:
+    from prometheus_client import Counter
+    MAPS_CALLS = Counter(
+        "maps_api_calls_total",
+        "Google Maps API calls",
+        ["api", "caller"],
+    )
+    MAPS_ELEMENTS = Counter(
+        "maps_api_elements_total",
+        "Google Maps billable elements",
+        ["api", "caller"],
+    )
+    MAPS_DEGRADED = Counter(
+        "maps_api_degraded_total",
+        "Google Maps calls answered from cache or estimates because of the budget",
+        ["api", "caller", "source"],
+    )
+except Exception:
+    MAPS_CALLS = None
+    MAPS_ELEMENTS = None
+    MAPS_DEGRADED = None
+
+_USAGE_TTL_SEC = 120
+
+
+def _bucket(now: float = None) -> int:
+    return int((now or time.time()) // 60)
+
+
+def _usage_keys(caller: str, bucket: int):
+    return f"maps:usage:{bucket}:total", f"maps:usage:{bucket}:{caller}"
+
+
+def _caller_budget(caller: str) -> int:
+    budgets = getattr(settings, "MAPS_CALLER_ELEMENTS_PER_MIN", {}) or {}
+    return int(budgets.get(caller, 0) or 0)
+
+
+def _count_usage(api: str, caller: str, elements: int):
+    if MAPS_CALLS:
+        MAPS_CALLS.labels(api, caller).inc()
+        MAPS_ELEMENTS.labels(api, caller).inc(elements)
+
+
+def _queue_usage(pipe, caller: str, elements: int):
+    total_key, caller_key = _usage_keys(caller, _bucket())
+    pipe.incrby(total_key, elements)
+    pipe.expire(total_key, _USAGE_TTL_SEC)
+    pipe.incrby(caller_key, elements)
+    pipe.expire(caller_key, _USAGE_TTL_SEC)
+
+
+def record_usage(api: str, caller: str, elements: int = 1):
+    _count_usage(api, caller, elements)
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        _queue_usage(pipe, caller, elements)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+async def arecord_usage(api: str, caller: str, elements: int = 1):
+    _count_usage(api, caller, elements)
+    try:
+        pipe = get_async_client().pipeline(transaction=False)
+        _queue_usage(pipe, caller, elements)
+        await pipe.execute()
+    except Exception:
+        pass
+
+
+def record_degraded(api: str, caller: str, source: str):
+    if MAPS_DEGRADED:
+        MAPS_DEGRADED.labels(api, caller, source).inc()
+
+
+def _budgets(caller: str):
+    return int(getattr(settings, "MAPS_ELEMENTS_PER_MIN", 0) or 0), _caller_budget(caller)
+
+
+def _over_budget(total_budget: int, caller_budget: int, used, elements: int) -> bool:
+    threshold = float(getattr(settings, "MAPS_DEGRADE_AT_PCT", 0.9))
+    total_used, caller_used = used
+    if total_budget and int(total_used or 0) + elements > total_budget * threshold:
+        return True
+    if caller_budget and int(caller_used or 0) + elements > caller_budget * threshold:
+        return True
+    return False
+
+
+def should_degrade(caller: str, elements: int = 1) -> bool:
+    total_budget, caller_budget = _budgets(caller)
+    if not total_budget and not caller_budget:
+        return False
+    try:
+        used = get_client().mget(_usage_keys(caller, _bucket()))
+    except Exception:
+        return False
+    return _over_budget(total_budget, caller_budget, used, elements)
+
+
+async def ashould_degrade(caller: str, elements: int = 1) -> bool:
+    total_budget, caller_budget = _budgets(caller)
+    if not total_budget and not caller_budget:
+        return False
+    try:
+        used = await get_async_client().mget(_usage_keys(caller, _bucket()))
+    except Exception:
+        return False
+    return _over_budget(total_budget, caller_budget, used, elements)
+
+
+def usage_snapshot() -> Dict:
+    bucket = _bucket()
+    keys = [f"maps:usage:{bucket}:total"] + [f"maps:usage:{bucket}:{caller}" for caller in CALLERS]
+    try:
+        values = get_client().mget(keys)
+    except Exception:
+        values = [None] * len(keys)
+    return {
+        "minute": bucket * 60,
+        "elements_total": int(values[0] or 0),
+        "elements_per_caller": {caller: int(value or 0) for caller, value in zip(CALLERS, values[1:])},
+        "budget_total": int(getattr(settings, "MAPS_ELEMENTS_PER_MIN", 0) or 0),
+        "budget_per_caller": {caller: _caller_budget(caller) for caller in CALLERS},
+        "degrade_at_pct": float(getattr(settings, "MAPS_DEGRADE_AT_PCT", 0.9)),
+    }
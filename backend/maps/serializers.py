@@ -7,6 +7,7 @@ class RouteRequestSerializer(serializers.Serializer):
     destination_lat = serializers.FloatField()
     destination_lng = serializers.FloatField()
     mode = serializers.CharField(required=False, default="driving")
+    include_points = serializers.BooleanField(required=False, default=True)
 
 
 class EtaRequestSerializer(serializers.Serializer):
@@ -21,3 +22,32 @@ class NearbyCaptainsSerializer(serializers.Serializer):
     lat = serializers.FloatField()
     lng = serializers.FloatField()
     radius_m = serializers.IntegerField(required=False, min_value=100, max_value=20000)
+
+
+class IsochroneRequestSerializer(serializers.Serializer):
+    ref_type = serializers.ChoiceField(choices=["POINT", "ZONE", "RESTAURANT"], required=False, default="POINT")
+    restaurant_id = serializers.CharField(required=False)
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lng = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    minutes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=120),
+        required=False,
+        allow_empty=False,
+        max_length=6,
+    )
+    mode = serializers.CharField(required=False, default="driving")
+
+    def validate(self, attrs):
+        if attrs.get("ref_type") == "RESTAURANT":
+            if not attrs.get("restaurant_id"):
+                raise serializers.ValidationError("restaurant_id is required for RESTAURANT isochrones")
+        elif attrs.get("lat") is None or attrs.get("lng") is None:
+            raise serializers.ValidationError("lat and lng are required")
+        return attrs
+
+
+class ReachableRestaurantsSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    minutes = serializers.IntegerField(min_value=1, max_value=120)
+    mode = serializers.CharField(required=False, default="driving")
@@ -1,27 +1,38 @@
+import asyncio
 import hashlib
 import json
+import weakref
 from datetime import timedelta
 from typing import List, Optional
 
+import httpx
 import requests
 from django.conf import settings
-from pymongo import ASCENDING
 
-from core.db import get_db
-from core.geo_utils import ensure_captain_geo_index
+from core.db import get_async_db, get_db
+from core.geometry import array_to_points, decode_polyline_array, encode_polyline
+from core.geo_utils import haversine_km
+from core.metrics import STAGE_MAPS, timed
+from core.redis_queue import get_async_client, get_client
 from core.utils import utcnow
+from maps import metering
+from maps.metering import (
+    API_DIRECTIONS,
+    API_DISTANCE_MATRIX,
+    CALLER_API,
+)
 
-_index_ready = False
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+SOURCE_CACHE = "CACHE"
+SOURCE_ESTIMATE = "ESTIMATE"
 
+# Cached routes keep only the encoded polyline; documents written before the compact
+# format may still carry a decoded `points` array, which hits never need to load.
+ROUTE_CACHE_PROJECTION = {"points": 0}
 
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.routes_cache.create_index([("cache_key", ASCENDING)], unique=True, name="routes_cache_key")
-    db.routes_cache.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0, name="routes_cache_ttl")
-    _index_ready = True
+_http_clients = weakref.WeakKeyDictionary()
+_session = None
 
 
 def _cache_key(payload: dict):
@@ -29,56 +40,147 @@ def _cache_key(payload: dict):
     return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 
-def _decode_polyline(polyline_str: str):
-    index = 0
-    lat = 0
-    lng = 0
-    coordinates = []
-
-    while index < len(polyline_str):
-        result = 0
-        shift = 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1f) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        delta_lat = ~(result >> 1) if result & 1 else result >> 1
-        lat += delta_lat
-
-        result = 0
-        shift = 0
-        while True:
-            b = ord(polyline_str[index]) - 63
-            index += 1
-            result |= (b & 0x1f) << shift
-            shift += 5
-            if b < 0x20:
-                break
-        delta_lng = ~(result >> 1) if result & 1 else result >> 1
-        lng += delta_lng
-
-        coordinates.append({"lat": lat / 1e5, "lng": lng / 1e5})
-
-    return coordinates
-
-
-def _call_google(endpoint: str, params: dict):
+class MapsBudgetExceeded(ValueError):
+    pass
+
+
+def _google_request(endpoint: str, params: dict):
     if not settings.GOOGLE_MAPS_KEY:
         raise ValueError("GOOGLE_MAPS_KEY not configured")
     params["key"] = settings.GOOGLE_MAPS_KEY
-    resp = requests.get(endpoint, params=params, timeout=10)
-    data = resp.json()
+    return API_DIRECTIONS if endpoint == DIRECTIONS_URL else API_DISTANCE_MATRIX
+
+
+def _google_data(data: dict):
     status = data.get("status")
     if status != "OK":
         raise ValueError(data.get("error_message") or f"Maps API error: {status}")
     return data
 
 
-def get_route(origin: dict, destination: dict, mode: str = "driving"):
-    ensure_indexes()
+def _call_google(endpoint: str, params: dict, caller: str = CALLER_API, elements: int = 1):
+    api = _google_request(endpoint, params)
+    metering.record_usage(api, caller, elements)
+    with timed(STAGE_MAPS):
+        resp = _http_session().get(endpoint, params=params, timeout=10)
+    return _google_data(resp.json())
+
+
+def _http_session() -> requests.Session:
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+
+def warm_up():
+    """Opens a keep-alive connection to the Maps API so the first routed request skips the TLS handshake."""
+    if not settings.GOOGLE_MAPS_KEY:
+        return
+    _http_session().head(DIRECTIONS_URL, timeout=5)
+
+
+def _http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(timeout=10)
+        _http_clients[loop] = client
+    return client
+
+
+async def _acall_google(endpoint: str, params: dict, caller: str = CALLER_API, elements: int = 1):
+    api = _google_request(endpoint, params)
+    await metering.arecord_usage(api, caller, elements)
+    with timed(STAGE_MAPS):
+        resp = await _http_client().get(endpoint, params=params)
+    return _google_data(resp.json())
+
+
+def _estimate_leg(origin: dict, destination: dict):
+    detour = float(getattr(settings, "MAPS_FALLBACK_DETOUR_FACTOR", 1.3))
+    speed = float(getattr(settings, "MAPS_FALLBACK_SPEED_KMPH", 25.0))
+    distance_km = haversine_km(origin["lat"], origin["lng"], destination["lat"], destination["lng"]) * detour
+    return int(distance_km * 1000), int(distance_km / speed * 3600)
+
+
+def _eta_cache_key(origin: dict, destination: dict, mode: str):
+    return "maps:eta:{}:{:.4f},{:.4f}:{:.4f},{:.4f}".format(
+        mode,
+        float(origin["lat"]),
+        float(origin["lng"]),
+        float(destination["lat"]),
+        float(destination["lng"]),
+    )
+
+
+def _cached_eta_payload(result: dict):
+    return json.dumps({
+        "distance_m": result["distance_m"],
+        "duration_s": result["duration_s"],
+        "duration_in_traffic_s": result["duration_in_traffic_s"],
+    })
+
+
+def _store_eta(result: dict, mode: str):
+    try:
+        get_client().setex(
+            _eta_cache_key(result["origin"], result["destination"], mode),
+            int(getattr(settings, "MAPS_ETA_CACHE_TTL_SEC", 300)),
+            _cached_eta_payload(result),
+        )
+    except Exception:
+        pass
+
+
+async def _astore_eta(result: dict, mode: str):
+    try:
+        await get_async_client().setex(
+            _eta_cache_key(result["origin"], result["destination"], mode),
+            int(getattr(settings, "MAPS_ETA_CACHE_TTL_SEC", 300)),
+            _cached_eta_payload(result),
+        )
+    except Exception:
+        pass
+
+
+def _degraded_result(origin: dict, destination: dict, caller: str, cached):
+    if cached:
+        metering.record_degraded(API_DISTANCE_MATRIX, caller, SOURCE_CACHE)
+        result = {"origin": origin, "destination": destination, "source": SOURCE_CACHE}
+        result.update(json.loads(cached))
+        return result
+    metering.record_degraded(API_DISTANCE_MATRIX, caller, SOURCE_ESTIMATE)
+    distance_m, duration_s = _estimate_leg(origin, destination)
+    return {
+        "origin": origin,
+        "destination": destination,
+        "distance_m": distance_m,
+        "duration_s": duration_s,
+        "duration_in_traffic_s": None,
+        "source": SOURCE_ESTIMATE,
+    }
+
+
+def _degraded_eta(origin: dict, destination: dict, mode: str, caller: str):
+    cached = None
+    try:
+        cached = get_client().get(_eta_cache_key(origin, destination, mode))
+    except Exception:
+        cached = None
+    return _degraded_result(origin, destination, caller, cached)
+
+
+async def _adegraded_eta(origin: dict, destination: dict, mode: str, caller: str):
+    cached = None
+    try:
+        cached = await get_async_client().get(_eta_cache_key(origin, destination, mode))
+    except Exception:
+        cached = None
+    return _degraded_result(origin, destination, caller, cached)
+
+
+def get_route(origin: dict, destination: dict, mode: str = "driving", caller: str = CALLER_API):
     cache_payload = {
         "origin": origin,
         "destination": destination,
@@ -88,11 +190,30 @@ def get_route(origin: dict, destination: dict, mode: str = "driving"):
     }
     key = _cache_key(cache_payload)
     db = get_db()
-    cached = db.routes_cache.find_one({"cache_key": key, "expires_at": {"$gt": utcnow()}})
+    cached = db.routes_cache.find_one(
+        {"cache_key": key, "expires_at": {"$gt": utcnow()}},
+        ROUTE_CACHE_PROJECTION,
+    )
     if cached:
         cached["cached"] = True
         return cached
 
+    if metering.should_degrade(caller, 1):
+        metering.record_degraded(API_DIRECTIONS, caller, SOURCE_ESTIMATE)
+        distance_m, duration_s = _estimate_leg(origin, destination)
+        return {
+            "origin": origin,
+            "destination": destination,
+            "mode": mode,
+            "distance_m": distance_m,
+            "duration_s": duration_s,
+            "duration_in_traffic_s": None,
+            "polyline": encode_polyline([origin, destination]),
+            "summary": None,
+            "cached": False,
+            "source": SOURCE_ESTIMATE,
+        }
+
     params = {
         "origin": f"{origin['lat']},{origin['lng']}",
         "destination": f"{destination['lat']},{destination['lng']}",
@@ -100,12 +221,11 @@ def get_route(origin: dict, destination: dict, mode: str = "driving"):
         "departure_time": "now",
         "traffic_model": "best_guess",
     }
-    data = _call_google("https://maps.googleapis.com/maps/api/directions/json", params)
+    data = _call_google(DIRECTIONS_URL, params, caller=caller)
 
     route = data["routes"][0]
     leg = route["legs"][0]
     polyline = route["overview_polyline"]["points"]
-    points = _decode_polyline(polyline)
 
     doc = {
         "cache_key": key,
@@ -116,7 +236,6 @@ def get_route(origin: dict, destination: dict, mode: str = "driving"):
         "duration_s": leg["duration"]["value"],
         "duration_in_traffic_s": leg.get("duration_in_traffic", {}).get("value"),
         "polyline": polyline,
-        "points": points,
         "summary": route.get("summary"),
         "created_at": utcnow(),
         "expires_at": utcnow() + timedelta(minutes=settings.MAPS_CACHE_TTL_MIN),
@@ -126,15 +245,32 @@ def get_route(origin: dict, destination: dict, mode: str = "driving"):
     return doc
 
 
-def get_eta(origin: dict, destination: dict, mode: str = "driving"):
-    params = {
+def route_points(route: dict):
+    if route.get("polyline"):
+        return array_to_points(decode_polyline_array(route["polyline"]))
+    return route.get("points") or []
+
+
+def compact_routes_cache():
+    db = get_db()
+    result = db.routes_cache.update_many(
+        {"points": {"$exists": True}, "polyline": {"$type": "string"}},
+        {"$unset": {"points": ""}},
+    )
+    return result.modified_count
+
+
+def _eta_params(origin: dict, destination: dict, mode: str):
+    return {
         "origins": f"{origin['lat']},{origin['lng']}",
         "destinations": f"{destination['lat']},{destination['lng']}",
         "mode": mode,
         "departure_time": "now",
         "traffic_model": "best_guess",
     }
-    data = _call_google("https://maps.googleapis.com/maps/api/distancematrix/json", params)
+
+
+def _eta_result(data: dict, origin: dict, destination: dict):
     element = data["rows"][0]["elements"][0]
     if element.get("status") != "OK":
         raise ValueError("No route found")
@@ -147,7 +283,53 @@ def get_eta(origin: dict, destination: dict, mode: str = "driving"):
     }
 
 
-def rank_captains_by_eta(pickup_location: dict, captains: List[dict], mode: str = "driving"):
+def get_eta(origin: dict, destination: dict, mode: str = "driving", caller: str = CALLER_API):
+    if metering.should_degrade(caller, 1):
+        return _degraded_eta(origin, destination, mode, caller)
+    data = _call_google(DISTANCE_MATRIX_URL, _eta_params(origin, destination, mode), caller=caller)
+    result = _eta_result(data, origin, destination)
+    _store_eta(result, mode)
+    return result
+
+
+async def aget_eta(origin: dict, destination: dict, mode: str = "driving", caller: str = CALLER_API):
+    if await metering.ashould_degrade(caller, 1):
+        return await _adegraded_eta(origin, destination, mode, caller)
+    data = await _acall_google(DISTANCE_MATRIX_URL, _eta_params(origin, destination, mode), caller=caller)
+    result = _eta_result(data, origin, destination)
+    await _astore_eta(result, mode)
+    return result
+
+
+def get_durations(origin: dict, destinations: List[dict], mode: str = "driving", caller: str = CALLER_API):
+    if metering.should_degrade(caller, len(destinations)):
+        metering.record_degraded(API_DISTANCE_MATRIX, caller, SOURCE_ESTIMATE)
+        raise MapsBudgetExceeded("Maps budget exceeded")
+    durations = []
+    chunk_size = 25
+    for idx in range(0, len(destinations), chunk_size):
+        chunk = destinations[idx:idx + chunk_size]
+        params = {
+            "origins": f"{origin['lat']},{origin['lng']}",
+            "destinations": "|".join(f"{d['lat']},{d['lng']}" for d in chunk),
+            "mode": mode,
+            "departure_time": "now",
+            "traffic_model": "best_guess",
+        }
+        data = _call_google(DISTANCE_MATRIX_URL, params, caller=caller, elements=len(chunk))
+        rows = data.get("rows") or [{}]
+        elements = rows[0].get("elements", [])
+        for pos in range(len(chunk)):
+            element = elements[pos] if pos < len(elements) else {}
+            if element.get("status") != "OK":
+                durations.append(None)
+                continue
+            duration = element.get("duration_in_traffic", element.get("duration"))
+            durations.append(duration.get("value"))
+    return durations
+
+
+def rank_captains_by_eta(pickup_location: dict, captains: List[dict], mode: str = "driving", caller: str = CALLER_API):
     if not captains:
         return [], {}
     origins = []
@@ -165,38 +347,44 @@ def rank_captains_by_eta(pickup_location: dict, captains: List[dict], mode: str
         return captains, {}
 
     eta_map = {}
-    chunk_size = 25
-    for idx in range(0, len(origins), chunk_size):
-        chunk_origins = origins[idx:idx + chunk_size]
-        params = {
-            "origins": "|".join(chunk_origins),
-            "destinations": f"{pickup_location['coordinates'][1]},{pickup_location['coordinates'][0]}",
-            "mode": mode,
-            "departure_time": "now",
-            "traffic_model": "best_guess",
-        }
-        data = _call_google("https://maps.googleapis.com/maps/api/distancematrix/json", params)
-        rows = data.get("rows", [])
-        for row_idx, row in enumerate(rows):
-            elements = row.get("elements", [])
-            if not elements:
-                continue
-            element = elements[0]
-            if element.get("status") != "OK":
-                continue
-            duration = element.get("duration_in_traffic", element.get("duration"))
-            captain = origin_captains[idx + row_idx]
-            eta_map[str(captain.get("user_id"))] = duration.get("value")
+    if metering.should_degrade(caller, len(origins)):
+        metering.record_degraded(API_DISTANCE_MATRIX, caller, SOURCE_ESTIMATE)
+        pickup = {"lat": pickup_location["coordinates"][1], "lng": pickup_location["coordinates"][0]}
+        for captain in origin_captains:
+            coords = captain["location"]["coordinates"]
+            _, duration_s = _estimate_leg({"lat": coords[1], "lng": coords[0]}, pickup)
+            eta_map[str(captain.get("user_id"))] = duration_s
+    else:
+        chunk_size = 25
+        for idx in range(0, len(origins), chunk_size):
+            chunk_origins = origins[idx:idx + chunk_size]
+            params = {
+                "origins": "|".join(chunk_origins),
+                "destinations": f"{pickup_location['coordinates'][1]},{pickup_location['coordinates'][0]}",
+                "mode": mode,
+                "departure_time": "now",
+                "traffic_model": "best_guess",
+            }
+            data = _call_google(DISTANCE_MATRIX_URL, params, caller=caller, elements=len(chunk_origins))
+            rows = data.get("rows", [])
+            for row_idx, row in enumerate(rows):
+                elements = row.get("elements", [])
+                if not elements:
+                    continue
+                element = elements[0]
+                if element.get("status") != "OK":
+                    continue
+                duration = element.get("duration_in_traffic", element.get("duration"))
+                captain = origin_captains[idx + row_idx]
+                eta_map[str(captain.get("user_id"))] = duration.get("value")
 
     ordered = sorted(origin_captains, key=lambda c: eta_map.get(str(c.get("user_id")), 10**9))
     ordered.extend(no_location)
     return ordered, eta_map
 
 
-def find_nearby_captains(lat: float, lng: float, radius_m: int = 5000, limit: int = 20):
-    ensure_captain_geo_index()
-    db = get_db()
-    cursor = db.captains.find({
+def _nearby_query(lat: float, lng: float, radius_m: int):
+    return {
         "is_online": True,
         "is_verified": True,
         "is_busy": {"$ne": True},
@@ -206,5 +394,16 @@ def find_nearby_captains(lat: float, lng: float, radius_m: int = 5000, limit: in
                 "$maxDistance": radius_m,
             }
         },
-    }).limit(limit)
+    }
+
+
+def find_nearby_captains(lat: float, lng: float, radius_m: int = 5000, limit: int = 20):
+    db = get_db()
+    cursor = db.captains.find(_nearby_query(lat, lng, radius_m)).limit(limit)
     return list(cursor)
+
+
+async def afind_nearby_captains(lat: float, lng: float, radius_m: int = 5000, limit: int = 20):
+    db = get_async_db()
+    cursor = db.captains.find(_nearby_query(lat, lng, radius_m)).limit(limit)
+    return await cursor.to_list(length=limit)
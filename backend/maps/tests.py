@@ -1,2 +1,204 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
 
+from bson import ObjectId
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import geometry
+from core.geometry import haversine_km_array
+from maps import isochrones
+from maps import metering
+from maps import services as maps_services
+
+
+def _directions_response(polyline):
+    return {
+        "status": "OK",
+        "routes": [{
+            "summary": "Main Rd",
+            "overview_polyline": {"points": polyline},
+            "legs": [{"distance": {"value": 5200}, "duration": {"value": 960}}],
+        }],
+    }
+
+
+class RouteCacheTests(TestCase):
+    def test_get_route_stores_only_encoded_polyline(self):
+        fake_db = MagicMock()
+        fake_db.routes_cache.find_one.return_value = None
+        polyline = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+        with patch("maps.services.get_db", return_value=fake_db), \
+             patch("maps.services._call_google", return_value=_directions_response(polyline)):
+            route = maps_services.get_route({"lat": 38.5, "lng": -120.2}, {"lat": 43.252, "lng": -126.453})
+
+        stored = fake_db.routes_cache.update_one.call_args[0][1]["$set"]
+        self.assertEqual(stored["polyline"], polyline)
+        self.assertNotIn("points", stored)
+        self.assertEqual(maps_services.route_points(route)[1], {"lat": 40.7, "lng": -120.95})
+
+    def test_cache_hit_skips_legacy_points(self):
+        fake_db = MagicMock()
+        fake_db.routes_cache.find_one.return_value = {"polyline": "_p~iF~ps|U"}
+        with patch("maps.services.get_db", return_value=fake_db):
+            route = maps_services.get_route({"lat": 38.5, "lng": -120.2}, {"lat": 43.252, "lng": -126.453})
+
+        self.assertTrue(route["cached"])
+        self.assertEqual(fake_db.routes_cache.find_one.call_args[0][1], {"points": 0})
+        self.assertEqual(maps_services.route_points(route), [{"lat": 38.5, "lng": -120.2}])
+
+
+class IsochroneTests(TestCase):
+    def _ring(self, iso):
+        return iso["polygon"]["coordinates"][0]
+
+    @override_settings(GOOGLE_MAPS_KEY=None, ISOCHRONE_FALLBACK_SPEED_KMPH=18.0, ISOCHRONE_BEARINGS=12)
+    def test_estimated_isochrones_are_closed_and_nested(self):
+        result = isochrones.compute_isochrones(12.97, 77.59, [20, 10])
+        self.assertEqual([iso["minutes"] for iso in result], [10, 20])
+        for iso, expected_km in zip(result, (3.0, 6.0)):
+            ring = self._ring(iso)
+            self.assertEqual(len(ring), 13)
+            self.assertEqual(ring[0], ring[-1])
+            radii = haversine_km_array(12.97, 77.59, [p[1] for p in ring], [p[0] for p in ring])
+            self.assertTrue(all(abs(r - expected_km) < 0.01 for r in radii))
+            self.assertEqual(iso["method"], isochrones.METHOD_ESTIMATE)
+
+    @override_settings(GOOGLE_MAPS_KEY="key", ISOCHRONE_PROBE_SPEED_KMPH=40.0, ISOCHRONE_BEARINGS=4)
+    def test_distance_matrix_radius_interpolates_between_probes(self):
+        # Probes sit at 5, 10, 15 and 20 km; every bearing drives at 30 km/h except the
+        # second, which is blocked beyond the first probe.
+        def durations(origin, destinations, mode, caller=None):
+            values = []
+            for idx, dest in enumerate(destinations):
+                bearing, probe = divmod(idx, 4)
+                if bearing == 1 and probe > 0:
+                    values.append(None)
+                else:
+                    values.append(int((probe + 1) * 5 / 30.0 * 3600))
+            return values
+
+        with patch("maps.isochrones.maps_services.get_durations", side_effect=durations):
+            result = isochrones.compute_isochrones(12.97, 77.59, [15, 30])
+
+        self.assertEqual(result[0]["method"], isochrones.METHOD_DISTANCE_MATRIX)
+        ring = self._ring(result[1])
+        radii = haversine_km_array(12.97, 77.59, [p[1] for p in ring[:-1]], [p[0] for p in ring[:-1]])
+        self.assertAlmostEqual(radii[0], 15.0, places=1)
+        self.assertAlmostEqual(radii[1], 5.0, places=1)
+        ring_15 = self._ring(result[0])
+        self.assertAlmostEqual(
+            haversine_km_array(12.97, 77.59, ring_15[0][1], ring_15[0][0]), 7.5, places=1
+        )
+
+    def test_reachable_refs_uses_geo_intersects(self):
+        fake_db = MagicMock()
+        fake_db.isochrones.find.return_value = [{"ref_id": "r1"}]
+        with patch("maps.isochrones.get_db", return_value=fake_db):
+            refs = isochrones.reachable_refs(12.97, 77.59, 20)
+        query = fake_db.isochrones.find.call_args[0][0]
+        self.assertEqual(refs, ["r1"])
+        self.assertEqual(query["polygon"]["$geoIntersects"]["$geometry"]["coordinates"], [77.59, 12.97])
+        self.assertEqual(query["minutes"], 20)
+
+    def _post_isochrone(self, role):
+        from maps.views import IsochroneView
+
+        request = APIRequestFactory().post(
+            "/api/v1/maps/isochrone", {"ref_type": "POINT", "lat": 12.97163, "lng": 77.59461}, format="json"
+        )
+        force_authenticate(request, user=SimpleNamespace(id="u1", role=role, is_authenticated=True))
+        with patch("maps.views.isochrones.get_isochrones", return_value=[]) as get_isochrones:
+            response = IsochroneView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        return get_isochrones.call_args[0]
+
+    def test_only_admins_get_exact_point_isochrones(self):
+        self.assertEqual(self._post_isochrone("USER")[:2], (isochrones.REF_ZONE, "12.97:77.59"))
+        self.assertEqual(self._post_isochrone("ADMIN")[:2], (isochrones.REF_POINT, "12.9716:77.5946"))
+
+
+
+@override_settings(ISOCHRONE_BATCH_MINUTES=10, CAPTAIN_MAX_BATCH_ORDERS=3)
+class IsochroneBatchTests(SimpleTestCase):
+    SQUARE = {
+        "type": "Polygon",
+        "coordinates": [[[77.58, 12.96], [77.60, 12.96], [77.60, 12.98], [77.58, 12.98], [77.58, 12.96]]],
+    }
+
+    def _captain(self, lng, lat):
+        return {"_id": ObjectId(), "user_id": ObjectId(), "location": {"type": "Point", "coordinates": [lng, lat]}}
+
+    def test_polygon_contains(self):
+        holed = {"type": "Polygon", "coordinates": self.SQUARE["coordinates"] + [
+            [[77.585, 12.965], [77.595, 12.965], [77.595, 12.975], [77.585, 12.975], [77.585, 12.965]],
+        ]}
+        self.assertTrue(geometry.polygon_contains(self.SQUARE, 77.59, 12.97))
+        self.assertFalse(geometry.polygon_contains(self.SQUARE, 77.61, 12.97))
+        self.assertFalse(geometry.polygon_contains(holed, 77.59, 12.97))
+        self.assertTrue(geometry.polygon_contains(holed, 77.582, 12.97))
+
+    def test_nearest_captain_inside_the_isochrone_gets_the_batch(self):
+        from core import matching_service
+
+        pickup = {"type": "Point", "coordinates": [77.575, 12.97]}
+        outside = self._captain(77.574, 12.97)
+        nearest_inside = self._captain(77.581, 12.97)
+        farther_inside = self._captain(77.599, 12.97)
+        db = MagicMock()
+        db.captains.find.return_value.limit.return_value = [outside, nearest_inside, farther_inside]
+        job = {"_id": ObjectId(), "restaurant_id": ObjectId()}
+        with patch("core.matching_service.get_db", return_value=db), \
+                patch("maps.isochrones.cached_polygon", return_value=self.SQUARE), \
+                patch("vehicles.services.get_food_allowed_vehicles", return_value=["BIKE"]), \
+                patch("orders.state_machine.set_order_status"), \
+                patch("core.matching_service._send_ws"), \
+                patch("core.matching_service.notification_services"):
+            chosen = matching_service._try_batch_order(job, pickup)
+        self.assertEqual(chosen, str(nearest_inside["user_id"]))
+        near = db.captains.find.call_args[0][0]["location"]["$near"]
+        self.assertEqual(near["$geometry"], pickup)
+        self.assertGreater(near["$maxDistance"], 2000)
+
+class MapsBudgetTests(TestCase):
+    def test_isochrones_have_a_default_budget(self):
+        self.assertGreater(settings.MAPS_CALLER_ELEMENTS_PER_MIN.get(metering.CALLER_ISOCHRONE, 0), 0)
+
+    @override_settings(MAPS_ELEMENTS_PER_MIN=100, MAPS_CALLER_ELEMENTS_PER_MIN={"go_home": 10}, MAPS_DEGRADE_AT_PCT=0.9)
+    def test_should_degrade_near_budget(self):
+        fake_redis = MagicMock()
+        fake_redis.mget.return_value = ["50", "8"]
+        with patch("maps.metering.get_client", return_value=fake_redis):
+            self.assertFalse(metering.should_degrade("go_home", 1))
+            self.assertTrue(metering.should_degrade("go_home", 2))
+            fake_redis.mget.return_value = ["90", None]
+            self.assertTrue(metering.should_degrade("matching", 1))
+
+    @override_settings(MAPS_ELEMENTS_PER_MIN=0, MAPS_CALLER_ELEMENTS_PER_MIN={})
+    def test_unlimited_budget_skips_redis(self):
+        with patch("maps.metering.get_client") as client:
+            self.assertFalse(metering.should_degrade("matching", 25))
+        client.assert_not_called()
+
+    @override_settings(MAPS_FALLBACK_SPEED_KMPH=30.0, MAPS_FALLBACK_DETOUR_FACTOR=1.0)
+    def test_get_eta_degrades_to_estimate_without_calling_google(self):
+        fake_redis = MagicMock()
+        fake_redis.get.return_value = None
+        with patch("maps.services.metering.should_degrade", return_value=True), \
+             patch("maps.services.get_client", return_value=fake_redis), \
+             patch("maps.services._call_google") as call_google:
+            eta = maps_services.get_eta({"lat": 12.9, "lng": 77.5}, {"lat": 13.0, "lng": 77.5}, caller="go_home")
+        call_google.assert_not_called()
+        self.assertEqual(eta["source"], maps_services.SOURCE_ESTIMATE)
+        self.assertAlmostEqual(eta["distance_m"], 11119, delta=5)
+        self.assertAlmostEqual(eta["duration_s"], 1334, delta=2)
+
+    def test_get_eta_degrades_to_cached_value(self):
+        fake_redis = MagicMock()
+        fake_redis.get.return_value = '{"distance_m": 5000, "duration_s": 600, "duration_in_traffic_s": 700}'
+        with patch("maps.services.metering.should_degrade", return_value=True), \
+             patch("maps.services.get_client", return_value=fake_redis):
+            eta = maps_services.get_eta({"lat": 12.9, "lng": 77.5}, {"lat": 13.0, "lng": 77.5})
+        self.assertEqual(eta["source"], maps_services.SOURCE_CACHE)
+        self.assertEqual(eta["duration_in_traffic_s"], 700)
@@ -1,8 +1,16 @@
 from django.urls import path
+from core.async_views import hot_path_view
 from maps import views
 
 urlpatterns = [
     path("maps/route", views.MapsRouteView.as_view(), name="maps-route"),
     path("maps/eta", views.MapsEtaView.as_view(), name="maps-eta"),
-    path("captain/nearby", views.NearbyCaptainsView.as_view(), name="captain-nearby"),
+    path("maps/usage", views.MapsUsageView.as_view(), name="maps-usage"),
+    path("maps/isochrone", views.IsochroneView.as_view(), name="maps-isochrone"),
+    path("maps/isochrone/reachable", views.ReachableRestaurantsView.as_view(), name="maps-isochrone-reachable"),
+    path(
+        "captain/nearby",
+        hot_path_view(views.NearbyCaptainsView, views.AsyncNearbyCaptainsView),
+        name="captain-nearby",
+    ),
 ]
@@ -3,10 +3,19 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
+from core.async_views import AsyncAPIView
 from core.permissions import RolePermission
 from core.utils import serialize_doc
-from maps.serializers import RouteRequestSerializer, EtaRequestSerializer, NearbyCaptainsSerializer
+from maps.serializers import (
+    RouteRequestSerializer,
+    EtaRequestSerializer,
+    NearbyCaptainsSerializer,
+    IsochroneRequestSerializer,
+    ReachableRestaurantsSerializer,
+)
 from maps import services
+from maps import isochrones
+from maps import metering
 
 
 class MapsRouteView(APIView):
@@ -26,6 +35,8 @@ class MapsRouteView(APIView):
             )
         except Exception as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if serializer.validated_data.get("include_points", True):
+            result["points"] = services.route_points(result)
         return Response({"route": serialize_doc(result)})
 
 
@@ -64,3 +75,70 @@ class NearbyCaptainsView(APIView):
             serializer.validated_data.get("radius_m", 5000),
         )
         return Response({"captains": serialize_doc(captains)})
+
+
+class AsyncNearbyCaptainsView(AsyncAPIView):
+    allowed_roles = ["USER", "ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def get(self, request):
+        serializer = NearbyCaptainsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        captains = await services.afind_nearby_captains(
+            serializer.validated_data["lat"],
+            serializer.validated_data["lng"],
+            serializer.validated_data.get("radius_m", 5000),
+        )
+        return Response({"captains": serialize_doc(captains)})
+
+
+class IsochroneView(APIView):
+    allowed_roles = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Sample payload:
+    # {"ref_type": "POINT", "lat": 12.97, "lng": 77.59, "minutes": [10, 20, 30]}
+    # {"ref_type": "RESTAURANT", "restaurant_id": "<restaurant_id>"}
+    def post(self, request):
+        serializer = IsochroneRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            if data["ref_type"] == isochrones.REF_RESTAURANT:
+                result = isochrones.restaurant_isochrones(data["restaurant_id"], data.get("minutes"), data["mode"])
+            elif data["ref_type"] == isochrones.REF_ZONE or request.user.role != "ADMIN":
+                # Exact points cost a fresh set of Distance Matrix probes per coordinate, so only
+                # admins get them; everyone else shares the ~1 km zone cache.
+                result = isochrones.zone_isochrones(data["lat"], data["lng"], data.get("minutes"), data["mode"])
+            else:
+                result = isochrones.point_isochrones(data["lat"], data["lng"], data.get("minutes"), data["mode"])
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"isochrones": serialize_doc(result)})
+
+
+class ReachableRestaurantsView(APIView):
+    allowed_roles = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Example query:
+    # /api/v1/maps/isochrone/reachable?lat=12.97&lng=77.59&minutes=20
+    def get(self, request):
+        serializer = ReachableRestaurantsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        restaurant_ids = isochrones.reachable_refs(
+            serializer.validated_data["lat"],
+            serializer.validated_data["lng"],
+            serializer.validated_data["minutes"],
+            ref_type=isochrones.REF_RESTAURANT,
+            mode=serializer.validated_data["mode"],
+        )
+        return Response({"restaurant_ids": serialize_doc(restaurant_ids)})
+
+
+class MapsUsageView(APIView):
+    allowed_roles = ["ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    def get(self, request):
+        return Response({"usage": metering.usage_snapshot()})
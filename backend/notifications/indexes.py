@@ -0,0 +1,15 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register, retire
+
+register("notifications", [
+    IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="notifications_created_id"),
+    IndexModel([("status", ASCENDING), ("send_at", ASCENDING)], name="notifications_status_send_at"),
+])
+retire("notifications", ["notifications_created_at"])
+register("notification_logs", [
+    IndexModel([("created_at", DESCENDING)], name="notification_logs_created_at"),
+])
+register("notification_receipts", [
+    IndexModel([("notification_id", ASCENDING), ("created_at", DESCENDING)], name="notification_receipts_id"),
+])
@@ -2,29 +2,21 @@ from typing import Optional, Dict
 import json
 from datetime import datetime, timezone
 
-from firebase_admin import messaging
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from pymongo import ReturnDocument
 
 from core.firebase import get_firebase_app
-from core.db import get_db
+from core.db import get_async_db, get_db
+from core.log_writer import log_writer
+from core.pagination import paginate
+from core.read_models import USER_PUSH_TARGET
+from core import tracing
+from core.metrics import STAGE_FCM, timed
+from core.tracing import traced
 from core.utils import to_object_id, utcnow
 from core.redis_queue import get_client
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.notifications.create_index([("created_at", -1)], name="notifications_created_at")
-    db.notifications.create_index([("status", 1), ("send_at", 1)], name="notifications_status_send_at")
-    db.notification_logs.create_index([("created_at", -1)], name="notification_logs_created_at")
-    db.notification_receipts.create_index([("notification_id", 1), ("created_at", -1)], name="notification_receipts_id")
-    _index_ready = True
-
 
 def _priority_queue(priority: str) -> str:
     value = (priority or "NORMAL").upper()
@@ -35,10 +27,13 @@ def _priority_queue(priority: str) -> str:
     return "notifications:queue:normal"
 
 
+@traced()
 def send_notification(token: str, title: str, body: str, data: Optional[Dict] = None, silent: bool = False, priority: str = "NORMAL"):
     if not token:
         return False
     try:
+        from firebase_admin import messaging
+
         get_firebase_app()
         message = messaging.Message(
             token=token,
@@ -46,7 +41,8 @@ def send_notification(token: str, title: str, body: str, data: Optional[Dict] =
             data={k: str(v) for k, v in (data or {}).items()},
             android=messaging.AndroidConfig(priority=priority.lower()),
         )
-        messaging.send(message)
+        with timed(STAGE_FCM):
+            messaging.send(message)
         return True
     except Exception:
         return False
@@ -57,14 +53,27 @@ def send_to_user(user_id: str, title: str, body: str, data: Optional[Dict] = Non
     oid = to_object_id(user_id)
     if not oid:
         return False
-    user_doc = db.users.find_one({"_id": oid})
+    user_doc = db.users.find_one({"_id": oid}, USER_PUSH_TARGET)
     if not user_doc or not user_doc.get("fcm_token"):
         return False
     return send_notification(user_doc["fcm_token"], title, body, data, silent=silent, priority=priority)
 
 
+async def asend_to_user(user_id: str, title: str, body: str, data: Optional[Dict] = None, silent: bool = False, priority: str = "NORMAL"):
+    oid = to_object_id(user_id)
+    if not oid:
+        return False
+    user_doc = await get_async_db().users.find_one({"_id": oid}, USER_PUSH_TARGET)
+    if not user_doc or not user_doc.get("fcm_token"):
+        return False
+    # The Firebase Admin SDK has no async client; only the FCM call itself leaves the event loop.
+    return await sync_to_async(send_notification, thread_sensitive=False)(
+        user_doc["fcm_token"], title, body, data, silent=silent, priority=priority
+    )
+
+
+@traced()
 def enqueue_notification(payload: dict):
-    ensure_indexes()
     db = get_db()
     payload["status"] = payload.get("status") or "QUEUED"
     payload["retry_count"] = int(payload.get("retry_count", 0))
@@ -75,13 +84,12 @@ def enqueue_notification(payload: dict):
     client = get_client()
     client.rpush(
         _priority_queue(payload.get("priority")),
-        json.dumps({"notification_id": str(payload["_id"])}, default=str),
+        json.dumps(tracing.inject({"notification_id": str(payload["_id"])}), default=str),
     )
     return payload
 
 
 def queue_notification_id(notification_id: str):
-    ensure_indexes()
     db = get_db()
     notif = db.notifications.find_one_and_update(
         {"_id": to_object_id(notification_id)},
@@ -92,12 +100,14 @@ def queue_notification_id(notification_id: str):
         return False
     client = get_client()
     priority = notif.get("priority") if notif else "NORMAL"
-    client.rpush(_priority_queue(priority), json.dumps({"notification_id": str(notification_id)}, default=str))
+    client.rpush(
+        _priority_queue(priority),
+        json.dumps(tracing.inject({"notification_id": str(notification_id)}), default=str),
+    )
     return True
 
 
 def schedule_notification(payload: dict, send_at: datetime):
-    ensure_indexes()
     db = get_db()
     payload["status"] = "SCHEDULED"
     payload["created_at"] = utcnow()
@@ -112,8 +122,7 @@ def schedule_notification(payload: dict, send_at: datetime):
 
 
 def _log_notification(notification_id: str, status: str, detail: Optional[str] = None):
-    db = get_db()
-    db.notification_logs.insert_one({
+    log_writer.write("notification_logs", {
         "notification_id": to_object_id(notification_id),
         "status": status,
         "detail": detail,
@@ -122,8 +131,7 @@ def _log_notification(notification_id: str, status: str, detail: Optional[str] =
 
 
 def _log_receipt(notification_id: str, status: str, detail: Optional[str] = None):
-    db = get_db()
-    db.notification_receipts.insert_one({
+    log_writer.write("notification_receipts", {
         "notification_id": to_object_id(notification_id),
         "status": status,
         "detail": detail,
@@ -131,6 +139,70 @@ def _log_receipt(notification_id: str, status: str, detail: Optional[str] = None
     })
 
 
+def _process_notification(client, db, notification_id: str):
+    if not notification_id:
+        return
+    notif = db.notifications.find_one({"_id": to_object_id(notification_id)})
+    if not notif:
+        return
+    success = False
+    if notif.get("topic"):
+        try:
+            from firebase_admin import messaging
+
+            get_firebase_app()
+            message = messaging.Message(
+                topic=notif.get("topic"),
+                notification=None if notif.get("silent") else messaging.Notification(
+                    title=notif.get("title"), body=notif.get("body")
+                ),
+                data={k: str(v) for k, v in (notif.get("data") or {}).items()},
+            )
+            with timed(STAGE_FCM):
+                messaging.send(message)
+            success = True
+        except Exception as exc:
+            success = False
+            _log_notification(notification_id, "FAILED", str(exc))
+    else:
+        if not notif.get("user_id"):
+            success = False
+        else:
+            success = send_to_user(
+                str(notif.get("user_id")),
+                notif.get("title"),
+                notif.get("body"),
+                notif.get("data"),
+                silent=bool(notif.get("silent")),
+                priority=notif.get("priority") or "NORMAL",
+            )
+    if success:
+        db.notifications.update_one(
+            {"_id": notif.get("_id")},
+            {"$set": {"status": "SENT", "sent_at": utcnow()}},
+        )
+        _log_notification(notification_id, "SENT")
+        _log_receipt(notification_id, "SENT")
+    else:
+        retries = int(notif.get("retry_count", 0)) + 1
+        if retries <= settings.NOTIFICATION_MAX_RETRIES:
+            db.notifications.update_one(
+                {"_id": notif.get("_id")},
+                {"$set": {"status": "QUEUED"}, "$inc": {"retry_count": 1}},
+            )
+            client.rpush(
+                _priority_queue(notif.get("priority")),
+                json.dumps(tracing.inject({"notification_id": str(notification_id)}), default=str),
+            )
+        else:
+            db.notifications.update_one(
+                {"_id": notif.get("_id")},
+                {"$set": {"status": "FAILED", "sent_at": utcnow()}, "$inc": {"retry_count": 1}},
+            )
+        _log_notification(notification_id, "FAILED")
+        _log_receipt(notification_id, "FAILED")
+
+
 def process_queue(max_items: int = 50):
     client = get_client()
     db = get_db()
@@ -146,64 +218,14 @@ def process_queue(max_items: int = 50):
         processed += 1
         data = json.loads(raw)
         notification_id = data.get("notification_id")
-        if not notification_id:
-            continue
-        notif = db.notifications.find_one({"_id": to_object_id(notification_id)})
-        if not notif:
-            continue
-        success = False
-        if notif.get("topic"):
-            try:
-                get_firebase_app()
-                message = messaging.Message(
-                    topic=notif.get("topic"),
-                    notification=None if notif.get("silent") else messaging.Notification(
-                        title=notif.get("title"), body=notif.get("body")
-                    ),
-                    data={k: str(v) for k, v in (notif.get("data") or {}).items()},
-                )
-                messaging.send(message)
-                success = True
-            except Exception as exc:
-                success = False
-                _log_notification(notification_id, "FAILED", str(exc))
-        else:
-            if not notif.get("user_id"):
-                success = False
-            else:
-                success = send_to_user(
-                    str(notif.get("user_id")),
-                    notif.get("title"),
-                    notif.get("body"),
-                    notif.get("data"),
-                    silent=bool(notif.get("silent")),
-                    priority=notif.get("priority") or "NORMAL",
-                )
-        if success:
-            db.notifications.update_one(
-                {"_id": notif.get("_id")},
-                {"$set": {"status": "SENT", "sent_at": utcnow()}},
-            )
-            _log_notification(notification_id, "SENT")
-            _log_receipt(notification_id, "SENT")
-        else:
-            retries = int(notif.get("retry_count", 0)) + 1
-            if retries <= settings.NOTIFICATION_MAX_RETRIES:
-                db.notifications.update_one(
-                    {"_id": notif.get("_id")},
-                    {"$set": {"status": "QUEUED"}, "$inc": {"retry_count": 1}},
-                )
-                client.rpush(
-                    _priority_queue(notif.get("priority")),
-                    json.dumps({"notification_id": str(notification_id)}, default=str),
-                )
-            else:
-                db.notifications.update_one(
-                    {"_id": notif.get("_id")},
-                    {"$set": {"status": "FAILED", "sent_at": utcnow()}, "$inc": {"retry_count": 1}},
-                )
-            _log_notification(notification_id, "FAILED")
-            _log_receipt(notification_id, "FAILED")
+        with tracing.start_span(
+            "notifications.process",
+            tracing.KIND_CONSUMER,
+            {"notification_id": notification_id},
+            parent=tracing.extract(data.get(tracing.TRACEPARENT)),
+            root=True,
+        ):
+            _process_notification(client, db, notification_id)
     return processed
 
 
@@ -219,10 +241,9 @@ def dispatch_scheduled(max_items: int = 50):
     return len(ids)
 
 
-def list_notifications(user_id: Optional[str] = None, limit: int = 50):
+def list_notifications(user_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
     query = {}
     if user_id:
         query["user_id"] = to_object_id(user_id)
-    cursor = db.notifications.find(query).sort("created_at", -1).limit(limit)
-    return list(cursor)
+    return paginate(db.notifications, query, limit, cursor, sort_field="created_at")
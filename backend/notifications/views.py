@@ -59,8 +59,11 @@ class NotificationHistoryView(APIView):
 
     def get(self, request):
         limit = int(request.query_params.get("limit", 50))
-        notifications = services.list_notifications(limit=limit)
-        return Response({"notifications": serialize_doc(notifications)})
+        try:
+            page = services.list_notifications(limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"notifications": serialize_doc(list(page)), "next_cursor": page.next_cursor})
 
 
 class NotificationRetryView(APIView):
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ObservabilityConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "observability"
+
+    def ready(self):
+        from core import tracing
+
+        tracing.install()
@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register
+
+register("mongo_slow_queries", [
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="mongo_slow_queries_ttl"),
+    IndexModel([("shape", ASCENDING), ("created_at", DESCENDING)], name="mongo_slow_queries_shape"),
+])
@@ -0,0 +1,206 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+
+from core.redis_queue import get_async_client, get_client
+
+STACKS_KEY_PREFIX = "profiler:stacks:"
+ROUTES_KEY = "profiler:routes"
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f"{filename}:{code.co_name}"
+
+
+def collapse(frame, max_depth: int) -> str:
+    """Renders a frame as a root-first `a;b;c` stack, the collapsed format flamegraph tools read."""
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads that are serving a request from one background thread."""
+
+    def __init__(self, interval_sec: float, max_depth: int):
+        self.interval_sec = interval_sec
+        self.max_depth = max_depth
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_running(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != pid or not self._thread.is_alive():
+                self._pid = pid
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval_sec)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in list(self._active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None and thread_id != own:
+                    samples[collapse(frame, self.max_depth)] += 1
+
+    def begin(self) -> bool:
+        thread_id = threading.get_ident()
+        # Concurrent async requests on one event-loop thread cannot be told apart; sample the first.
+        if thread_id in self._active:
+            return False
+        self._ensure_running()
+        self._active[thread_id] = Counter()
+        return True
+
+    def end(self) -> Counter:
+        return self._active.pop(threading.get_ident(), None) or Counter()
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def enabled() -> bool:
+    return bool(getattr(settings, "PROFILER_ENABLED", False))
+
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler(
+            float(getattr(settings, "PROFILER_INTERVAL_MS", 20)) / 1000.0,
+            int(getattr(settings, "PROFILER_MAX_DEPTH", 64)),
+        )
+    return _profiler
+
+
+def profiled_view(view):
+    """Samples the thread that runs a sync view into `request.profile_samples`, when the middleware set it.
+
+    Under ASGI, sync views run on an executor thread while the event-loop thread is shared by every
+    request in flight, so that executor thread is the one worth sampling. Async views are not sampled.
+    """
+    if iscoroutinefunction(view):
+        return view
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        samples = getattr(request, "profile_samples", None)
+        if samples is None:
+            return view(request, *args, **kwargs)
+        sampler = get_profiler()
+        sampling = sampler.begin()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            if sampling:
+                samples.update(sampler.end())
+
+    return wrapper
+
+
+class ProfilingASGIHandler(ASGIHandler):
+    def make_view_atomic(self, view):
+        return profiled_view(super().make_view_atomic(view))
+
+
+def _queue_stacks(pipe, route: str, samples: Counter):
+    max_stacks = int(getattr(settings, "PROFILER_MAX_STACKS_PER_REQUEST", 50))
+    ttl = int(getattr(settings, "PROFILER_RETENTION_SEC", 3600))
+    key = f"{STACKS_KEY_PREFIX}{route}"
+    for stack, count in samples.most_common(max_stacks):
+        pipe.hincrby(key, stack, count)
+    pipe.expire(key, ttl)
+    pipe.sadd(ROUTES_KEY, route)
+    pipe.expire(ROUTES_KEY, ttl)
+
+
+def record_slow_request(route: str, samples: Counter):
+    if not samples:
+        return
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        _queue_stacks(pipe, route, samples)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+async def arecord_slow_request(route: str, samples: Counter):
+    if not samples:
+        return
+    try:
+        pipe = get_async_client().pipeline(transaction=False)
+        _queue_stacks(pipe, route, samples)
+        await pipe.execute()
+    except Exception:
+        pass
+
+
+def slow_request_stacks(route: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    client = get_client()
+    routes = [route] if route else sorted(client.smembers(ROUTES_KEY))
+    data = {}
+    for name in routes:
+        stacks = client.hgetall(f"{STACKS_KEY_PREFIX}{name}")
+        if stacks:
+            data[name] = {stack: int(count) for stack, count in stacks.items()}
+    return data
+
+
+def clear_slow_request_stacks():
+    client = get_client()
+    routes = client.smembers(ROUTES_KEY)
+    if routes:
+        client.delete(*[f"{STACKS_KEY_PREFIX}{name}" for name in routes])
+    client.delete(ROUTES_KEY)
+
+
+def capture(seconds: float, interval_ms: Optional[int] = None) -> Counter:
+    """Samples every other thread of this worker for `seconds`; blocks the calling request."""
+    max_seconds = float(getattr(settings, "PROFILER_MAX_CAPTURE_SEC", 30))
+    seconds = max(0.1, min(float(seconds), max_seconds))
+    interval = max(1, int(interval_ms or getattr(settings, "PROFILER_INTERVAL_MS", 20))) / 1000.0
+    max_depth = int(getattr(settings, "PROFILER_MAX_DEPTH", 64))
+    own = threading.get_ident()
+    samples = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                samples[collapse(frame, max_depth)] += 1
+        time.sleep(interval)
+    return samples
+
+
+def to_collapsed(samples: Dict[str, int], prefix: str = "") -> str:
+    lines = []
+    for stack, count in sorted(samples.items(), key=lambda item: -item[1]):
+        lines.append(f"{prefix}{stack} {count}")
+    return "\n".join(lines) + ("\n" if lines else "")
@@ -0,0 +1,274 @@
+import json
+import queue
+import random
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from pymongo import monitoring
+
+from core.utils import utcnow
+
+SLOW_QUERIES_COLLECTION = "mongo_slow_queries"
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+OVERFLOW_SHAPE = "<other>"
+SORT_FIELDS = ("total_ms", "avg_ms", "max_ms", "p95_ms", "p99_ms", "count", "errors", "docs_returned", "docs_examined")
+
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+}
+_IGNORED_COMMANDS = {
+    "explain", "hello", "isMaster", "ismaster", "ping", "buildInfo", "getMore", "killCursors",
+    "endSessions", "saslStart", "saslContinue", "listIndexes", "createIndexes", "insert",
+}
+_EXPLAINABLE = {"find", "aggregate", "count", "distinct"}
+
+
+def normalize(value):
+    """Replaces literal values with '?' and keeps field names and operators, so filters that
+    only differ in their values collapse into one shape."""
+    if isinstance(value, dict):
+        return {key: normalize(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        shapes = [normalize(item) for item in value if isinstance(item, (dict, list, tuple))]
+        return shapes or "?"
+    return "?"
+
+
+def command_shape(command_name: str, command: Dict) -> Optional[str]:
+    if command_name in _IGNORED_COMMANDS:
+        return None
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        return None
+    if command_name == "aggregate":
+        parts = {"pipeline": normalize(command.get("pipeline") or [])}
+    elif command_name in ("update", "delete"):
+        ops = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        parts = {"filter": normalize(ops[0].get("q") or {})}
+    else:
+        parts = {"filter": normalize(command.get(_FILTER_FIELDS.get(command_name, "filter")) or {})}
+        if command.get("sort"):
+            parts["sort"] = sorted(command["sort"])
+    return f"{collection}.{command_name} {json.dumps(parts, sort_keys=True, separators=(',', ':'))}"
+
+
+def _new_stats():
+    return {
+        "count": 0,
+        "errors": 0,
+        "total_ms": 0.0,
+        "max_ms": 0.0,
+        "docs_returned": 0,
+        "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _percentile(buckets: List[int], count: int, pct: float) -> Optional[float]:
+    if not count:
+        return None
+    rank = pct * count
+    seen = 0
+    for idx, bucket_count in enumerate(buckets):
+        seen += bucket_count
+        if seen >= rank:
+            return float(LATENCY_BUCKETS_MS[idx]) if idx < len(LATENCY_BUCKETS_MS) else float("inf")
+    return float("inf")
+
+
+def _docs_returned(reply) -> int:
+    cursor = reply.get("cursor") if isinstance(reply, dict) else None
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or [])
+    if isinstance(reply, dict) and isinstance(reply.get("n"), int):
+        return reply["n"]
+    return 0
+
+
+class QueryStatsCollector(monitoring.CommandListener):
+    """Aggregates per-shape latency over two rotating windows and explains slow shapes off-thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._current = {}
+        self._previous = {}
+        self._window_started = time.monotonic()
+        self._explains = {}
+        self._jobs = None
+
+    def _enabled(self) -> bool:
+        return bool(getattr(settings, "MONGO_QUERY_STATS_ENABLED", True))
+
+    def started(self, event):
+        if not self._enabled():
+            return
+        rate = float(getattr(settings, "MONGO_QUERY_STATS_SAMPLE_RATE", 1.0))
+        if rate < 1.0 and random.random() >= rate:
+            return
+        shape = command_shape(event.command_name, event.command)
+        if shape:
+            self._pending[(event.request_id, event.operation_id)] = (shape, event.command, event.database_name)
+
+    def succeeded(self, event):
+        self._finish(event, False, _docs_returned(event.reply))
+
+    def failed(self, event):
+        self._finish(event, True, 0)
+
+    def _rotate(self, now: float):
+        window = float(getattr(settings, "MONGO_QUERY_STATS_WINDOW_SEC", 300))
+        if now - self._window_started >= window:
+            self._previous = self._current
+            self._current = {}
+            self._window_started = now
+
+    def _finish(self, event, failed: bool, docs_returned: int):
+        pending = self._pending.pop((event.request_id, event.operation_id), None)
+        if not pending:
+            return
+        shape, command, database_name = pending
+        duration_ms = event.duration_micros / 1000.0
+        max_shapes = int(getattr(settings, "MONGO_QUERY_STATS_MAX_SHAPES", 500))
+        with self._lock:
+            self._rotate(time.monotonic())
+            if shape not in self._current and len(self._current) >= max_shapes:
+                shape = OVERFLOW_SHAPE
+            stats = self._current.setdefault(shape, _new_stats())
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            stats["docs_returned"] += docs_returned
+            idx = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if duration_ms <= bound), len(LATENCY_BUCKETS_MS))
+            stats["buckets"][idx] += 1
+        if duration_ms >= float(getattr(settings, "MONGO_SLOW_QUERY_MS", 100)) and shape != OVERFLOW_SHAPE:
+            self._schedule_slow(shape, command, database_name, event.command_name, duration_ms)
+
+    def _schedule_slow(self, shape: str, command: Dict, database_name: str, command_name: str, duration_ms: float):
+        interval = float(getattr(settings, "MONGO_QUERY_EXPLAIN_INTERVAL_SEC", 600))
+        now = time.monotonic()
+        last = self._explains.get(shape)
+        if last and now - last.get("scheduled_at", 0) < interval:
+            return
+        self._explains[shape] = {**(last or {}), "scheduled_at": now}
+        job = (shape, dict(command), database_name, command_name, duration_ms)
+        try:
+            self._job_queue().put_nowait(job)
+        except queue.Full:
+            pass
+
+    def _job_queue(self):
+        if self._jobs is None:
+            with self._lock:
+                if self._jobs is None:
+                    self._jobs = queue.Queue(maxsize=100)
+                    threading.Thread(target=self._run_jobs, name="mongo-query-explain", daemon=True).start()
+        return self._jobs
+
+    def _run_jobs(self):
+        while True:
+            shape, command, database_name, command_name, duration_ms = self._jobs.get()
+            try:
+                self._explain_and_persist(shape, command, database_name, command_name, duration_ms)
+            except Exception:
+                pass
+
+    def _explain_and_persist(self, shape, command, database_name, command_name, duration_ms):
+        from core.db import get_db
+
+        db = get_db().client[database_name]
+        explain = {}
+        if command_name in _EXPLAINABLE:
+            for key in ("lsid", "$db", "$clusterTime", "txnNumber", "$readPreference"):
+                command.pop(key, None)
+            result = db.command("explain", command, verbosity="executionStats")
+            execution = result.get("executionStats") or {}
+            explain = {
+                "plan": _plan_summary(result.get("queryPlanner", {}).get("winningPlan") or {}),
+                "docs_examined": execution.get("totalDocsExamined"),
+                "keys_examined": execution.get("totalKeysExamined"),
+                "n_returned": execution.get("nReturned"),
+            }
+            self._explains[shape] = {**self._explains.get(shape, {}), **explain}
+        if getattr(settings, "MONGO_SLOW_QUERY_PERSIST", False):
+            ttl_hours = int(getattr(settings, "MONGO_SLOW_QUERY_TTL_HOURS", 72))
+            get_db()[SLOW_QUERIES_COLLECTION].insert_one({
+                "shape": shape,
+                "command": command_name,
+                "duration_ms": round(duration_ms, 3),
+                **explain,
+                "created_at": utcnow(),
+                "expires_at": utcnow() + timedelta(hours=ttl_hours),
+            })
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            self._rotate(time.monotonic())
+            merged = {}
+            for window in (self._previous, self._current):
+                for shape, stats in window.items():
+                    target = merged.setdefault(shape, _new_stats())
+                    for key in ("count", "errors", "total_ms", "docs_returned"):
+                        target[key] += stats[key]
+                    target["max_ms"] = max(target["max_ms"], stats["max_ms"])
+                    target["buckets"] = [a + b for a, b in zip(target["buckets"], stats["buckets"])]
+        return merged
+
+    def top(self, limit: int = 20, sort: str = "total_ms") -> List[Dict]:
+        rows = []
+        for shape, stats in self.snapshot().items():
+            count = stats["count"]
+            explain = self._explains.get(shape, {})
+            rows.append({
+                "shape": shape,
+                "count": count,
+                "errors": stats["errors"],
+                "total_ms": round(stats["total_ms"], 3),
+                "avg_ms": round(stats["total_ms"] / count, 3) if count else 0.0,
+                "max_ms": round(stats["max_ms"], 3),
+                "p50_ms": _percentile(stats["buckets"], count, 0.5),
+                "p95_ms": _percentile(stats["buckets"], count, 0.95),
+                "p99_ms": _percentile(stats["buckets"], count, 0.99),
+                "docs_returned": stats["docs_returned"],
+                "plan": explain.get("plan"),
+                "docs_examined": explain.get("docs_examined"),
+                "keys_examined": explain.get("keys_examined"),
+            })
+        rows.sort(key=lambda row: row.get(sort) or 0, reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._current = {}
+            self._previous = {}
+            self._explains = {}
+            self._window_started = time.monotonic()
+
+
+def _plan_summary(plan: Dict) -> str:
+    stages = []
+    while plan:
+        stage = plan.get("stage")
+        if plan.get("indexName"):
+            stage = f"{stage} {plan['indexName']}"
+        if stage:
+            stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+def recent_slow_queries(limit: int = 50):
+    from core.db import get_db
+
+    cursor = get_db()[SLOW_QUERIES_COLLECTION].find({}, {"_id": 0}).sort("created_at", -1).limit(limit)
+    return list(cursor)
+
+
+collector = QueryStatsCollector()
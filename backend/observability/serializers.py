@@ -0,0 +1,7 @@
+from rest_framework import serializers
+
+
+class ProfileCaptureSerializer(serializers.Serializer):
+    seconds = serializers.FloatField(required=False, default=5, min_value=0.1)
+    interval_ms = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+    format = serializers.ChoiceField(choices=["json", "collapsed"], required=False, default="json")
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import path
+
+from observability import profiler, query_stats
+
+
+def _busy_hot_path(duration: float):
+    deadline = time.perf_counter() + duration
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+def _slow_sync_view(request):
+    _busy_hot_path(0.1)
+    return HttpResponse("ok")
+
+
+urlpatterns = [path("slow", _slow_sync_view)]
+
+
+def _asgi_get(application, path: str):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    return messages[0]["status"]
+
+
+class SamplingProfilerTests(SimpleTestCase):
+    def test_samples_calling_thread_while_active(self):
+        sampler = profiler.SamplingProfiler(0.001, 32)
+        self.assertTrue(sampler.begin())
+        self.assertFalse(sampler.begin())
+        _busy_hot_path(0.1)
+        samples = sampler.end()
+        self.assertTrue(any("_busy_hot_path" in stack for stack in samples))
+        self.assertEqual(sampler.end(), {})
+
+    @override_settings(PROFILER_MAX_CAPTURE_SEC=0.05)
+    def test_capture_is_bounded(self):
+        start = time.monotonic()
+        profiler.capture(60, interval_ms=5)
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_collapsed_output(self):
+        text = profiler.to_collapsed({"a;b": 2, "a;c": 5}, prefix="route;")
+        self.assertEqual(text, "route;a;c 5\nroute;a;b 2\n")
+
+
+@override_settings(PROFILER_ENABLED=True, PROFILER_INTERVAL_MS=1, PROFILER_SLOW_MS=50)
+class ProfilingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        profiler._profiler = None
+        self.addCleanup(setattr, profiler, "_profiler", None)
+
+    def _run(self, duration: float):
+        from core.middleware import ProfilingMiddleware
+
+        def view(request):
+            _busy_hot_path(duration)
+            return HttpResponse("ok")
+
+        with patch("observability.profiler.record_slow_request") as record:
+            ProfilingMiddleware(view)(RequestFactory().get("/api/v1/health"))
+        return record
+
+    def test_slow_request_stacks_are_recorded(self):
+        record = self._run(0.1)
+        record.assert_called_once()
+        self.assertTrue(any("_busy_hot_path" in stack for stack in record.call_args[0][1]))
+
+    def test_fast_request_is_discarded(self):
+        self._run(0.0).assert_not_called()
+
+    @override_settings(ROOT_URLCONF="observability.tests", MIDDLEWARE=["core.middleware.ProfilingMiddleware"])
+    def test_asgi_samples_the_thread_running_a_sync_view(self):
+        application = profiler.ProfilingASGIHandler()
+        with patch("observability.profiler.arecord_slow_request", new_callable=AsyncMock) as record:
+            self.assertEqual(_asgi_get(application, "/slow"), 200)
+        record.assert_awaited_once()
+        stacks = record.await_args[0][1]
+        self.assertTrue(stacks)
+        self.assertTrue(all("_slow_sync_view" in stack for stack in stacks))
+        self.assertTrue(any("_busy_hot_path" in stack for stack in stacks))
+
+
+class _CommandEvent:
+    def __init__(self, command_name, command, request_id=1, duration_ms=5.0, reply=None):
+        self.command_name = command_name
+        self.command = {command_name: command.pop("collection"), **command}
+        self.database_name = "hybrid_db"
+        self.request_id = request_id
+        self.operation_id = request_id
+        self.duration_micros = int(duration_ms * 1000)
+        self.reply = reply or {}
+
+
+@override_settings(MONGO_QUERY_STATS_ENABLED=True, MONGO_QUERY_STATS_SAMPLE_RATE=1.0, MONGO_SLOW_QUERY_MS=100)
+class QueryStatsTests(SimpleTestCase):
+    def _run(self, collector, command_name, command, request_id, duration_ms, reply=None):
+        event = _CommandEvent(command_name, command, request_id, duration_ms, reply)
+        collector.started(event)
+        collector.succeeded(event)
+
+    def test_shape_ignores_literal_values(self):
+        first = query_stats.command_shape("find", {"find": "orders", "filter": {"user_id": "a", "status": {"$in": ["X", "Y"]}}})
+        second = query_stats.command_shape("find", {"find": "orders", "filter": {"status": {"$in": ["Z"]}, "user_id": "b"}})
+        self.assertEqual(first, second)
+        self.assertIn("orders.find", first)
+        self.assertNotIn("X", first)
+        self.assertIsNone(query_stats.command_shape("insert", {"insert": "orders", "documents": []}))
+
+    def test_top_orders_shapes_and_reports_percentiles(self):
+        collector = query_stats.QueryStatsCollector()
+        for idx in range(20):
+            self._run(collector, "find", {"collection": "orders", "filter": {"user_id": idx}}, idx, 8.0,
+                      {"cursor": {"firstBatch": [{}, {}]}})
+        self._run(collector, "find", {"collection": "rides", "filter": {"user_id": 1}}, 100, 40.0)
+
+        rows = collector.top(limit=5)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0]["shape"].startswith("orders.find"))
+        self.assertEqual(rows[0]["count"], 20)
+        self.assertEqual(rows[0]["p95_ms"], 10.0)
+        self.assertEqual(rows[0]["docs_returned"], 40)
+        self.assertTrue(collector.top(sort="max_ms")[0]["shape"].startswith("rides.find"))
+
+    @override_settings(MONGO_QUERY_STATS_MAX_SHAPES=1)
+    def test_shape_cardinality_is_bounded(self):
+        collector = query_stats.QueryStatsCollector()
+        self._run(collector, "find", {"collection": "orders", "filter": {"a": 1}}, 1, 1.0)
+        self._run(collector, "find", {"collection": "orders", "filter": {"b": 1}}, 2, 1.0)
+        shapes = {row["shape"] for row in collector.top()}
+        self.assertIn(query_stats.OVERFLOW_SHAPE, shapes)
+        self.assertEqual(len(shapes), 2)
+
+    @override_settings(MONGO_QUERY_EXPLAIN_INTERVAL_SEC=600)
+    def test_slow_shapes_are_explained_once_per_interval(self):
+        collector = query_stats.QueryStatsCollector()
+        with patch.object(collector, "_job_queue") as job_queue:
+            self._run(collector, "find", {"collection": "orders", "filter": {"a": 1}}, 1, 150.0)
+            self._run(collector, "find", {"collection": "orders", "filter": {"a": 2}}, 2, 300.0)
+            self._run(collector, "find", {"collection": "orders", "filter": {"b": 2}}, 3, 20.0)
+        self.assertEqual(job_queue.return_value.put_nowait.call_count, 1)
+
+    def test_explain_records_plan_summary(self):
+        collector = query_stats.QueryStatsCollector()
+        db = MagicMock()
+        db.client.__getitem__.return_value.command.return_value = {
+            "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "user_id_1"}}},
+            "executionStats": {"totalDocsExamined": 3, "totalKeysExamined": 3, "nReturned": 3},
+        }
+        shape = query_stats.command_shape("find", {"find": "orders", "filter": {"user_id": "u"}})
+        with patch("core.db.get_db", return_value=db):
+            collector._explain_and_persist(shape, {"find": "orders", "filter": {"user_id": "u"}, "$db": "x"}, "hybrid_db", "find", 150.0)
+        explain = collector._explains[shape]
+        self.assertEqual(explain["plan"], "FETCH <- IXSCAN user_id_1")
+        self.assertEqual(explain["docs_examined"], 3)
+        db.__getitem__.assert_not_called()
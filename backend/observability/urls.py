@@ -4,4 +4,7 @@ from observability import views
 urlpatterns = [
     path("health", views.HealthView.as_view(), name="health"),
     path("metrics", views.MetricsView.as_view(), name="metrics"),
+    path("observability/mongo/queries", views.MongoQueryStatsView.as_view(), name="mongo-query-stats"),
+    path("observability/profile/stacks", views.ProfileStacksView.as_view(), name="profile-stacks"),
+    path("observability/profile/capture", views.ProfileCaptureView.as_view(), name="profile-capture"),
 ]
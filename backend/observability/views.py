@@ -1,10 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.conf import settings
 from django.http import HttpResponse
 
 from core.db import get_db
+from core.metrics import collect_registry
+from core.permissions import RolePermission
 from core.utils import utcnow
+from observability import profiler
+from observability import query_stats
+from observability.serializers import ProfileCaptureSerializer
 
 try:
     from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
@@ -32,5 +38,66 @@ class MetricsView(APIView):
     def get(self, request):
         if not generate_latest:
             return HttpResponse("prometheus_client not installed", content_type="text/plain", status=501)
-        data = generate_latest()
+        data = generate_latest(collect_registry())
         return HttpResponse(data, content_type=CONTENT_TYPE_LATEST)
+
+
+class ProfileStacksView(APIView):
+    allowed_roles = ["ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    def get(self, request):
+        route = request.query_params.get("route")
+        try:
+            stacks = profiler.slow_request_stacks(route)
+        except Exception:
+            return Response({"detail": "Profile store unavailable"}, status=503)
+        if request.query_params.get("format") == "collapsed":
+            body = "".join(profiler.to_collapsed(samples, prefix=f"{name};") for name, samples in stacks.items())
+            return HttpResponse(body, content_type="text/plain")
+        return Response({"enabled": profiler.enabled(), "routes": stacks})
+
+    def delete(self, request):
+        profiler.clear_slow_request_stacks()
+        return Response({"success": True})
+
+
+class ProfileCaptureView(APIView):
+    allowed_roles = ["ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Sample payload:
+    # {"seconds": 5, "interval_ms": 10, "format": "collapsed"}
+    def post(self, request):
+        serializer = ProfileCaptureSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        samples = profiler.capture(data["seconds"], data.get("interval_ms"))
+        if data["format"] == "collapsed":
+            return HttpResponse(profiler.to_collapsed(samples), content_type="text/plain")
+        return Response({"samples": sum(samples.values()), "stacks": dict(samples.most_common())})
+
+
+class MongoQueryStatsView(APIView):
+    allowed_roles = ["ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 20)), 200))
+        except ValueError:
+            return Response({"detail": "Invalid limit"}, status=400)
+        sort = request.query_params.get("sort", "total_ms")
+        if sort not in query_stats.SORT_FIELDS:
+            return Response({"detail": "Invalid sort"}, status=400)
+        data = {
+            "enabled": bool(getattr(settings, "MONGO_QUERY_STATS_ENABLED", True)),
+            "shapes": query_stats.collector.top(limit=limit, sort=sort),
+        }
+        if request.query_params.get("persisted") in ("1", "true"):
+            data["recent_slow"] = query_stats.recent_slow_queries(limit=limit)
+        return Response(data)
+
+    def delete(self, request):
+        query_stats.collector.reset()
+        return Response({"success": True})
@@ -0,0 +1,10 @@
+from pymongo import ASCENDING, GEOSPHERE, IndexModel
+
+from core.indexes import register
+
+register("orders", [
+    IndexModel([("restaurant_id", ASCENDING), ("status", ASCENDING)], name="orders_restaurant_status"),
+    IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="orders_user_status"),
+    IndexModel([("status", ASCENDING), ("settled", ASCENDING)], name="orders_status_settled"),
+    IndexModel([("pickup_location", GEOSPHERE)], name="orders_pickup_2dsphere"),
+])
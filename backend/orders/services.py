@@ -1,6 +1,9 @@
 from typing import Optional, List, Dict
 from bson import ObjectId
-from core.db import get_db
+from core import identity_map
+from core.db import get_async_db, get_db
+from core.read_models import CAPTAIN_GPS, JOB_TRACKING, RESTAURANT_DISPATCH
+from core.tracing import traced
 from core.utils import utcnow, to_object_id
 from wallet import services as wallet_services
 from payments import services as payment_services
@@ -71,7 +74,7 @@ def calculate_recommended_reward_points(restaurant_id: str, order_items: List[Di
     rid = to_object_id(restaurant_id)
     if not rid:
         return 0
-    restaurant = db.restaurants.find_one({"_id": rid, "is_active": True})
+    restaurant = identity_map.find_one(db.restaurants, {"_id": rid, "is_active": True})
     if not restaurant:
         return 0
     if restaurant.get("is_recommended"):
@@ -95,6 +98,7 @@ def calculate_recommended_reward_points(restaurant_id: str, order_items: List[Di
     return int(adjusted_total // reward_services.REWARD_POINT_VALUE_PAISE)
 
 
+@traced()
 def create_order(
     user_id: str,
     restaurant_id: str,
@@ -107,7 +111,7 @@ def create_order(
     rid = to_object_id(restaurant_id)
     if not rid:
         raise ValueError("Invalid restaurant id")
-    restaurant = db.restaurants.find_one({"_id": rid, "is_active": True})
+    restaurant = identity_map.find_one(db.restaurants, {"_id": rid, "is_active": True})
     if not restaurant:
         raise ValueError("Restaurant not found")
 
@@ -203,6 +207,7 @@ def create_order(
 
     try:
         db.orders.insert_one(order_doc)
+        identity_map.remember("orders", order_doc)
         db.order_items.insert_many([
             {
                 "order_id": order_id,
@@ -235,6 +240,7 @@ def create_order(
                 {"_id": order_id},
                 {"$set": {"razorpay_order_id": razorpay_order.get("id")}},
             )
+            identity_map.invalidate("orders", order_id)
 
         notification_services.send_to_user(
             user_id,
@@ -284,6 +290,7 @@ def create_order(
         raise exc
 
 
+@traced()
 def verify_order_payment(order_id: str, razorpay_order_id: str, razorpay_payment_id: str, razorpay_signature: str):
     db = get_db()
     oid = to_object_id(order_id)
@@ -342,6 +349,7 @@ def award_food_points(order_id: str):
     return txn
 
 
+@traced()
 def reorder(order_id: str, user_id: str, payment_mode: str, wallet_amount: Optional[int], redeem_points: Optional[int] = None):
     db = get_db()
     oid = to_object_id(order_id)
@@ -366,3 +374,63 @@ def reorder(order_id: str, user_id: str, payment_mode: str, wallet_amount: Optio
         wallet_amount=wallet_amount,
         redeem_points=redeem_points,
     )
+
+
+def _can_track(order: dict, user_id: str, role: str, restaurant: Optional[dict]) -> bool:
+    if role == "ADMIN":
+        return True
+    if role == "USER":
+        return str(order.get("user_id")) == str(user_id)
+    if role == "CAPTAIN":
+        return str(order.get("captain_id")) == str(user_id)
+    if role == "RESTAURANT":
+        return bool(restaurant) and str(restaurant.get("owner_id")) == str(user_id)
+    return False
+
+
+def _tracking(order: dict, captain: Optional[dict]):
+    coords = ((captain or {}).get("location") or {}).get("coordinates")
+    return {
+        "order_id": str(order["_id"]),
+        "status": order.get("status"),
+        "captain_id": str(order["captain_id"]) if order.get("captain_id") else None,
+        "location": {"lat": coords[1], "lng": coords[0]} if coords else None,
+        "location_updated_at": (captain or {}).get("last_seen"),
+    }
+
+
+def get_order_tracking(order_id: str, user_id: str, role: str):
+    """Latest status and captain position, for clients that join the tracking socket late."""
+    db = get_db()
+    oid = to_object_id(order_id)
+    if not oid:
+        return None
+    order = db.orders.find_one({"_id": oid}, JOB_TRACKING)
+    if not order:
+        return None
+    restaurant = None
+    if role == "RESTAURANT":
+        restaurant = db.restaurants.find_one({"_id": order.get("restaurant_id")}, RESTAURANT_DISPATCH)
+    if not _can_track(order, user_id, role, restaurant):
+        raise ValueError("Not allowed to track this order")
+    captain = db.captains.find_one({"user_id": order["captain_id"]}, CAPTAIN_GPS) if order.get("captain_id") else None
+    return _tracking(order, captain)
+
+
+async def aget_order_tracking(order_id: str, user_id: str, role: str):
+    db = get_async_db()
+    oid = to_object_id(order_id)
+    if not oid:
+        return None
+    order = await db.orders.find_one({"_id": oid}, JOB_TRACKING)
+    if not order:
+        return None
+    restaurant = None
+    if role == "RESTAURANT":
+        restaurant = await db.restaurants.find_one({"_id": order.get("restaurant_id")}, RESTAURANT_DISPATCH)
+    if not _can_track(order, user_id, role, restaurant):
+        raise ValueError("Not allowed to track this order")
+    captain = None
+    if order.get("captain_id"):
+        captain = await db.captains.find_one({"user_id": order["captain_id"]}, CAPTAIN_GPS)
+    return _tracking(order, captain)
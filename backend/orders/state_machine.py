@@ -4,7 +4,9 @@ from datetime import timedelta
 from django.conf import settings
 from pymongo import ReturnDocument
 
-from core.db import get_db
+from core import identity_map
+from core.db import get_async_db, get_db
+from core.read_models import JOB_STATE
 from core.utils import utcnow, to_object_id
 
 ORDER_STATUSES = {
@@ -35,19 +37,7 @@ def _transition_allowed(current_status: str, new_status: str) -> bool:
     return new_status in allowed
 
 
-def set_order_status(order_id: str, new_status: str, reason: str = None):
-    if new_status not in ORDER_STATUSES:
-        raise ValueError("Invalid order status")
-    db = get_db()
-    oid = to_object_id(order_id)
-    if not oid:
-        return None
-    order = db.orders.find_one({"_id": oid})
-    if not order:
-        return None
-    current = order.get("status")
-    if current == new_status:
-        return order
+def _status_change(current: str, new_status: str, reason: str = None):
     if not _transition_allowed(current, new_status):
         raise ValueError(f"Invalid transition {current} -> {new_status}")
     entry = {
@@ -62,9 +52,47 @@ def set_order_status(order_id: str, new_status: str, reason: str = None):
     }
     if reason:
         update["status_reason"] = reason
+    return {"$set": update, "$push": {"status_history": entry}}
+
+
+def set_order_status(order_id: str, new_status: str, reason: str = None):
+    if new_status not in ORDER_STATUSES:
+        raise ValueError("Invalid order status")
+    db = get_db()
+    oid = to_object_id(order_id)
+    if not oid:
+        return None
+    order = db.orders.find_one({"_id": oid}, JOB_STATE)
+    if not order:
+        return None
+    if order.get("status") == new_status:
+        return order
+    identity_map.invalidate("orders", oid)
     return db.orders.find_one_and_update(
         {"_id": oid},
-        {"$set": update, "$push": {"status_history": entry}},
+        _status_change(order.get("status"), new_status, reason),
+        projection=JOB_STATE,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def aset_order_status(order_id: str, new_status: str, reason: str = None):
+    if new_status not in ORDER_STATUSES:
+        raise ValueError("Invalid order status")
+    db = get_async_db()
+    oid = to_object_id(order_id)
+    if not oid:
+        return None
+    order = await db.orders.find_one({"_id": oid}, JOB_STATE)
+    if not order:
+        return None
+    if order.get("status") == new_status:
+        return order
+    identity_map.invalidate("orders", oid)
+    return await db.orders.find_one_and_update(
+        {"_id": oid},
+        _status_change(order.get("status"), new_status, reason),
+        projection=JOB_STATE,
         return_document=ReturnDocument.AFTER,
     )
 
@@ -85,7 +113,7 @@ def ensure_order_sla(order_doc: dict):
     db = get_db()
     db.orders.update_one({"_id": order_doc.get("_id")}, {"$set": {"sla": sla}})
     _schedule_order_timeouts(str(order_doc.get("_id")), assign_by, deliver_by)
-    return db.orders.find_one({"_id": order_doc.get("_id")})
+    return {**order_doc, "sla": sla}
 
 
 def _schedule_order_timeouts(order_id: str, assign_by, deliver_by):
@@ -107,7 +135,7 @@ def handle_order_assign_timeout(order_id: str):
     oid = to_object_id(order_id)
     if not oid:
         return
-    order = db.orders.find_one({"_id": oid})
+    order = db.orders.find_one({"_id": oid}, JOB_STATE)
     if not order:
         return
     if order.get("status") in {"DELIVERED", "CANCELLED", "FAILED"}:
@@ -122,7 +150,7 @@ def handle_order_delivery_timeout(order_id: str):
     oid = to_object_id(order_id)
     if not oid:
         return
-    order = db.orders.find_one({"_id": oid})
+    order = db.orders.find_one({"_id": oid}, JOB_STATE)
     if not order:
         return
     if order.get("status") in {"DELIVERED", "CANCELLED", "FAILED"}:
@@ -136,7 +164,7 @@ def handle_no_captain(order_id: str):
     oid = to_object_id(order_id)
     if not oid:
         return False
-    order = db.orders.find_one({"_id": oid})
+    order = db.orders.find_one({"_id": oid}, JOB_STATE)
     if not order:
         return False
     retries = int(order.get("matching_retry_count", 0))
@@ -1,11 +1,13 @@
+import asyncio
+import json
 from types import SimpleNamespace
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from bson import ObjectId
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from rest_framework.test import APIRequestFactory, force_authenticate
 
 from orders import services as order_services
-from orders.views import OrderCheckoutView
+from orders.views import AsyncOrderTrackingView, OrderCheckoutView, OrderTrackingView
 
 
 class OrderRewardTests(TestCase):
@@ -62,3 +64,47 @@ class OrderCheckoutRewardTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data["redeem_points_applied"], 10)
         self.assertEqual(response.data["total"], 4000)
+
+
+def _async_collection(find_one=None):
+    return MagicMock(find_one=AsyncMock(return_value=find_one))
+
+
+class OrderTrackingTests(SimpleTestCase):
+    tracking = {
+        "order_id": "o1",
+        "status": "PICKED_UP",
+        "captain_id": "c1",
+        "location": {"lat": 12.9716, "lng": 77.5946},
+        "location_updated_at": None,
+    }
+
+    def _request(self):
+        request = APIRequestFactory().get("/api/v1/orders/tracking/o1")
+        force_authenticate(request, user=SimpleNamespace(id="u1", role="USER", is_authenticated=True))
+        return request
+
+    def test_sync_and_async_views_wrap_tracking_in_an_envelope(self):
+        with patch("orders.views.services.get_order_tracking", return_value=dict(self.tracking)):
+            response = OrderTrackingView.as_view()(self._request(), order_id="o1")
+        response.render()
+        with patch("orders.views.services.aget_order_tracking", AsyncMock(return_value=dict(self.tracking))):
+            async_response = asyncio.run(AsyncOrderTrackingView.as_view()(self._request(), order_id="o1"))
+        self.assertEqual(json.loads(response.content), {"tracking": self.tracking})
+        self.assertEqual(json.loads(async_response.content), {"tracking": self.tracking})
+
+    def test_order_tracking_payload_matches_sync_service(self):
+        captain = {"user_id": ObjectId(), "location": {"type": "Point", "coordinates": [77.5901, 12.9701]}}
+        order = {"_id": ObjectId(), "user_id": ObjectId(), "captain_id": captain["user_id"], "status": "ASSIGNED"}
+        sync_db = MagicMock()
+        sync_db.orders.find_one.return_value = order
+        sync_db.captains.find_one.return_value = captain
+        async_db = MagicMock(orders=_async_collection(find_one=order), captains=_async_collection(find_one=captain))
+        with patch("orders.services.get_db", return_value=sync_db), \
+                patch("orders.services.get_async_db", return_value=async_db):
+            expected = order_services.get_order_tracking(str(order["_id"]), str(order["user_id"]), "USER")
+            tracking = asyncio.run(order_services.aget_order_tracking(str(order["_id"]), str(order["user_id"]), "USER"))
+            with self.assertRaises(ValueError):
+                asyncio.run(order_services.aget_order_tracking(str(order["_id"]), str(ObjectId()), "USER"))
+        self.assertEqual(tracking, expected)
+        self.assertEqual(tracking["location"], {"lat": 12.9701, "lng": 77.5901})
@@ -1,4 +1,5 @@
 from django.urls import path
+from core.async_views import hot_path_view
 from orders import views
 
 urlpatterns = [
@@ -6,4 +7,9 @@ urlpatterns = [
     path("orders/", views.OrderCreateView.as_view(), name="order-create"),
     path("orders/verify-payment/", views.OrderVerifyPaymentView.as_view(), name="order-verify"),
     path("orders/reorder/<str:order_id>", views.OrderReorderView.as_view(), name="order-reorder"),
+    path(
+        "orders/tracking/<str:order_id>",
+        hot_path_view(views.OrderTrackingView, views.AsyncOrderTrackingView),
+        name="order-tracking",
+    ),
 ]
@@ -3,6 +3,8 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
+from core import identity_map
+from core.async_views import AsyncAPIView
 from core.permissions import RolePermission
 from core.utils import serialize_doc
 from orders.serializers import CheckoutSerializer, CreateOrderSerializer, VerifyPaymentSerializer, ReorderSerializer
@@ -38,7 +40,8 @@ class OrderCheckoutView(APIView):
         surge_amount = 0
         try:
             db = get_db()
-            restaurant = db.restaurants.find_one({"_id": to_object_id(serializer.validated_data["restaurant_id"])})
+            rid = to_object_id(serializer.validated_data["restaurant_id"])
+            restaurant = identity_map.find_one(db.restaurants, {"_id": rid})
             pickup_location = restaurant.get("location") if restaurant else None
             if pickup_location and pickup_location.get("coordinates"):
                 surge_data = pricing_services.calculate_surge(
@@ -166,3 +169,35 @@ class OrderReorderView(APIView):
             "items": serialize_doc(items),
             "razorpay_order": razorpay_order,
         }, status=status.HTTP_201_CREATED)
+
+
+def _tracking_response(tracking):
+    if tracking is None:
+        return Response({"detail": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({"tracking": serialize_doc(tracking)})
+
+
+class OrderTrackingView(APIView):
+    allowed_roles = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Example query:
+    # /api/orders/tracking/<order_id>
+    def get(self, request, order_id: str):
+        try:
+            tracking = services.get_order_tracking(order_id, request.user.id, request.user.role)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        return _tracking_response(tracking)
+
+
+class AsyncOrderTrackingView(AsyncAPIView):
+    allowed_roles = ["USER", "CAPTAIN", "RESTAURANT", "ADMIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    async def get(self, request, order_id: str):
+        try:
+            tracking = await services.aget_order_tracking(order_id, request.user.id, request.user.role)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        return _tracking_response(tracking)
@@ -2,6 +2,7 @@ import razorpay
 from django.conf import settings
 
 from core.db import get_db
+from core.tracing import traced
 from core.utils import utcnow
 
 
@@ -17,6 +18,7 @@ def get_client():
     return _client
 
 
+@traced()
 def create_razorpay_order(amount: int, receipt: str, currency: str = "INR"):
     client = get_client()
     order = client.order.create({
@@ -58,6 +60,7 @@ def verify_razorpay_signature(razorpay_order_id: str, razorpay_payment_id: str,
     return True
 
 
+@traced()
 def refund_razorpay_payment(razorpay_payment_id: str, amount: int):
     if not razorpay_payment_id:
         raise ValueError("Invalid payment id")
@@ -0,0 +1,20 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register, retire
+
+register("captain_wallet", [
+    IndexModel([("captain_id", ASCENDING)], unique=True, name="captain_wallet_captain"),
+])
+register("captain_wallet_txns", [
+    IndexModel([("captain_id", ASCENDING), ("created_at", DESCENDING)], name="captain_wallet_txn"),
+])
+register("payouts", [
+    IndexModel(
+        [("captain_id", ASCENDING), ("requested_at", DESCENDING), ("_id", DESCENDING)],
+        name="payouts_captain_requested_id",
+    ),
+])
+retire("payouts", ["payouts_captain_created"])
+register("bank_accounts", [
+    IndexModel([("captain_id", ASCENDING)], unique=True, name="bank_accounts_captain"),
+])
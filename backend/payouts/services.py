@@ -1,26 +1,12 @@
 from typing import Optional
-from pymongo import ReturnDocument, ASCENDING
+from pymongo import ReturnDocument
 
 from core.db import get_db
+from core.pagination import empty_page, paginate
 from core.utils import utcnow, to_object_id
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.captain_wallet.create_index([("captain_id", ASCENDING)], unique=True, name="captain_wallet_captain")
-    db.captain_wallet_txns.create_index([("captain_id", ASCENDING), ("created_at", -1)], name="captain_wallet_txn")
-    db.payouts.create_index([("captain_id", ASCENDING), ("created_at", -1)], name="payouts_captain_created")
-    db.bank_accounts.create_index([("captain_id", ASCENDING)], unique=True, name="bank_accounts_captain")
-    _index_ready = True
-
 
 def _ensure_wallet(captain_id: str):
-    ensure_indexes()
     db = get_db()
     cid = to_object_id(captain_id)
     if not cid:
@@ -39,7 +25,6 @@ def get_wallet(captain_id: str):
 def credit_wallet(captain_id: str, amount: int, reason: str, reference: Optional[str] = None):
     if amount <= 0:
         return None
-    ensure_indexes()
     db = get_db()
     cid = to_object_id(captain_id)
     if not cid:
@@ -66,7 +51,6 @@ def credit_wallet(captain_id: str, amount: int, reason: str, reference: Optional
 def debit_wallet(captain_id: str, amount: int, reason: str, reference: Optional[str] = None):
     if amount <= 0:
         return None
-    ensure_indexes()
     db = get_db()
     cid = to_object_id(captain_id)
     if not cid:
@@ -111,16 +95,15 @@ def request_payout(captain_id: str, amount: int):
     return doc
 
 
-def list_payouts(captain_id: str, limit: int = 50):
+def list_payouts(captain_id: str, limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
     cid = to_object_id(captain_id)
     if not cid:
-        return []
-    return list(db.payouts.find({"captain_id": cid}).sort("requested_at", -1).limit(limit))
+        return empty_page()
+    return paginate(db.payouts, {"captain_id": cid}, limit, cursor, sort_field="requested_at")
 
 
 def link_bank_account(captain_id: str, account_number: str, ifsc: str, name: str, upi: Optional[str] = None):
-    ensure_indexes()
     db = get_db()
     cid = to_object_id(captain_id)
     if not cid:
@@ -40,8 +40,11 @@ class CaptainPayoutHistoryView(APIView):
 
     def get(self, request):
         limit = int(request.query_params.get("limit", 50))
-        payouts = services.list_payouts(request.user.id, limit=limit)
-        return Response({"payouts": serialize_doc(payouts)})
+        try:
+            page = services.list_payouts(request.user.id, limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"payouts": serialize_doc(list(page)), "next_cursor": page.next_cursor})
 
 
 class CaptainBankLinkView(APIView):
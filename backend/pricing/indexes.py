@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("surge_history", [
+    IndexModel([("created_at", ASCENDING)], name="surge_created_at"),
+    IndexModel([("job_type", ASCENDING)], name="surge_job_type"),
+])
@@ -2,27 +2,13 @@ from datetime import datetime
 from typing import Optional
 
 from django.conf import settings
-from pymongo import ASCENDING
 
 from core.db import get_db
-from core.geo_utils import ensure_captain_geo_index, to_point
+from core.geo_utils import to_point
+from core.tracing import traced
 from core.utils import utcnow
 from vehicles import services as vehicle_services
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.surge_history.create_index([("created_at", ASCENDING)], name="surge_created_at")
-    db.surge_history.create_index([("job_type", ASCENDING)], name="surge_job_type")
-    db.orders.create_index([("pickup_location", "2dsphere")], name="orders_pickup_2dsphere")
-    db.rides.create_index([("pickup_location", "2dsphere")], name="rides_pickup_2dsphere")
-    _index_ready = True
-
 
 def _time_factor(now: Optional[datetime] = None):
     now = now or datetime.utcnow()
@@ -54,7 +40,6 @@ def _count_demand(job_type: str, location: dict, radius_m: int):
 
 
 def _count_supply(job_type: str, location: dict, radius_m: int):
-    ensure_captain_geo_index()
     db = get_db()
     query = {
         "is_online": True,
@@ -71,8 +56,8 @@ def _count_supply(job_type: str, location: dict, radius_m: int):
     return db.captains.count_documents(query)
 
 
+@traced()
 def calculate_surge(job_type: str, lat: float, lng: float, store_history: bool = True):
-    ensure_indexes()
     location = to_point(lat, lng)
     radius = settings.CAPTAIN_MATCH_RADIUS_M
     demand = _count_demand(job_type, location, radius)
@@ -0,0 +1,14 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("coupons", [
+    IndexModel([("code", ASCENDING)], unique=True, name="coupons_code"),
+    IndexModel([("expires_at", ASCENDING)], name="coupons_expires"),
+])
+register("campaigns", [
+    IndexModel([("active", ASCENDING), ("starts_at", ASCENDING)], name="campaigns_active"),
+])
+register("referrals", [
+    IndexModel([("referral_code", ASCENDING)], unique=True, name="referrals_code"),
+])
@@ -1,25 +1,11 @@
 from typing import Optional
 from datetime import datetime, timezone
-from pymongo import ReturnDocument, ASCENDING
+from pymongo import ReturnDocument
 
 from core.db import get_db
 from core.utils import utcnow, to_object_id
 from rewards import services as reward_services
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.coupons.create_index([("code", ASCENDING)], unique=True, name="coupons_code")
-    db.coupons.create_index([("expires_at", ASCENDING)], name="coupons_expires")
-    db.campaigns.create_index([("active", ASCENDING), ("starts_at", ASCENDING)], name="campaigns_active")
-    db.referrals.create_index([("referral_code", ASCENDING)], unique=True, name="referrals_code")
-    _index_ready = True
-
 
 def _is_expired(expires_at) -> bool:
     if not expires_at:
@@ -30,7 +16,6 @@ def _is_expired(expires_at) -> bool:
 
 
 def apply_coupon(user_id: str, code: str, amount: int, job_type: str):
-    ensure_indexes()
     db = get_db()
     coupon = db.coupons.find_one({"code": (code or "").upper(), "active": True})
     if not coupon:
@@ -82,7 +67,6 @@ def apply_coupon(user_id: str, code: str, amount: int, job_type: str):
 
 
 def use_referral(user_id: str, referral_code: str):
-    ensure_indexes()
     db = get_db()
     referral = db.referrals.find_one({"referral_code": referral_code})
     if not referral:
@@ -105,7 +89,6 @@ def use_referral(user_id: str, referral_code: str):
 
 
 def list_active_campaigns(limit: int = 50):
-    ensure_indexes()
     db = get_db()
     now = utcnow()
     cursor = db.campaigns.find({
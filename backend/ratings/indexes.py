@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("captain_ratings", [
+    IndexModel([("captain_id", ASCENDING), ("created_at", ASCENDING)], name="captain_ratings_by_captain"),
+    IndexModel([("job_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="captain_ratings_unique_job_user"),
+])
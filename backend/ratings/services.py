@@ -1,22 +1,9 @@
 from typing import Optional
-from pymongo import ASCENDING
 from pymongo.errors import DuplicateKeyError
 
 from core.db import get_db
 from core.utils import utcnow, to_object_id
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.captain_ratings.create_index([("captain_id", ASCENDING), ("created_at", ASCENDING)], name="captain_ratings_by_captain")
-    db.captain_ratings.create_index([("job_id", ASCENDING), ("user_id", ASCENDING)], unique=True, name="captain_ratings_unique_job_user")
-    _index_ready = True
-
 
 def _get_job(job_type: str, job_id: str):
     db = get_db()
@@ -31,7 +18,6 @@ def _get_job(job_type: str, job_id: str):
 
 
 def rate_captain(user_id: str, job_type: str, job_id: str, rating: int, comment: Optional[str] = None):
-    ensure_indexes()
     db = get_db()
     job_doc = _get_job(job_type, job_id)
     if not job_doc:
@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("recommendations", [
+    IndexModel([("type", ASCENDING), ("reference_id", ASCENDING)], name="recommendations_type_ref"),
+    IndexModel([("created_at", ASCENDING)], name="recommendations_created_at"),
+])
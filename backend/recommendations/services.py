@@ -1,5 +1,4 @@
 from typing import List, Dict, Optional
-from pymongo import ASCENDING
 
 from core.db import get_db
 from core.utils import utcnow, to_object_id
@@ -7,21 +6,6 @@ from rewards.services import REWARD_POINT_VALUE_PAISE
 
 RECOMMENDATION_TYPES = {"RESTAURANT", "MENU_ITEM"}
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.recommendations.create_index(
-        [("type", ASCENDING), ("reference_id", ASCENDING)],
-        name="recommendations_type_ref",
-    )
-    db.recommendations.create_index([("created_at", ASCENDING)], name="recommendations_created_at")
-    _index_ready = True
-
 
 def _get_reference(rec_type: str, reference_id: str):
     db = get_db()
@@ -42,7 +26,6 @@ def create_recommendation(
     title: str,
     description: Optional[str],
 ):
-    ensure_indexes()
     rec_type = (rec_type or "").upper()
     if rec_type not in RECOMMENDATION_TYPES:
         raise ValueError("Invalid recommendation type")
@@ -0,0 +1,13 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("restaurant_stats", [
+    IndexModel([("restaurant_id", ASCENDING)], name="restaurant_stats_restaurant"),
+])
+register("restaurant_orders", [
+    IndexModel([("order_id", ASCENDING)], unique=True, name="restaurant_orders_order"),
+])
+register("inventory", [
+    IndexModel([("menu_item_id", ASCENDING)], unique=True, name="inventory_menu_item"),
+])
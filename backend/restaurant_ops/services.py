@@ -1,22 +1,8 @@
 from typing import Optional
-from pymongo import ASCENDING
 
-from core.db import get_db
+from core.db import ANALYTICS, get_db
 from core.utils import utcnow, to_object_id
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.restaurant_stats.create_index([("restaurant_id", ASCENDING)], name="restaurant_stats_restaurant")
-    db.restaurant_orders.create_index([("order_id", ASCENDING)], unique=True, name="restaurant_orders_order")
-    db.inventory.create_index([("menu_item_id", ASCENDING)], unique=True, name="inventory_menu_item")
-    _index_ready = True
-
 
 def update_order_status(order_id: str, status: str, prep_time_min: Optional[int] = None):
     db = get_db()
@@ -50,7 +36,7 @@ def toggle_menu_item(menu_item_id: str, is_available: bool):
 
 
 def get_analytics(restaurant_id: str):
-    db = get_db()
+    db = get_db(ANALYTICS)
     rid = to_object_id(restaurant_id)
     if not rid:
         return None
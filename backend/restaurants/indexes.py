@@ -0,0 +1,11 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("restaurants", [
+    IndexModel([("is_recommended", ASCENDING)], name="restaurants_is_recommended"),
+])
+register("menu_items", [
+    IndexModel([("restaurant_id", ASCENDING), ("is_available", ASCENDING)], name="menu_items_restaurant_available"),
+    IndexModel([("is_recommended", ASCENDING)], name="menu_items_is_recommended"),
+])
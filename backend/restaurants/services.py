@@ -1,7 +1,8 @@
 import logging
 from typing import Optional, List
-from pymongo import ASCENDING, ReturnDocument
+from pymongo import ReturnDocument
 
+from core import identity_map
 from core.db import get_db
 from core.utils import utcnow, to_object_id
 
@@ -37,18 +38,6 @@ RESTAURANT_PROFILE_BLOCKED_FIELDS = {
 }
 from core.geo_utils import to_point
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.restaurants.create_index([("is_recommended", ASCENDING)], name="restaurants_is_recommended")
-    db.menu_items.create_index([("is_recommended", ASCENDING)], name="menu_items_is_recommended")
-    _index_ready = True
-
 
 def create_restaurant(
     owner_id: str,
@@ -114,17 +103,16 @@ def list_menu_items(restaurant_id: str):
 
 
 def set_restaurant_recommended(restaurant_id: str, is_recommended: bool):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(restaurant_id)
     if not oid:
         return None
     db.restaurants.update_one({"_id": oid}, {"$set": {"is_recommended": bool(is_recommended)}})
+    identity_map.invalidate("restaurants", oid)
     return db.restaurants.find_one({"_id": oid})
 
 
 def set_menu_item_recommended(menu_item_id: str, is_recommended: bool):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(menu_item_id)
     if not oid:
@@ -134,14 +122,12 @@ def set_menu_item_recommended(menu_item_id: str, is_recommended: bool):
 
 
 def list_recommended_restaurants(limit: int = 50):
-    ensure_indexes()
     db = get_db()
     cursor = db.restaurants.find({"is_active": True, "is_recommended": True}).limit(limit)
     return list(cursor)
 
 
 def list_recommended_menu_items(limit: int = 50):
-    ensure_indexes()
     db = get_db()
     cursor = db.menu_items.find({"is_available": True, "is_recommended": True}).limit(limit)
     return list(cursor)
@@ -160,5 +146,6 @@ def update_restaurant_profile(owner_id: str, updates: dict):
         return_document=ReturnDocument.AFTER,
     )
     if updated:
+        identity_map.invalidate("restaurants", updated["_id"])
         logger.info("restaurant_profile_updated owner_id=%s fields=%s", owner_id, sorted(updates.keys()))
     return updated
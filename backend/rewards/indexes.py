@@ -0,0 +1,7 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("user_rewards", [
+    IndexModel([("user_id", ASCENDING), ("used", ASCENDING), ("created_at", ASCENDING)], name="user_rewards_user_used_created"),
+])
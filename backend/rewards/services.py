@@ -1,7 +1,8 @@
 from typing import Optional
-from pymongo import ReturnDocument, ASCENDING
+from pymongo import ReturnDocument
 
 from core.db import get_db
+from core.tracing import traced
 from core.utils import utcnow, to_object_id
 
 REWARD_POINT_VALUE_PAISE = 100
@@ -9,20 +10,6 @@ REWARD_SOURCE_RECOMMENDATION = "RECOMMENDATION"
 REWARD_SOURCE_ADMIN_RECOMMENDATION = "ADMIN_RECOMMENDATION"
 REWARD_SOURCE_EV_RIDE = "EV_RIDE"
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.user_rewards.create_index(
-        [("user_id", ASCENDING), ("used", ASCENDING), ("created_at", ASCENDING)],
-        name="user_rewards_user_used_created",
-    )
-    _index_ready = True
-
 
 def get_reward_balance(user_id: str) -> int:
     db = get_db()
@@ -48,10 +35,10 @@ def calculate_redeemable_points(user_id: str, total_amount_paise: int, requested
     return points_to_redeem, redeem_amount, available
 
 
+@traced()
 def credit_reward_points(user_id: str, points: int, source: str, related_order: Optional[str] = None):
     if points <= 0:
         return None
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -78,10 +65,10 @@ def credit_reward_points(user_id: str, points: int, source: str, related_order:
     return doc
 
 
+@traced()
 def redeem_reward_points(user_id: str, points: int, related_order: Optional[str] = None):
     if points <= 0:
         return None
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
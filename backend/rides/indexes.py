@@ -0,0 +1,9 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+
+from core.indexes import register
+
+register("rides", [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="rides_user_created"),
+    IndexModel([("status", ASCENDING), ("settled", ASCENDING)], name="rides_status_settled"),
+    IndexModel([("pickup_location", GEOSPHERE)], name="rides_pickup_2dsphere"),
+])
@@ -4,7 +4,9 @@ from datetime import timedelta
 from django.conf import settings
 from pymongo import ReturnDocument
 
-from core.db import get_db
+from core import identity_map
+from core.db import get_async_db, get_db
+from core.read_models import JOB_STATE
 from core.utils import utcnow, to_object_id
 
 RIDE_STATUSES = {
@@ -35,19 +37,7 @@ def _transition_allowed(current_status: str, new_status: str) -> bool:
     return new_status in allowed
 
 
-def set_ride_status(ride_id: str, new_status: str, reason: str = None):
-    if new_status not in RIDE_STATUSES:
-        raise ValueError("Invalid ride status")
-    db = get_db()
-    oid = to_object_id(ride_id)
-    if not oid:
-        return None
-    ride = db.rides.find_one({"_id": oid})
-    if not ride:
-        return None
-    current = ride.get("status")
-    if current == new_status:
-        return ride
+def _status_change(current: str, new_status: str, reason: str = None):
     if not _transition_allowed(current, new_status):
         raise ValueError(f"Invalid transition {current} -> {new_status}")
     entry = {
@@ -62,9 +52,47 @@ def set_ride_status(ride_id: str, new_status: str, reason: str = None):
     }
     if reason:
         update["status_reason"] = reason
+    return {"$set": update, "$push": {"status_history": entry}}
+
+
+def set_ride_status(ride_id: str, new_status: str, reason: str = None):
+    if new_status not in RIDE_STATUSES:
+        raise ValueError("Invalid ride status")
+    db = get_db()
+    oid = to_object_id(ride_id)
+    if not oid:
+        return None
+    ride = db.rides.find_one({"_id": oid}, JOB_STATE)
+    if not ride:
+        return None
+    if ride.get("status") == new_status:
+        return ride
+    identity_map.invalidate("rides", oid)
     return db.rides.find_one_and_update(
         {"_id": oid},
-        {"$set": update, "$push": {"status_history": entry}},
+        _status_change(ride.get("status"), new_status, reason),
+        projection=JOB_STATE,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def aset_ride_status(ride_id: str, new_status: str, reason: str = None):
+    if new_status not in RIDE_STATUSES:
+        raise ValueError("Invalid ride status")
+    db = get_async_db()
+    oid = to_object_id(ride_id)
+    if not oid:
+        return None
+    ride = await db.rides.find_one({"_id": oid}, JOB_STATE)
+    if not ride:
+        return None
+    if ride.get("status") == new_status:
+        return ride
+    identity_map.invalidate("rides", oid)
+    return await db.rides.find_one_and_update(
+        {"_id": oid},
+        _status_change(ride.get("status"), new_status, reason),
+        projection=JOB_STATE,
         return_document=ReturnDocument.AFTER,
     )
 
@@ -85,7 +113,7 @@ def ensure_ride_sla(ride_doc: dict):
     db = get_db()
     db.rides.update_one({"_id": ride_doc.get("_id")}, {"$set": {"sla": sla}})
     _schedule_ride_timeouts(str(ride_doc.get("_id")), assign_by, complete_by)
-    return db.rides.find_one({"_id": ride_doc.get("_id")})
+    return {**ride_doc, "sla": sla}
 
 
 def _schedule_ride_timeouts(ride_id: str, assign_by, complete_by):
@@ -107,7 +135,7 @@ def handle_ride_assign_timeout(ride_id: str):
     oid = to_object_id(ride_id)
     if not oid:
         return
-    ride = db.rides.find_one({"_id": oid})
+    ride = db.rides.find_one({"_id": oid}, JOB_STATE)
     if not ride:
         return
     if ride.get("status") in {"COMPLETED", "CANCELLED", "FAILED"}:
@@ -122,7 +150,7 @@ def handle_ride_complete_timeout(ride_id: str):
     oid = to_object_id(ride_id)
     if not oid:
         return
-    ride = db.rides.find_one({"_id": oid})
+    ride = db.rides.find_one({"_id": oid}, JOB_STATE)
     if not ride:
         return
     if ride.get("status") in {"COMPLETED", "CANCELLED", "FAILED"}:
@@ -136,7 +164,7 @@ def handle_no_captain(ride_id: str):
     oid = to_object_id(ride_id)
     if not oid:
         return False
-    ride = db.rides.find_one({"_id": oid})
+    ride = db.rides.find_one({"_id": oid}, JOB_STATE)
     if not ride:
         return False
     retries = int(ride.get("matching_retry_count", 0))
@@ -4,3 +4,16 @@ from rest_framework import serializers
 class RouteOptimizeSerializer(serializers.Serializer):
     points = serializers.ListField(child=serializers.DictField(), allow_empty=False)
     clusters = serializers.IntegerField(required=False, min_value=1, max_value=10)
+    time_budget_ms = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+
+
+class BatchStopSerializer(serializers.Serializer):
+    lat = serializers.FloatField()
+    lng = serializers.FloatField()
+    order_id = serializers.CharField(required=False)
+    kind = serializers.ChoiceField(choices=["PICKUP", "DROPOFF"], required=False)
+
+
+class BatchRouteOptimizeSerializer(serializers.Serializer):
+    stops = BatchStopSerializer(many=True, required=False)
+    time_budget_ms = serializers.IntegerField(required=False, min_value=1, max_value=1000)
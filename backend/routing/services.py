@@ -1,56 +1,180 @@
-import math
+import time
 from typing import List, Optional
 
 import numpy as np
-from sklearn.cluster import KMeans
+from django.conf import settings
 
-from rides.services import haversine_km
+from core.db import get_db
+from core.geometry import distance_matrix_km
+from core.utils import to_object_id
 
+STOP_PICKUP = "PICKUP"
+STOP_DROPOFF = "DROPOFF"
+_IMPROVEMENT_EPS = 1e-9
 
-def _nearest_route(points: List[dict]):
-    if not points:
-        return []
-    remaining = points[:]
-    route = [remaining.pop(0)]
+
+def _precedence(stops: List[dict], offset: int) -> np.ndarray:
+    # pred[node] is the node that has to be visited before it (pickup before dropoff), or -1.
+    pred = np.full(len(stops) + offset + 1, -1, dtype=np.int64)
+    pickups = {}
+    for idx, stop in enumerate(stops):
+        if str(stop.get("kind") or "").upper() == STOP_PICKUP and stop.get("order_id") is not None:
+            pickups[str(stop["order_id"])] = idx + offset
+    for idx, stop in enumerate(stops):
+        if str(stop.get("kind") or "").upper() == STOP_DROPOFF and stop.get("order_id") is not None:
+            pickup = pickups.get(str(stop["order_id"]))
+            if pickup is not None:
+                pred[idx + offset] = pickup
+    return pred
+
+
+def _is_feasible(route: List[int], pred: np.ndarray) -> bool:
+    pos = np.empty(len(pred), dtype=np.int64)
+    pos[route] = np.arange(len(route))
+    nodes = np.asarray(route)
+    required = pred[nodes]
+    mask = required >= 0
+    return bool(np.all(pos[required[mask]] < pos[nodes[mask]]))
+
+
+def _nearest_neighbour(start: int, nodes: List[int], matrix: np.ndarray, pred: np.ndarray) -> List[int]:
+    route = [start]
+    visited = {start}
+    remaining = list(nodes)
     while remaining:
-        last = route[-1]
-        next_idx = 0
-        best_dist = float("inf")
-        for idx, pt in enumerate(remaining):
-            dist = haversine_km(last["lat"], last["lng"], pt["lat"], pt["lng"])
-            if dist < best_dist:
-                best_dist = dist
-                next_idx = idx
-        route.append(remaining.pop(next_idx))
+        ready = [n for n in remaining if pred[n] < 0 or pred[n] in visited]
+        if not ready:
+            ready = remaining
+        dists = matrix[route[-1], ready]
+        nxt = ready[int(np.argmin(dists))]
+        route.append(nxt)
+        visited.add(nxt)
+        remaining.remove(nxt)
     return route
 
 
-def optimize_route(points: List[dict], clusters: Optional[int] = None):
-    if len(points) <= 2:
-        return points
+def _two_opt_pass(route: List[int], matrix: np.ndarray, pred: np.ndarray, deadline: float) -> bool:
+    arr = np.asarray(route)
+    size = len(route)
+    for i in range(1, size - 2):
+        if time.perf_counter() > deadline:
+            return False
+        ks = np.arange(i + 1, size - 1)
+        a, b = arr[i - 1], arr[i]
+        c, d = arr[ks], arr[ks + 1]
+        delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+        for idx in np.argsort(delta):
+            if delta[idx] >= -_IMPROVEMENT_EPS:
+                break
+            k = int(ks[idx])
+            segment = set(route[i:k + 1])
+            if any(pred[n] in segment for n in segment):
+                continue
+            route[i:k + 1] = route[i:k + 1][::-1]
+            return True
+    return False
+
+
+def _or_opt_pass(route: List[int], matrix: np.ndarray, pred: np.ndarray, deadline: float) -> bool:
+    size = len(route)
+    for seg_len in (1, 2, 3):
+        for i in range(1, size - seg_len):
+            if time.perf_counter() > deadline:
+                return False
+            segment = route[i:i + seg_len]
+            first, last = segment[0], segment[-1]
+            prev, nxt = route[i - 1], route[i + seg_len]
+            removal = matrix[prev, nxt] - matrix[prev, first] - matrix[last, nxt]
+            rest = np.asarray(route[:i] + route[i + seg_len:])
+            left, right = rest[:-1], rest[1:]
+            delta = removal + matrix[left, first] + matrix[last, right] - matrix[left, right]
+            delta[i - 1] = 0.0
+            for j in np.argsort(delta):
+                if delta[j] >= -_IMPROVEMENT_EPS:
+                    break
+                candidate = rest[:j + 1].tolist() + segment + rest[j + 1:].tolist()
+                if not _is_feasible(candidate, pred):
+                    continue
+                route[:] = candidate
+                return True
+    return False
 
-    pts = np.array([[p["lat"], p["lng"]] for p in points])
-    k = clusters or max(1, min(5, int(math.sqrt(len(points)))))
-    if k > len(points):
-        k = len(points)
 
-    kmeans = KMeans(n_clusters=k, n_init=10, random_state=42)
-    labels = kmeans.fit_predict(pts)
+def _solve(coords: np.ndarray, start: int, nodes: List[int], pred: np.ndarray, time_budget_ms: Optional[int]):
+    budget = time_budget_ms or int(getattr(settings, "ROUTE_OPTIMIZER_TIME_BUDGET_MS", 50))
+    deadline = time.perf_counter() + budget / 1000.0
+
+    # The trailing dummy node sits at zero distance from every stop, which turns the
+    # open path into a closed tour so 2-opt and Or-opt need no end-of-route special cases.
+    matrix = np.zeros((len(coords) + 1, len(coords) + 1))
+    matrix[:-1, :-1] = distance_matrix_km(coords)
+    end = len(coords)
+
+    route = _nearest_neighbour(start, nodes, matrix, pred) + [end]
+    while time.perf_counter() < deadline:
+        if _two_opt_pass(route, matrix, pred, deadline):
+            continue
+        if _or_opt_pass(route, matrix, pred, deadline):
+            continue
+        break
+    route = route[:-1]
+    distance_km = float(matrix[route[:-1], route[1:]].sum()) if len(route) > 1 else 0.0
+    return route, distance_km
+
+
+def _order_stops(stops: List[dict], start: Optional[dict], time_budget_ms: Optional[int]):
+    offset = 1 if start else 0
+    coords = np.array(
+        ([[float(start["lat"]), float(start["lng"])]] if start else [])
+        + [[float(s["lat"]), float(s["lng"])] for s in stops]
+    )
+    pred = _precedence(stops, offset)
+    first = 0 if start else next((idx for idx in range(len(stops)) if pred[idx] < 0), 0)
+    nodes = [idx for idx in range(len(coords)) if idx != first]
+    route, distance_km = _solve(coords, first, nodes, pred, time_budget_ms)
+    return [stops[idx - offset] for idx in route[offset:]], distance_km
+
+
+def optimize_route(points: List[dict], clusters: Optional[int] = None, time_budget_ms: Optional[int] = None):
+    # `clusters` is kept for API compatibility; the KMeans pre-clustering it used to drive
+    # has been replaced by local search over the full distance matrix.
+    if len(points) <= 2:
+        return points
+    ordered, _ = _order_stops(points, None, time_budget_ms)
+    return ordered
 
-    clustered = {}
-    for idx, label in enumerate(labels):
-        clustered.setdefault(label, []).append(points[idx])
 
-    centers = kmeans.cluster_centers_
-    center_points = [
-        {"lat": centers[i][0], "lng": centers[i][1], "label": i}
-        for i in range(len(centers))
-    ]
+def optimize_batch_route(stops: List[dict], start: Optional[dict] = None, time_budget_ms: Optional[int] = None):
+    if not stops:
+        return {"stops": [], "distance_km": 0.0}
+    ordered, distance_km = _order_stops(stops, start, time_budget_ms)
+    return {"stops": ordered, "distance_km": round(distance_km, 3)}
 
-    ordered_centers = _nearest_route(center_points)
-    optimized = []
-    for center in ordered_centers:
-        cluster_points = clustered.get(center["label"], [])
-        optimized.extend(_nearest_route(cluster_points))
 
-    return optimized
+def build_captain_batch(user_id: str):
+    db = get_db()
+    oid = to_object_id(user_id)
+    if not oid:
+        return None, []
+    captain = db.captains.find_one({"user_id": oid}, {"location": 1, "batched_order_ids": 1})
+    if not captain:
+        return None, []
+    start = None
+    coords = (captain.get("location") or {}).get("coordinates")
+    if coords:
+        start = {"lat": coords[1], "lng": coords[0]}
+    order_ids = captain.get("batched_order_ids") or []
+    if not order_ids:
+        return start, []
+    stops = []
+    for order in db.orders.find({"_id": {"$in": order_ids}}, {"pickup_location": 1}):
+        pickup = (order.get("pickup_location") or {}).get("coordinates")
+        if not pickup:
+            continue
+        stops.append({
+            "order_id": str(order["_id"]),
+            "kind": STOP_PICKUP,
+            "lat": pickup[1],
+            "lng": pickup[0],
+        })
+    return start, stops
@@ -1,2 +1,51 @@
+import random
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+from bson import ObjectId
 from django.test import TestCase
 
+from core.geometry import distance_matrix_km
+from routing import services as routing_services
+
+
+def _path_km(points):
+    matrix = distance_matrix_km(np.array([[p["lat"], p["lng"]] for p in points]))
+    return float(sum(matrix[idx, idx + 1] for idx in range(len(points) - 1)))
+
+
+class RouteOptimizerTests(TestCase):
+    def test_optimize_route_keeps_all_points_and_shortens_path(self):
+        rng = random.Random(7)
+        points = [{"lat": 12.9 + rng.random() * 0.2, "lng": 77.5 + rng.random() * 0.2} for _ in range(30)]
+        optimized = routing_services.optimize_route(points, time_budget_ms=200)
+        self.assertEqual(len(optimized), len(points))
+        self.assertCountEqual([id(p) for p in optimized], [id(p) for p in points])
+        self.assertLess(_path_km(optimized), _path_km(points))
+
+    def test_batch_route_visits_pickup_before_dropoff(self):
+        rng = random.Random(11)
+        stops = []
+        for idx in range(6):
+            stops.append({"order_id": str(idx), "kind": "DROPOFF", "lat": 12.9 + rng.random() * 0.1, "lng": 77.5 + rng.random() * 0.1})
+            stops.append({"order_id": str(idx), "kind": "PICKUP", "lat": 12.9 + rng.random() * 0.1, "lng": 77.5 + rng.random() * 0.1})
+        result = routing_services.optimize_batch_route(stops, start={"lat": 12.95, "lng": 77.55}, time_budget_ms=200)
+        position = {(stop["order_id"], stop["kind"]): idx for idx, stop in enumerate(result["stops"])}
+        self.assertEqual(len(result["stops"]), len(stops))
+        for idx in range(6):
+            self.assertLess(position[(str(idx), "PICKUP")], position[(str(idx), "DROPOFF")])
+
+    def test_build_captain_batch_uses_order_pickups(self):
+        order_id = ObjectId()
+        fake_db = MagicMock()
+        fake_db.captains.find_one.return_value = {
+            "location": {"type": "Point", "coordinates": [77.59, 12.97]},
+            "batched_order_ids": [order_id],
+        }
+        fake_db.orders.find.return_value = [
+            {"_id": order_id, "pickup_location": {"type": "Point", "coordinates": [77.6, 12.95]}},
+        ]
+        with patch("routing.services.get_db", return_value=fake_db):
+            start, stops = routing_services.build_captain_batch(str(ObjectId()))
+        self.assertEqual(start, {"lat": 12.97, "lng": 77.59})
+        self.assertEqual(stops, [{"order_id": str(order_id), "kind": "PICKUP", "lat": 12.95, "lng": 77.6}])
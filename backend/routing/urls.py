@@ -3,4 +3,5 @@ from routing import views
 
 urlpatterns = [
     path("route/optimize/", views.RouteOptimizeView.as_view(), name="route-optimize"),
+    path("route/optimize/batch/", views.BatchRouteOptimizeView.as_view(), name="route-optimize-batch"),
 ]
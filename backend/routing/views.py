@@ -4,7 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 
 from core.permissions import RolePermission
-from routing.serializers import RouteOptimizeSerializer
+from routing.serializers import RouteOptimizeSerializer, BatchRouteOptimizeSerializer
 from routing import services
 
 
@@ -18,5 +18,31 @@ class RouteOptimizeView(APIView):
         serializer = RouteOptimizeSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         points = serializer.validated_data["points"]
-        optimized = services.optimize_route(points, serializer.validated_data.get("clusters"))
+        optimized = services.optimize_route(
+            points,
+            serializer.validated_data.get("clusters"),
+            serializer.validated_data.get("time_budget_ms"),
+        )
         return Response({"optimized": optimized}, status=status.HTTP_200_OK)
+
+
+class BatchRouteOptimizeView(APIView):
+    allowed_roles = ["CAPTAIN"]
+    permission_classes = [IsAuthenticated, RolePermission]
+
+    # Sample payload (omit "stops" to use the pickups of the captain's batched orders):
+    # {"stops": [{"order_id": "<order_id>", "kind": "PICKUP", "lat": 12.97, "lng": 77.59},
+    #            {"order_id": "<order_id>", "kind": "DROPOFF", "lat": 12.95, "lng": 77.6}]}
+    def post(self, request):
+        serializer = BatchRouteOptimizeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        start, batch_stops = services.build_captain_batch(request.user.id)
+        stops = serializer.validated_data.get("stops")
+        if stops is None:
+            stops = batch_stops
+        result = services.optimize_batch_route(
+            stops,
+            start=start,
+            time_budget_ms=serializer.validated_data.get("time_budget_ms"),
+        )
+        return Response({"route": result}, status=status.HTTP_200_OK)
@@ -0,0 +1,126 @@
+"""Concurrent-connection capacity of one worker on the hot endpoints.
+
+Start a single ASGI worker twice, once per view stack, and run this against each:
+
+    RATE_LIMIT_ENABLED=0 ASYNC_HOT_VIEWS=0 uvicorn core.asgi:application --workers 1 --port 8000
+    RATE_LIMIT_ENABLED=0 ASYNC_HOT_VIEWS=1 uvicorn core.asgi:application --workers 1 --port 8000
+
+    python scripts/benchmark_async_views.py --token <captain JWT> --endpoint location
+    python scripts/benchmark_async_views.py --token <user JWT> --endpoint nearby
+    python scripts/benchmark_async_views.py --token <user JWT> --endpoint tracking --order-id <id>
+
+Capacity is the highest concurrency whose p95 stays under --slo-ms with under 1% errors.
+Pass --record scripts/benchmark_results.md --label "<stack, host>" to append the table there.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+ENDPOINTS = {
+    "location": ("POST", "/api/v1/captain/location/"),
+    "nearby": ("GET", "/api/v1/captain/nearby"),
+    "tracking": ("GET", "/api/v1/orders/tracking/{order_id}"),
+}
+
+
+def _percentile(values, pct: float):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+async def _worker(client, method: str, path: str, params: dict, body: dict, deadline: float, latencies, errors):
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, path, params=params, json=body)
+            if resp.status_code >= 400:
+                errors.append(resp.status_code)
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+        except httpx.HTTPError as exc:
+            errors.append(type(exc).__name__)
+
+
+async def _run_level(args, concurrency: int):
+    method, path = ENDPOINTS[args.endpoint]
+    path = path.format(order_id=args.order_id)
+    params = {"lat": args.lat, "lng": args.lng, "radius_m": 3000} if args.endpoint == "nearby" else None
+    body = {"lat": args.lat, "lng": args.lng} if method == "POST" else None
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+    async with httpx.AsyncClient(
+        base_url=args.base_url,
+        headers={"Authorization": f"Bearer {args.token}"},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*[
+            _worker(client, method, path, params, body, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+    total = len(latencies) + len(errors)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": total / args.duration,
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "error_rate": len(errors) / total if total else 1.0,
+    }
+
+
+def _record(args, rows, capacity: int):
+    lines = [
+        f"\n## {args.endpoint}: {args.label or 'unlabelled run'}\n",
+        f"duration {args.duration:.0f}s per level, SLO p95 <= {args.slo_ms:.0f}ms, capacity {capacity}\n\n",
+        "| conc | requests | rps | p50 ms | p95 ms | p99 ms | errors |\n",
+        "|---:|---:|---:|---:|---:|---:|---:|\n",
+    ]
+    for row in rows:
+        lines.append(
+            f"| {row['concurrency']} | {row['requests']} | {row['rps']:.1f} | {row['p50']:.1f} | "
+            f"{row['p95']:.1f} | {row['p99']:.1f} | {row['error_rate']:.1%} |\n"
+        )
+    with open(args.record, "a", encoding="utf-8") as handle:
+        handle.writelines(lines)
+
+
+async def main(args):
+    print(f"{'conc':>6} {'requests':>9} {'rps':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'errors':>7}")
+    capacity = 0
+    rows = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        row = await _run_level(args, concurrency)
+        rows.append(row)
+        print(
+            f"{row['concurrency']:>6} {row['requests']:>9} {row['rps']:>8.1f} {row['p50']:>8.1f} "
+            f"{row['p95']:>8.1f} {row['p99']:>8.1f} {row['error_rate']:>7.1%}"
+        )
+        if row["p95"] <= args.slo_ms and row["error_rate"] < 0.01:
+            capacity = concurrency
+    print(f"capacity: {capacity} concurrent connections within p95 <= {args.slo_ms:.0f}ms")
+    if args.record:
+        _record(args, rows, capacity)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="nearby")
+    parser.add_argument("--order-id", default="")
+    parser.add_argument("--lat", type=float, default=12.9716)
+    parser.add_argument("--lng", type=float, default=77.5946)
+    parser.add_argument("--concurrency", default="10,50,100,200,400,800")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--slo-ms", type=float, default=250.0)
+    parser.add_argument("--record", default="")
+    parser.add_argument("--label", default="")
+    asyncio.run(main(parser.parse_args()))
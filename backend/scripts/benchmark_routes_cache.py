@@ -0,0 +1,45 @@
+import timeit
+from datetime import datetime, timezone
+
+import bson
+import numpy as np
+
+from core.geometry import array_to_points, decode_polyline_array, encode_polyline
+
+
+def _route_doc(vertices: int, with_points: bool):
+    rng = np.random.default_rng(vertices)
+    coords = np.round(np.cumsum(rng.normal(0, 0.0005, (vertices, 2)), axis=0) + [12.97, 77.59], 5)
+    doc = {
+        "_id": bson.ObjectId(),
+        "cache_key": "0" * 64,
+        "origin": {"lat": 12.97, "lng": 77.59},
+        "destination": {"lat": 12.93, "lng": 77.61},
+        "mode": "driving",
+        "distance_m": 5200,
+        "duration_s": 960,
+        "duration_in_traffic_s": 1050,
+        "polyline": encode_polyline(coords),
+        "summary": "Main Rd",
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": datetime.now(timezone.utc),
+    }
+    if with_points:
+        doc["points"] = array_to_points(coords)
+    return doc
+
+
+def main(runs: int = 2000):
+    print(f"{'vertices':>8} {'legacy_bytes':>12} {'compact_bytes':>13} {'legacy_hit_us':>13} {'compact_hit_us':>14} {'decode_us':>9}")
+    for vertices in (50, 200, 800):
+        legacy = bson.encode(_route_doc(vertices, True))
+        compact = bson.encode(_route_doc(vertices, False))
+        legacy_hit = timeit.timeit(lambda: bson.decode(legacy), number=runs) / runs * 1e6
+        compact_hit = timeit.timeit(lambda: bson.decode(compact), number=runs) / runs * 1e6
+        polyline = bson.decode(compact)["polyline"]
+        decode = timeit.timeit(lambda: decode_polyline_array(polyline), number=runs) / runs * 1e6
+        print(f"{vertices:>8} {len(legacy):>12} {len(compact):>13} {legacy_hit:>13.1f} {compact_hit:>14.1f} {decode:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
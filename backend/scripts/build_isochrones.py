@@ -0,0 +1,18 @@
+from core.db import get_db
+from maps import isochrones
+
+
+def main():
+    db = get_db()
+    built = 0
+    for restaurant in db.restaurants.find({"is_active": True, "location": {"$ne": None}}, {"_id": 1}):
+        try:
+            isochrones.restaurant_isochrones(str(restaurant["_id"]), refresh=True)
+            built += 1
+        except ValueError:
+            continue
+    print(f"Isochrones built for {built} restaurants.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+from maps import services as maps_services
+
+
+def main():
+    modified = maps_services.compact_routes_cache()
+    print(f"Compacted {modified} routes_cache documents.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,11 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register
+
+register("devices", [
+    IndexModel([("device_id", ASCENDING)], name="devices_device_id"),
+    IndexModel([("user_id", ASCENDING)], name="devices_user"),
+])
+register("trust_logs", [
+    IndexModel([("created_at", DESCENDING)], name="trust_logs_created_at"),
+])
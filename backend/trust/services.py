@@ -1,26 +1,12 @@
 from typing import Optional
 from datetime import timedelta
-from pymongo import ASCENDING
 
 from core.db import get_db
+from core.log_writer import log_writer
 from core.utils import utcnow, to_object_id
 
-_index_ready = False
-
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.devices.create_index([("device_id", ASCENDING)], name="devices_device_id")
-    db.devices.create_index([("user_id", ASCENDING)], name="devices_user")
-    db.trust_logs.create_index([("created_at", -1)], name="trust_logs_created_at")
-    _index_ready = True
-
 
 def register_device(user_id: str, device_id: str, platform: Optional[str] = None, fingerprint: Optional[str] = None, ip: Optional[str] = None, meta: Optional[dict] = None):
-    ensure_indexes()
     db = get_db()
     doc = {
         "user_id": to_object_id(user_id),
@@ -40,7 +26,7 @@ def register_device(user_id: str, device_id: str, platform: Optional[str] = None
         if speed and float(speed) > 200:
             findings.append({"type": "SPEED_ANOMALY", "detail": f"speed={speed}"})
         if findings:
-            db.trust_logs.insert_one({
+            log_writer.write("trust_logs", {
                 "user_id": to_object_id(user_id),
                 "findings": findings,
                 "created_at": utcnow(),
@@ -49,7 +35,6 @@ def register_device(user_id: str, device_id: str, platform: Optional[str] = None
 
 
 def scan_user(user_id: Optional[str] = None):
-    ensure_indexes()
     db = get_db()
     query = {}
     if user_id:
@@ -64,12 +49,11 @@ def scan_user(user_id: Optional[str] = None):
             if len(user_ids) > 1:
                 findings.append({"device_id": device_id, "type": "DUPLICATE_DEVICE", "users": list(user_ids)})
     if findings:
-        db.trust_logs.insert_one({"user_id": to_object_id(user_id) if user_id else None, "findings": findings, "created_at": utcnow()})
+        log_writer.write("trust_logs", {"user_id": to_object_id(user_id) if user_id else None, "findings": findings, "created_at": utcnow()})
     return {"findings": findings, "device_count": len(devices)}
 
 
 def calculate_risk_score(user_id: str, device_id: Optional[str] = None):
-    ensure_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -106,7 +90,7 @@ def calculate_risk_score(user_id: str, device_id: Optional[str] = None):
                 reasons.append({"type": "VELOCITY_ANOMALY", "detail": finding.get("detail")})
 
     score = min(score, 100)
-    db.trust_logs.insert_one({
+    log_writer.write("trust_logs", {
         "user_id": oid,
         "findings": reasons,
         "risk_score": score,
@@ -0,0 +1,21 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+
+from core.indexes import register
+
+register("users", [
+    IndexModel([("phone", ASCENDING)], unique=True, name="users_phone"),
+    IndexModel([("created_at", ASCENDING)], name="users_created_at"),
+])
+register("auth_sessions", [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="sessions_user_created"),
+    IndexModel([("refresh_jti", ASCENDING)], unique=True, name="sessions_refresh_jti"),
+    IndexModel([("device_id", ASCENDING)], name="sessions_device_id"),
+])
+register("user_addresses", [
+    IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING)], name="addresses_user_created"),
+    IndexModel([("location", GEOSPHERE)], name="addresses_location_2dsphere"),
+])
+register("favorites", [
+    IndexModel([("user_id", ASCENDING), ("favorite_type", ASCENDING)], name="favorites_user_type"),
+    IndexModel([("reference_id", ASCENDING)], name="favorites_reference"),
+])
@@ -1,7 +1,9 @@
 import logging
 import hashlib
 from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
+from core.auth import invalidate_principal
 from core.db import get_db
 from core.utils import utcnow, to_object_id
 
@@ -45,13 +47,6 @@ def _hash_token(token: str) -> str:
     return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
-def ensure_session_indexes():
-    db = get_db()
-    db[SESSION_COLLECTION].create_index([("user_id", 1), ("created_at", -1)], name="sessions_user_created")
-    db[SESSION_COLLECTION].create_index([("refresh_jti", 1)], unique=True, name="sessions_refresh_jti")
-    db[SESSION_COLLECTION].create_index([("device_id", 1)], name="sessions_device_id")
-
-
 def create_session(
     user_id: str,
     refresh_jti: str,
@@ -61,7 +56,6 @@ def create_session(
     user_agent: str = None,
     ip_address: str = None,
 ):
-    ensure_session_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -90,7 +84,6 @@ def create_session(
 
 
 def rotate_session(refresh_jti: str, new_refresh_jti: str, new_refresh_token: str):
-    ensure_session_indexes()
     db = get_db()
     result = db[SESSION_COLLECTION].find_one_and_update(
         {"refresh_jti": refresh_jti, "revoked_at": None},
@@ -105,7 +98,6 @@ def rotate_session(refresh_jti: str, new_refresh_jti: str, new_refresh_token: st
 
 
 def revoke_session(refresh_jti: str, reason: str = "LOGOUT"):
-    ensure_session_indexes()
     db = get_db()
     result = db[SESSION_COLLECTION].find_one_and_update(
         {"refresh_jti": refresh_jti, "revoked_at": None},
@@ -116,13 +108,11 @@ def revoke_session(refresh_jti: str, reason: str = "LOGOUT"):
 
 
 def get_session_by_refresh_jti(refresh_jti: str):
-    ensure_session_indexes()
     db = get_db()
     return db[SESSION_COLLECTION].find_one({"refresh_jti": refresh_jti})
 
 
 def list_sessions(user_id: str, include_revoked: bool = False):
-    ensure_session_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -134,14 +124,7 @@ def list_sessions(user_id: str, include_revoked: bool = False):
     return list(cursor)
 
 
-def ensure_address_indexes():
-    db = get_db()
-    db[ADDRESS_COLLECTION].create_index([("user_id", 1), ("created_at", -1)], name="addresses_user_created")
-    db[ADDRESS_COLLECTION].create_index([("location", "2dsphere")], name="addresses_location_2dsphere")
-
-
 def create_user_address(user_id: str, data: dict, location: dict = None):
-    ensure_address_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -171,7 +154,6 @@ def create_user_address(user_id: str, data: dict, location: dict = None):
 
 
 def list_user_addresses(user_id: str):
-    ensure_address_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -180,7 +162,6 @@ def list_user_addresses(user_id: str):
 
 
 def update_user_address(user_id: str, address_id: str, data: dict, location: dict = None):
-    ensure_address_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     aid = to_object_id(address_id)
@@ -206,7 +187,6 @@ def update_user_address(user_id: str, address_id: str, data: dict, location: dic
 
 
 def delete_user_address(user_id: str, address_id: str):
-    ensure_address_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     aid = to_object_id(address_id)
@@ -216,14 +196,7 @@ def delete_user_address(user_id: str, address_id: str):
     return result.deleted_count > 0
 
 
-def ensure_favorite_indexes():
-    db = get_db()
-    db[FAVORITES_COLLECTION].create_index([("user_id", 1), ("favorite_type", 1)], name="favorites_user_type")
-    db[FAVORITES_COLLECTION].create_index([("reference_id", 1)], name="favorites_reference")
-
-
 def add_favorite(user_id: str, favorite_type: str, reference_id: str):
-    ensure_favorite_indexes()
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
@@ -269,7 +242,11 @@ def create_user(phone: str, role: str):
         "created_at": utcnow(),
         "fcm_token": None,
     }
-    result = db.users.insert_one(doc)
+    try:
+        result = db.users.insert_one(doc)
+    except DuplicateKeyError:
+        # A concurrent first login with the same phone inserted the user first.
+        return db.users.find_one({"phone": phone})
     doc["_id"] = result.inserted_id
     return doc
 
@@ -280,6 +257,7 @@ def set_fcm_token(user_id: str, fcm_token: str):
     if not oid:
         return None
     db.users.update_one({"_id": oid}, {"$set": {"fcm_token": fcm_token}})
+    invalidate_principal(oid)
     return db.users.find_one({"_id": oid})
 
 
@@ -289,9 +267,26 @@ def update_role(user_id: str, role: str):
     if not oid:
         return None
     db.users.update_one({"_id": oid}, {"$set": {"role": role}})
+    invalidate_principal(oid)
     return db.users.find_one({"_id": oid})
 
 
+def set_user_active(user_id: str, is_active: bool):
+    db = get_db()
+    oid = to_object_id(user_id)
+    if not oid:
+        return None
+    updated = db.users.find_one_and_update(
+        {"_id": oid},
+        {"$set": {"is_active": bool(is_active), "updated_at": utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    invalidate_principal(oid)
+    if updated:
+        logger.info("user_active_changed user_id=%s is_active=%s", user_id, bool(is_active))
+    return updated
+
+
 def update_user_profile(user_id: str, updates: dict):
     if not updates:
         return None
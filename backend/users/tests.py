@@ -1,3 +1,19 @@
-from django.test import TestCase
+from unittest.mock import MagicMock, patch
 
-# Create your tests here.
+from bson import ObjectId
+from django.test import SimpleTestCase
+from pymongo.errors import DuplicateKeyError
+
+from users import services as user_services
+
+
+class CreateUserTests(SimpleTestCase):
+    def test_concurrent_first_login_returns_the_existing_user(self):
+        winner = {"_id": ObjectId(), "phone": "+910000000000", "role": "USER"}
+        db = MagicMock()
+        db.users.insert_one.side_effect = DuplicateKeyError("E11000 duplicate key error")
+        db.users.find_one.return_value = winner
+        with patch("users.services.get_db", return_value=db):
+            user = user_services.create_user(phone="+910000000000", role="USER")
+        self.assertEqual(user, winner)
+        db.users.find_one.assert_called_once_with({"phone": "+910000000000"})
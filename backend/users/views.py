@@ -1,4 +1,3 @@
-from firebase_admin import auth as firebase_auth
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -49,6 +48,8 @@ class FirebaseLoginView(APIView):
 
         try:
             token = parts[1]
+            from firebase_admin import auth as firebase_auth
+
             firebase_app = get_firebase_app()
             decoded = firebase_auth.verify_id_token(
                 token,
@@ -78,6 +79,8 @@ class FirebaseLoginView(APIView):
         device_id = serializer.validated_data.get("device_id") or request.headers.get("X-Device-Id")
         device_name = serializer.validated_data.get("device_name") or request.headers.get("X-Device-Name")
 
+        from firebase_admin import auth as firebase_auth
+
         firebase_app = get_firebase_app()
         
         try:
@@ -134,9 +137,8 @@ class FirebaseLoginView(APIView):
 
 class MeView(APIView):
     def get(self, request):
-        user_doc = getattr(request, "user_doc", None)
-        if not user_doc:
-            user_doc = user_services.get_user_by_id(request.user.id)
+        # request.user_doc only carries the cached auth projection.
+        user_doc = user_services.get_user_by_id(request.user.id)
         return Response({"user": serialize_doc(user_doc)})
 
     # Thunder Client / Postman payload example:
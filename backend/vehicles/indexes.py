@@ -0,0 +1,10 @@
+from pymongo import ASCENDING, IndexModel
+
+from core.indexes import register
+
+register("vehicle_rules", [
+    IndexModel([("active", ASCENDING)], name="vehicle_rules_active"),
+])
+register("vehicles", [
+    IndexModel([("captain_id", ASCENDING)], unique=True, name="vehicles_captain"),
+])
@@ -1,28 +1,13 @@
 from typing import Dict
-from pymongo import ASCENDING
 from django.conf import settings
 
+from core.config_snapshot import register
 from core.db import get_db
 from core.utils import utcnow, to_object_id
 from core.vehicles import normalize_vehicle_type
 
-_index_ready = False
 
-
-def ensure_indexes():
-    global _index_ready
-    if _index_ready:
-        return
-    db = get_db()
-    db.vehicle_rules.create_index([("active", ASCENDING)], name="vehicle_rules_active")
-    db.vehicles.create_index([("captain_id", ASCENDING)], unique=True, name="vehicles_captain")
-    _index_ready = True
-
-
-def get_rules() -> Dict:
-    ensure_indexes()
-    db = get_db()
-    doc = db.vehicle_rules.find_one({"active": True})
+def _rules_from(doc) -> Dict:
     if doc:
         return doc.get("rules", {})
     return {
@@ -32,19 +17,34 @@ def get_rules() -> Dict:
     }
 
 
+def _load_rules() -> Dict:
+    db = get_db()
+    return _rules_from(db.vehicle_rules.find_one({"active": True}))
+
+
+vehicle_rules = register("vehicle_rules", _load_rules)
+
+
+def get_rules() -> Dict:
+    return vehicle_rules.get()
+
+
+async def aget_rules() -> Dict:
+    return await vehicle_rules.aget()
+
+
 def set_rules(rules: Dict):
-    ensure_indexes()
     db = get_db()
     db.vehicle_rules.update_one(
         {"active": True},
         {"$set": {"rules": rules, "active": True, "updated_at": utcnow()}},
         upsert=True,
     )
+    vehicle_rules.publish()
     return get_rules()
 
 
 def register_vehicle(captain_id: str, vehicle: Dict):
-    ensure_indexes()
     db = get_db()
     doc = vehicle.copy()
     doc["captain_id"] = to_object_id(captain_id)
@@ -53,11 +53,17 @@ def register_vehicle(captain_id: str, vehicle: Dict):
     return db.vehicles.find_one({"captain_id": doc["captain_id"]})
 
 
-def get_food_allowed_vehicles():
-    rules = get_rules()
+def _food_allowed(rules: Dict):
     raw = rules.get("food_allowed_vehicles", [])
-    normalized = [normalize_vehicle_type(v) for v in raw if normalize_vehicle_type(v)]
-    return normalized
+    return [normalize_vehicle_type(v) for v in raw if normalize_vehicle_type(v)]
+
+
+def get_food_allowed_vehicles():
+    return _food_allowed(get_rules())
+
+
+async def aget_food_allowed_vehicles():
+    return _food_allowed(await aget_rules())
 
 
 def get_ev_reward_percentage():
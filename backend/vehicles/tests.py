@@ -0,0 +1,26 @@
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+
+from core import config_snapshot
+from vehicles import services
+
+
+@override_settings(CONFIG_SNAPSHOT_SUBSCRIBE=False)
+class VehicleRulesTests(SimpleTestCase):
+    def test_rules_are_served_from_the_snapshot(self):
+        db = MagicMock()
+        db.vehicle_rules.find_one.return_value = {"rules": {"food_allowed_vehicles": ["bike"]}}
+        redis = MagicMock()
+        redis.get.return_value = "3"
+        redis.incr.return_value = 4
+        snapshot = config_snapshot.ConfigSnapshot("vehicle_rules_test", services._load_rules)
+        with patch("core.config_snapshot.get_client", return_value=redis), \
+                patch("vehicles.services.get_db", return_value=db), \
+                patch("vehicles.services.vehicle_rules", snapshot):
+            self.assertEqual(services.get_rules(), {"food_allowed_vehicles": ["bike"]})
+            services.get_rules()
+            db.vehicle_rules.find_one.assert_called_once_with({"active": True})
+            services.set_rules({"food_allowed_vehicles": ["car"]})
+        self.assertEqual(db.vehicle_rules.find_one.call_count, 2)
+        redis.publish.assert_called_once_with(config_snapshot.CONFIG_CHANNEL, "vehicle_rules_test:4")
@@ -0,0 +1,23 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from core.indexes import register, retire
+
+register("ledger_entries", [
+    IndexModel(
+        [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="ledger_entries_user_created_id",
+    ),
+    IndexModel([("reference_type", ASCENDING), ("reference_id", ASCENDING)], name="ledger_entries_reference"),
+])
+register("ledger_transactions", [
+    IndexModel([("created_at", DESCENDING)], name="ledger_tx_created"),
+])
+register("wallet_transactions", [
+    IndexModel(
+        [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+        name="wallet_transactions_user_created_id",
+    ),
+])
+# History pages continue after (created_at, _id), see core.pagination.
+retire("ledger_entries", ["ledger_entries_user_created"])
+retire("wallet_transactions", ["wallet_transactions_user_created"])
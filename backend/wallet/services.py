@@ -3,6 +3,7 @@ from typing import Optional, List
 from pymongo import ReturnDocument
 from django.conf import settings
 from core.db import get_db
+from core.pagination import empty_page, paginate
 from core.utils import utcnow, to_object_id
 
 
@@ -109,12 +110,12 @@ def refund_wallet(user_id: str, amount: int, reason: str, source: str, reference
     return credit_wallet(user_id, amount, reason, source, reference=reference, is_refund=True)
 
 
-def list_transactions(user_id: str, limit: int = 50):
+def list_transactions(user_id: str, limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
-        return []
-    return list(db.wallet_transactions.find({"user_id": oid}).sort("created_at", -1).limit(limit))
+        return empty_page()
+    return paginate(db.wallet_transactions, {"user_id": oid}, limit, cursor, sort_field="created_at")
 
 
 logger = logging.getLogger(__name__)
@@ -123,15 +124,7 @@ LEDGER_ENTRY_COLLECTION = "ledger_entries"
 LEDGER_TX_COLLECTION = "ledger_transactions"
 
 
-def ensure_ledger_indexes():
-    db = get_db()
-    db[LEDGER_ENTRY_COLLECTION].create_index([("user_id", 1), ("created_at", -1)], name="ledger_entries_user_created")
-    db[LEDGER_ENTRY_COLLECTION].create_index([("reference_type", 1), ("reference_id", 1)], name="ledger_entries_reference")
-    db[LEDGER_TX_COLLECTION].create_index([("created_at", -1)], name="ledger_tx_created")
-
-
 def create_ledger_transaction(reference_type: str, reference_id: str, entries: List[dict], meta: Optional[dict] = None):
-    ensure_ledger_indexes()
     db = get_db()
     debit_total = sum(int(e.get("amount", 0)) for e in entries if e.get("direction") == "DEBIT")
     credit_total = sum(int(e.get("amount", 0)) for e in entries if e.get("direction") == "CREDIT")
@@ -162,14 +155,12 @@ def create_ledger_transaction(reference_type: str, reference_id: str, entries: L
     return tx_doc
 
 
-def list_ledger_entries(user_id: str, limit: int = 50):
-    ensure_ledger_indexes()
+def list_ledger_entries(user_id: str, limit: int = 50, cursor: Optional[str] = None):
     db = get_db()
     oid = to_object_id(user_id)
     if not oid:
-        return []
-    cursor = db[LEDGER_ENTRY_COLLECTION].find({"user_id": oid}).sort("created_at", -1).limit(limit)
-    return list(cursor)
+        return empty_page()
+    return paginate(db[LEDGER_ENTRY_COLLECTION], {"user_id": oid}, limit, cursor, sort_field="created_at")
 
 
 def _commission_pct():
@@ -177,7 +168,6 @@ def _commission_pct():
 
 
 def settle_order(order_id: str):
-    ensure_ledger_indexes()
     db = get_db()
     oid = to_object_id(order_id)
     if not oid:
@@ -203,7 +193,6 @@ def settle_order(order_id: str):
 
 
 def settle_ride(ride_id: str):
-    ensure_ledger_indexes()
     db = get_db()
     oid = to_object_id(ride_id)
     if not oid:
@@ -11,8 +11,12 @@ from wallet import services
 
 class WalletTransactionsView(APIView):
     def get(self, request):
-        txns = services.list_transactions(request.user.id)
-        return Response({"transactions": serialize_doc(txns)})
+        limit = int(request.query_params.get("limit", 50))
+        try:
+            page = services.list_transactions(request.user.id, limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"transactions": serialize_doc(list(page)), "next_cursor": page.next_cursor})
 
 
 class WalletRefundView(APIView):
@@ -39,8 +43,11 @@ class WalletRefundView(APIView):
 class WalletLedgerView(APIView):
     def get(self, request):
         limit = int(request.query_params.get("limit", 50))
-        entries = services.list_ledger_entries(request.user.id, limit=limit)
-        return Response({"entries": serialize_doc(entries)})
+        try:
+            page = services.list_ledger_entries(request.user.id, limit=limit, cursor=request.query_params.get("cursor"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"entries": serialize_doc(list(page)), "next_cursor": page.next_cursor})
 
 
 class WalletSettleView(APIView):